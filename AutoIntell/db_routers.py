@@ -0,0 +1,117 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Views decorated with @replica_reads (history, rollups, fleet queries) read from
+the DATABASE_REPLICA_ALIAS database; everything else, and every write, uses
+'default'. Reads fall back to 'default' when:
+
+  - the replica alias is not configured (DATABASES has no such entry),
+  - the view has written something earlier in the request, or
+  - the same client made a writing POST/PUT/PATCH/DELETE within
+    REPLICA_STICKY_SECONDS, so it sees its own writes despite replication lag.
+    Writers are remembered in the cache by user (or device key) id; with the
+    default per-process locmem cache that only covers requests served by the
+    same process.
+
+Routing state lives in a context variable set up by ReplicaRoutingMiddleware,
+so background threads and management commands always use 'default'.
+"""
+import contextvars
+import functools
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+_state = contextvars.ContextVar('replica_routing_state', default=None)
+
+
+def replica_alias():
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def _client_key(user):
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return None
+    credential = getattr(user, 'credential', None)
+    if credential is not None:
+        # Device clients (DeviceUser) have no user row; the device key is the client
+        return f'db-replica-pin:device:{credential.pk}'
+    return f'db-replica-pin:{type(user).__name__}:{user.pk}'
+
+
+class RoutingState:
+    __slots__ = ('use_replica', 'wrote')
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.wrote:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db != replica_alias()
+
+
+def replica_reads(view):
+    """
+    Route the view's reads to the replica unless this client wrote recently.
+    Apply below @api_view so request.user is the authenticated client.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None or replica_alias() is None:
+            return view(request, *args, **kwargs)
+        key = _client_key(getattr(request, 'user', None))
+        state.use_replica = not (key and cache.get(key))
+        # Writes before the view are authentication bookkeeping (last_used_at),
+        # which the view's reads do not depend on
+        state.wrote = False
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.use_replica = False
+    return wrapper
+
+
+class ReplicaRoutingMiddleware:
+    """Give each request its routing state; remember clients that wrote."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote and request.method not in SAFE_METHODS and replica_alias() is not None:
+            # DRF copies the authenticated user onto the underlying request
+            key = _client_key(getattr(request, 'user', None))
+            if key:
+                cache.set(key, True, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+        return response
@@ -0,0 +1,60 @@
+"""
+Faster response renderers, chosen per request by DRF content negotiation.
+
+ORJSONRenderer serves application/json through orjson, which encodes the nested
+analysis documents several times faster than the standard library encoder. It
+keeps DRF's JSONRenderer behaviour (and falls back to it) when orjson is not
+installed. MsgPackRenderer serves application/msgpack for clients that want
+smaller payloads; it is only registered when msgpack is installed (see
+DEFAULT_RENDERER_CLASSES in settings.py).
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_fallback_encoder = JSONEncoder()
+
+
+def _default(obj):
+    """Types neither orjson nor msgpack handle natively: Decimal, lazy strings, querysets, ..."""
+    return _fallback_encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        # Honour an explicit `indent` in the Accept header, as JSONRenderer does
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        # Datetimes and numpy values go through DRF's encoder so they come out as
+        # JSONRenderer writes them (orjson would shorten float32 values)
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=option)
+
+
+class MsgPackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
@@ -0,0 +1,17 @@
+"""
+Settings for running the replica routing tests against a second local database:
+
+    DJANGO_SETTINGS_MODULE=AutoIntell.replica_test_settings python manage.py test AutoIntell
+
+The replica is a separate database on the primary's server (not a TEST MIRROR),
+so the tests can tell which database a view read from. It gets its schema from
+AutoIntell/tests.py, since ReplicaRouter keeps migrations off it.
+"""
+from AutoIntell.settings import *  # noqa: F401,F403
+from AutoIntell.settings import DATABASES
+
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': f"{DATABASES['default']['NAME']}_replica",
+    'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_replica"},
+}
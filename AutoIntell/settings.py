@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 from corsheaders.defaults import default_headers
@@ -46,18 +47,23 @@ INSTALLED_APPS = [
     'authentication',
     'sensor_api',
     'ml_models',
+    'monitoring',
 ]
 
 # Middleware
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware', # ✅ Enable CORS Middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'AutoIntell.db_routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'monitoring.profiling.ProfilingMiddleware',
+    'monitoring.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'AutoIntell.urls'
@@ -90,15 +96,91 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', 'Mouli'),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # Keep connections open between requests; a health check before reuse
+        # replaces connections the server has dropped
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+# A connection pool per process instead (requires psycopg 3 with psycopg_pool). The
+# raw SQL paths (rescoring's VALUES update, COPY in sharding.insert_rows) run on
+# either driver.
+if os.environ.get('DB_POOL', 'False') == 'True':
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        },
+    }
+
+# The readings' covering indexes list INCLUDE columns (sensor_api/models.py). Backends
+# without INCLUDE (SQLite, used by the sharding tests) build them on the key columns
+# only and warn with models.W040; the lookups still use them, without index-only scans.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+# Read replica for history, rollup and fleet reads (AutoIntell/db_routers.py). Unset
+# fields default to the primary's. For local testing, point DB_REPLICA_NAME at a copy
+# of the primary on the same server (createdb -T <primary> <copy>). The routing tests
+# in AutoIntell/tests.py run with AutoIntell.replica_test_settings.
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Hash sharding of sensor readings by vehicle (sensor_api/sharding.py). DB_SHARDS is a
+# comma-separated list of database names on DB_SHARD_HOST (default: the primary's
+# server); each becomes an alias of the same name, migrated with
+# `manage.py migrate --database=<name>`. List the primary's own name as 'default' to
+# keep it as a shard. Move shards that are being removed to DB_SHARDS_RETIRED until
+# `manage.py rebalance_shards` has drained them.
+SENSOR_SHARDING = {
+    'SHARDS': [name for name in os.environ.get('DB_SHARDS', '').split(',') if name],
+    'RETIRED': [name for name in os.environ.get('DB_SHARDS_RETIRED', '').split(',') if name],
+    'WORKERS_PER_SHARD': int(os.environ.get('DB_SHARD_WORKERS', 4)),
+}
+for _name in SENSOR_SHARDING['SHARDS'] + SENSOR_SHARDING['RETIRED']:
+    if _name not in DATABASES:
+        DATABASES[_name] = {
+            **DATABASES['default'],
+            'NAME': _name,
+            'HOST': os.environ.get('DB_SHARD_HOST', DATABASES['default']['HOST']),
+            'PORT': os.environ.get('DB_SHARD_PORT', DATABASES['default']['PORT']),
+        }
+
+DATABASE_ROUTERS = ['sensor_api.sharding.ShardRouter', 'AutoIntell.db_routers.ReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+# How long a client that wrote keeps reading from the primary; above the replication lag
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+
+# Cache (throttling, login failure cache). Per-process locmem by default.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'autointell-default',
     }
 }
 
 
 # REST Framework Configuration
+# JSON is rendered through orjson (falls back to the stdlib encoder if it is not
+# installed); application/msgpack is offered when msgpack is installed.
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.backends.TimedJWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': [
+        'AutoIntell.renderers.ORJSONRenderer',
+        *(['AutoIntell.renderers.MsgPackRenderer'] if find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # JWT Token Settings
@@ -109,6 +191,133 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Sensor reading storage. On PostgreSQL the readings table is partitioned by month;
+# `manage.py manage_partitions` keeps partitions ahead and expires old ones.
+SENSOR_PARTITION_MONTHS_AHEAD = 3
+SENSOR_PARTITION_RETAIN_MONTHS = int(os.environ['SENSOR_PARTITION_RETAIN_MONTHS']) if os.environ.get('SENSOR_PARTITION_RETAIN_MONTHS') else None
+# Retention (`manage.py apply_retention`): raw readings older than RAW_DAYS are
+# downsampled to hourly rollups and exported to SENSOR_ARCHIVE_DIR; rollups older
+# than ROLLUP_DAYS are exported too. None disables a step.
+SENSOR_RETENTION = {
+    'RAW_DAYS': int(os.environ['SENSOR_RAW_RETENTION_DAYS']) if os.environ.get('SENSOR_RAW_RETENTION_DAYS') else None,
+    'ROLLUP_DAYS': int(os.environ['SENSOR_ROLLUP_RETENTION_DAYS']) if os.environ.get('SENSOR_ROLLUP_RETENTION_DAYS') else None,
+}
+SENSOR_ARCHIVE_DIR = Path(os.environ.get('SENSOR_ARCHIVE_DIR', BASE_DIR / 'sensor_archive'))
+# Optional per-vehicle columnar copy of every reading (append-only, memory-mapped).
+# Populated on save when ENABLED; `manage.py build_columnar_store` backfills it.
+# SERVE_READS makes history/rollup endpoints read from it unless ?source=database.
+SENSOR_COLUMNAR_STORE = {
+    'ENABLED': os.environ.get('SENSOR_COLUMNAR_STORE_ENABLED', 'False') == 'True',
+    'PATH': Path(os.environ.get('SENSOR_COLUMNAR_STORE_PATH', BASE_DIR / 'columnar_store')),
+    'SERVE_READS': os.environ.get('SENSOR_COLUMNAR_SERVE_READS', 'False') == 'True',
+}
+# Streaming fault alerts on new readings (sensor_api/alerts.py). Z_SCORE is the
+# anomaly cut-off against the per-vehicle EWMA; repeats of an alert within
+# COOLDOWN_SECONDS are batched into one write.
+SENSOR_ALERTS = {
+    'ENABLED': os.environ.get('SENSOR_ALERTS_ENABLED', 'True') == 'True',
+    'EWMA_ALPHA': 0.1,
+    'Z_SCORE': 4.0,
+    'MIN_SAMPLES': 30,
+    'COOLDOWN_SECONDS': int(os.environ.get('SENSOR_ALERT_COOLDOWN_SECONDS', 300)),
+    'MAX_TRACKED_VEHICLES': 10000,
+}
+# Per-vehicle degradation trend behind the remaining-km forecast (sensor_api/trends.py).
+# A reading's weight halves every HALF_LIFE_DAYS behind the newest one; FAILURE_SCORE
+# is the health score treated as due for service. Readings carry no odometer, so days
+# are converted at KM_PER_DAY.
+SENSOR_HEALTH_TREND = {
+    'HALF_LIFE_DAYS': 30.0,
+    'FAILURE_SCORE': 0.4,
+    'KM_PER_DAY': int(os.environ.get('SENSOR_TREND_KM_PER_DAY', 150)),
+    'MIN_READINGS': 20,
+    'MIN_SPAN_DAYS': 1.0,
+    'CONFIDENCE_Z': 1.96,
+    'MAX_KM': 50000,
+}
+# Write-time fleet aggregates behind /api/sensor/fleet/summary/ (sensor_api/fleet_summary.py).
+# Each process flushes its window aggregates every FLUSH_SECONDS.
+SENSOR_FLEET_SUMMARY = {
+    'ENABLED': os.environ.get('SENSOR_FLEET_SUMMARY_ENABLED', 'True') == 'True',
+    'WINDOW_MINUTES': 60,
+    'FLUSH_SECONDS': 10,
+    'HLL_PRECISION': 12,
+    'SKETCH_K': 200,
+    'RETENTION_DAYS': 400,
+}
+# Default lookback for history queries without `since` (None = unbounded)
+SENSOR_HISTORY_DEFAULT_WINDOW_DAYS = None
+
+# Metrics endpoint (/metrics). Leave unset to allow unauthenticated scrapes.
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN')
+
+# Per-request profiling: send the X-Profile-Request header with this token
+# (or ?_profile=1 as a staff user, by session or JWT) to capture a cProfile dump.
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_PER_MINUTE = int(os.environ.get('PROFILING_MAX_PER_MINUTE', 6))
+PROFILING_MAX_FILES = 50
+
+# Maximum SQL queries per request, keyed by URL name. Budgets do not grow with
+# page size, so per-row queries on the history endpoints exceed them. Fleet-wide
+# reading queries run once per shard, so their budgets grow with the shard count.
+_SHARDS = len(SENSOR_SHARDING['SHARDS'])
+QUERY_BUDGETS = {
+    # 'auth' is at most 2 queries, only on an auth cache miss
+    # (device key lookup + last_used_at update). 'vehicle' is the string id lookup,
+    # only on a vehicle cache miss; registering a new vehicle costs 4 more (with its
+    # health trend row) and is not budgeted, and neither are alert writes on
+    # ingestion (at most one per alert per SENSOR_ALERTS cooldown).
+    # Sharded: auth, validators, a count and a page per shard, vehicles
+    'vehicle-sensor-list': max(6, 4 + 2 * _SHARDS),  # auth, validators, count, page | POST: auth, vehicle, insert, latest, trend
+    'vehicle-sensor-detail': 5 + _SHARDS,  # auth, row | PATCH/DELETE: + write, touch (sharded: a lookup per shard)
+    'prediction-history': 6,        # auth, vehicle, validators, count, page (304: auth, vehicle, validators)
+    'rollup-history': 5,            # auth, vehicle, count, page
+    # Sharded: auth, a count and a page per shard, vehicle ids
+    'fleet-faulty-readings': max(4, 3 + 2 * _SHARDS),      # auth, count, page
+    'fleet-high-score-readings': max(4, 3 + 2 * _SHARDS),  # auth, count, page
+    'fleet-summary': max(4, 2 + 2 * _SHARDS),  # auth, windows | exact: auth, counts, quantiles (per shard)
+    'fault-alerts': 3,              # user, count, page
+    'acknowledge-fault-alert': 3,   # user, update, row
+    'latest-sensor-data': 2,        # auth
+    'predict-engine-kilometers': 4, # auth, vehicle, trend
+    'predict-engine-health': 6,     # auth, vehicle, insert, latest, trend
+    'scoring-jobs': 4,              # user, insert | GET: user, count, page
+    'scoring-job-detail': 2,        # user, row
+    'scoring-job-result': 2,        # user, row
+    'data-drift': 2,                # user, sketches
+    'shadow-evaluation': 1,         # user
+}
+# 'off', 'log' or 'raise'
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'log')
+
+# How long the stateless JWT path trusts a cached user active/inactive status (seconds)
+AUTH_USER_STATUS_CACHE_TTL = int(os.environ.get('AUTH_USER_STATUS_CACHE_TTL', 30))
+
+# How long a verified device key is trusted before it is re-checked against the DB (seconds)
+DEVICE_KEY_CACHE_TTL = int(os.environ.get('DEVICE_KEY_CACHE_TTL', 60))
+
+# Password hashing. PASSWORD_HASH_ITERATIONS tunes the PBKDF2 cost (Django's default when unset);
+# existing hashes keep working and are upgraded on the next successful login.
+PASSWORD_HASH_ITERATIONS = int(os.environ['PASSWORD_HASH_ITERATIONS']) if os.environ.get('PASSWORD_HASH_ITERATIONS') else None
+PASSWORD_HASHERS = [
+    'authentication.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Login storm protection: password checks run on a bounded pool, failed credentials
+# are remembered briefly, and logins are rate limited per IP and per username.
+LOGIN_HASHER_WORKERS = int(os.environ.get('LOGIN_HASHER_WORKERS', 2))
+LOGIN_HASHER_QUEUE_SIZE = int(os.environ.get('LOGIN_HASHER_QUEUE_SIZE', 32))
+LOGIN_HASHER_QUEUE_TIMEOUT = 5  # seconds to wait for a free slot before answering 503
+LOGIN_FAILURE_CACHE_TTL = 60
+LOGIN_THROTTLE_RATE = '30/min'
+LOGIN_USERNAME_THROTTLE_RATE = '10/min'
+REGISTER_THROTTLE_RATE = '10/h'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -170,6 +379,59 @@ else:
     DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@autointell.com')
     FRONTEND_URL = os.environ.get('FRONTEND_URL', 'https://app.autointell.com')
 
+# Outbound email queue. 'thread' sends from a daemon thread in the web process;
+# 'external' leaves delivery to `manage.py process_email_queue`.
+EMAIL_QUEUE_WORKER = os.environ.get('EMAIL_QUEUE_WORKER', 'thread')
+EMAIL_QUEUE_BATCH_SIZE = 50
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_BASE_SECONDS = 30
+EMAIL_QUEUE_RETRY_MAX_SECONDS = 3600
+EMAIL_QUEUE_POLL_SECONDS = 30
+# How long a worker holds claimed emails before another worker may retry them
+EMAIL_QUEUE_LEASE_SECONDS = 300
+# Sent and failed emails (bodies already blanked) are deleted after this many hours
+EMAIL_QUEUE_RETENTION_HOURS = 72
+
+# Offline CSV scoring jobs (/api/ml/jobs/). Uploads and results live under
+# SCORING_JOBS_DIR; 'thread' runs jobs in the web process, 'external' leaves them
+# to `manage.py process_scoring_jobs`.
+SCORING_JOB_WORKER = os.environ.get('SCORING_JOB_WORKER', 'thread')
+SCORING_JOBS_DIR = Path(os.environ.get('SCORING_JOBS_DIR', BASE_DIR / 'scoring_jobs'))
+SCORING_JOB_MAX_BYTES = 512 * 1024 * 1024
+SCORING_JOB_CHUNK_ROWS = 50000
+SCORING_JOB_LEASE_SECONDS = 300
+SCORING_JOB_MAX_ATTEMPTS = 3
+SCORING_JOB_POLL_SECONDS = 60
+
+# Shadow scoring of sampled prediction requests by candidate models (ml_models/shadow.py).
+# BACKENDS maps a name to {'MODEL': <.h5 path>, 'SCALER': <.pkl path, optional>} or
+# {'CALLABLE': <dotted path of features -> scores>}. Samples are dropped, never
+# waited for, when QUEUE_SIZE are already pending.
+SHADOW_EVALUATION = {
+    'ENABLED': os.environ.get('SHADOW_EVALUATION_ENABLED', 'False') == 'True',
+    'SAMPLE_RATE': float(os.environ.get('SHADOW_SAMPLE_RATE', 0.05)),
+    'QUEUE_SIZE': 1000,
+    'BATCH_SIZE': 64,
+    'MAX_WAIT_SECONDS': 0.5,
+    'BACKENDS': {
+        'candidate': {'MODEL': os.environ['SHADOW_MODEL_PATH'], 'SCALER': os.environ.get('SHADOW_SCALER_PATH')},
+    } if os.environ.get('SHADOW_MODEL_PATH') else {},
+}
+
+# Live-vs-training drift of sensor values (ml_models/drift.py, /api/ml/drift/).
+# Each process flushes its sketches every FLUSH_SECONDS into WINDOW_MINUTES windows.
+DRIFT_MONITOR = {
+    'ENABLED': os.environ.get('DRIFT_MONITOR_ENABLED', 'True') == 'True',
+    'SKETCH_K': 200,
+    'WINDOW_MINUTES': 60,
+    'FLUSH_SECONDS': 60,
+    'FLUSH_READINGS': 5000,
+    'RETENTION_DAYS': 30,
+    'BINS': 10,
+    'PSI_WARNING': 0.1,
+    'PSI_CRITICAL': 0.25,
+}
+
 # Password reset settings
 PASSWORD_RESET_TIMEOUT = int(os.environ.get('PASSWORD_RESET_TIMEOUT', 3600))  # 1 hour in seconds
 PASSWORD_RESET_THROTTLE_RATE = '5/h'  # Limit password reset requests (requires rate limiting)
@@ -0,0 +1,26 @@
+"""
+Settings for running the sharding tests (sensor_api/sharding.py) on local SQLite
+databases:
+
+    DJANGO_SETTINGS_MODULE=AutoIntell.sharded_test_settings python manage.py test \
+        sensor_api.tests.ShardingTests ml_models.tests.RescoreTests
+
+'default' is the catalog; 'shard_a' and 'shard_b' hold the readings. The other
+test cases only use 'default'.
+"""
+from AutoIntell.settings import *  # noqa: F401,F403
+from AutoIntell.settings import BASE_DIR
+
+DATABASES = {
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'sharded_test_{alias}.sqlite3',
+    }
+    for alias in ('default', 'shard_a', 'shard_b')
+}
+
+SENSOR_SHARDING = {
+    'SHARDS': ['shard_a', 'shard_b'],
+    'RETIRED': [],
+    'WORKERS_PER_SHARD': 2,
+}
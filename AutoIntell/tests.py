@@ -0,0 +1,111 @@
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipUnless
+
+import numpy as np
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from AutoIntell import renderers
+from AutoIntell.db_routers import replica_alias
+from authentication.backends import device_key_cache, user_status_cache
+from authentication.device_keys import create_device_credential
+from sensor_api.models import Vehicle, VehicleSensorData
+from sensor_api.tests import READING, create_readings
+from sensor_api.vehicles import vehicle_cache
+
+
+def separate_replica():
+    """The replica alias, when it is a database of its own rather than a TEST MIRROR."""
+    alias = replica_alias()
+    if alias is None or connections[alias].settings_dict['TEST'].get('MIRROR'):
+        return None
+    return alias
+
+
+@skipUnless(separate_replica(), 'Needs a separate replica database (AutoIntell.replica_test_settings)')
+@override_settings(REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTests(APITestCase):
+    databases = {'default', separate_replica()} - {None}
+
+    @classmethod
+    def setUpClass(cls):
+        # In production the replica's schema arrives through replication. Test
+        # database setup recorded the migrations as applied without running them.
+        alias = separate_replica()
+        MigrationRecorder(connections[alias]).flush()
+        with override_settings(DATABASE_ROUTERS=[]):
+            call_command('migrate', database=alias, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(external_id='veh-1')
+        create_readings(cls.vehicle, 3)
+        # The replica lags: it has the vehicle but only its first reading. bulk_create
+        # skips the signals, which would write their bookkeeping to 'default'.
+        replica = separate_replica()
+        Vehicle.objects.using(replica).bulk_create([Vehicle(pk=cls.vehicle.pk, external_id='veh-1', reading_count=1)])
+        VehicleSensorData.objects.using(replica).bulk_create(
+            [VehicleSensorData(vehicle_id=cls.vehicle.pk, prediction_result='H', prediction_score=0.8, **READING)]
+        )
+        _, cls.key = create_device_credential('veh-1 logger', vehicle_id='veh-1')
+        _, cls.other_key = create_device_credential('veh-1 backup logger', vehicle_id='veh-1')
+
+    def setUp(self):
+        cache.clear()
+        vehicle_cache.clear()
+        user_status_cache.clear()
+        device_key_cache.clear()
+
+    def history_count(self, key):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Device {key}')
+        response = self.client.get(reverse('prediction-history', args=['veh-1']))
+        self.assertEqual(response.status_code, 200)
+        return response.data['count']
+
+    def post_reading(self, key):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Device {key}')
+        response = self.client.post(
+            reverse('vehicle-sensor-list'), {'vehicle_id': 'veh-1', **READING}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_history_reads_from_replica(self):
+        self.assertEqual(self.history_count(self.key), 1)
+
+    def test_device_reads_its_own_writes(self):
+        self.post_reading(self.key)
+        self.assertEqual(self.history_count(self.key), 4)
+
+    def test_other_device_keeps_reading_from_replica(self):
+        # Device clients have no user id; each key is pinned on its own
+        self.post_reading(self.key)
+        self.assertEqual(self.history_count(self.other_key), 1)
+
+
+@skipUnless(renderers.orjson, 'orjson is not installed')
+class ORJSONRendererTests(SimpleTestCase):
+
+    def test_output_matches_json_renderer(self):
+        data = {
+            'score': Decimal('0.8125'),
+            'timestamp': datetime(2025, 1, 15, 10, 30, 0, 123456, tzinfo=dt_timezone.utc),
+            'naive': datetime(2025, 1, 15, 10, 30),
+            'day': date(2025, 1, 15),
+            'readings': [
+                {'engine_rpm': np.float64(812.5), 'count': np.int64(3), 'faulty': np.bool_(False)},
+                {'engine_rpm': np.float32(0.1), 'scores': np.array([0.1, 0.2], dtype=np.float32)},
+            ],
+            'matrix': np.arange(6).reshape(2, 3),
+            'label': 'Öl',
+            1: None,
+        }
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from monitoring.views import metrics
 
 
 urlpatterns = [
@@ -23,4 +24,6 @@ urlpatterns = [
     path('api/sensor/', include('sensor_api.urls')),
     path('api/auth/', include('authentication.urls')),
     path('api/ml/', include('ml_models.urls')),
+    path('api/monitoring/', include('monitoring.urls')),
+    path('metrics', metrics, name='metrics'),
 ]
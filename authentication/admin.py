@@ -1,3 +1,20 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DeviceCredential, OutboundEmail
+
+
+@admin.register(DeviceCredential)
+class DeviceCredentialAdmin(admin.ModelAdmin):
+    list_display = ('name', 'vehicle_id', 'key_prefix', 'owner', 'is_active', 'created_at', 'last_used_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'vehicle_id', 'key_prefix')
+    readonly_fields = ('key_prefix', 'key_hash', 'created_at', 'last_used_at')
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    # Bodies can carry password reset links
+    exclude = ('body',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
@@ -0,0 +1,219 @@
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from monitoring.metrics import record_cache_lookup, timed
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that records its cost as the 'jwt_authentication' span."""
+
+    def authenticate(self, request):
+        with timed('jwt_authentication'):
+            return super().authenticate(request)
+
+
+class UserStatusCache:
+    """
+    Short-TTL, in-process cache of whether a user id may authenticate.
+    Entries are dropped on user save/delete in this process (see signals.py);
+    other worker processes pick the change up once the TTL expires.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def is_active(self, user_id):
+        """Return True/False for an existing user, None if the user does not exist."""
+        # Token claims may carry the id as a string; key by the string form throughout
+        user_id = str(user_id)
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > now:
+            record_cache_lookup('user_status', hit=True)
+            return entry[0]
+
+        record_cache_lookup('user_status', hit=False)
+        row = get_user_model().objects.filter(pk=user_id).values_list('is_active', flat=True).first()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._evict(now)
+            self._entries[user_id] = (row, now + self.ttl)
+        return row
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self, now):
+        expired = [key for key, (_, expires) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+        # Still full: drop the oldest half (dicts keep insertion order)
+        if len(self._entries) >= self.max_entries:
+            for key in list(self._entries)[:self.max_entries // 2]:
+                del self._entries[key]
+
+
+user_status_cache = UserStatusCache(ttl=getattr(settings, 'AUTH_USER_STATUS_CACHE_TTL', 30))
+
+
+class StatelessJWTAuthentication(TimedJWTAuthentication):
+    """
+    JWT authentication for high-frequency telemetry endpoints.
+
+    Trusts the claims of a validated token and returns a TokenUser instead of
+    loading the User row. Only the user's active status is checked, through
+    user_status_cache, so a warm request costs a signature check and a dict lookup.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        is_active = user_status_cache.is_active(user_id)
+        if is_active is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+        return api_settings.TOKEN_USER_CLASS(validated_token)
+
+
+class DeviceUser:
+    """request.user for requests authenticated with a device key."""
+
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+    is_staff = False
+    is_superuser = False
+    pk = id = None
+
+    def __init__(self, credential):
+        self.credential = credential
+        self.username = f'device:{credential.name}'
+        self.vehicle_id = credential.vehicle_id or None
+
+    def __str__(self):
+        return self.username
+
+
+class DeviceKeyCache:
+    """
+    In-process cache of verified device keys, keyed by the key's HMAC.
+    Unknown keys are cached as None as well, so replaying a bad key does not
+    cost a database lookup every time.
+    """
+
+    def __init__(self, ttl=60, negative_ttl=10, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key_hash):
+        """Return (found, credential); found is False on a miss or expired entry."""
+        entry = self._entries.get(key_hash)
+        if entry is not None and entry[1] > time.monotonic():
+            record_cache_lookup('device_key', hit=True)
+            return True, entry[0]
+        record_cache_lookup('device_key', hit=False)
+        return False, None
+
+    def set(self, key_hash, credential):
+        ttl = self.ttl if credential is not None else self.negative_ttl
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key_hash] = (credential, time.monotonic() + ttl)
+
+    def invalidate_credential(self, credential_id):
+        with self._lock:
+            stale = [h for h, (c, _) in self._entries.items() if c is not None and c.pk == credential_id]
+            for key_hash in stale:
+                del self._entries[key_hash]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+device_key_cache = DeviceKeyCache(ttl=getattr(settings, 'DEVICE_KEY_CACHE_TTL', 60))
+
+
+class DeviceKeyAuthentication(BaseAuthentication):
+    """
+    Authenticate machine clients with 'Authorization: Device <key>'.
+
+    Verification is an HMAC of the presented key and a dict lookup; the database
+    is only consulted on a cache miss, and no password hasher is involved.
+    """
+
+    keyword = 'Device'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid device key header')
+
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid device key header')
+
+        with timed('device_key_authentication'):
+            credential = self.verify(key)
+        if credential is None:
+            raise exceptions.AuthenticationFailed('Invalid or revoked device key')
+        return DeviceUser(credential), credential
+
+    def verify(self, key):
+        from .device_keys import hash_device_key, split_device_key
+        from .models import DeviceCredential
+
+        prefix, _ = split_device_key(key)
+        if prefix is None:
+            return None
+
+        key_hash = hash_device_key(key)
+        found, credential = device_key_cache.get(key_hash)
+        if found:
+            return credential
+
+        credential = DeviceCredential.objects.filter(key_prefix=prefix, is_active=True).first()
+        if credential is not None and not hmac.compare_digest(credential.key_hash, key_hash):
+            credential = None
+        if credential is not None:
+            # Only touched on cache refresh, not on every request
+            DeviceCredential.objects.filter(pk=credential.pk).update(last_used_at=timezone.now())
+        device_key_cache.set(key_hash, credential)
+        return credential
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+# Authentication used by the sensor and ML endpoints
+TELEMETRY_AUTHENTICATION_CLASSES = [StatelessJWTAuthentication, DeviceKeyAuthentication]
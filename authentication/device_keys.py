@@ -0,0 +1,42 @@
+import hashlib
+import hmac
+import secrets
+
+from django.conf import settings
+
+PREFIX_BYTES = 6
+
+
+def hash_device_key(key):
+    """Keyed hash of a device key. Cheap enough to run on every request."""
+    return hmac.new(settings.SECRET_KEY.encode(), key.encode(), hashlib.sha256).hexdigest()
+
+
+def split_device_key(key):
+    """Return (prefix, secret) or (None, None) if the key is malformed."""
+    prefix, sep, secret = key.partition('.')
+    if not sep or not prefix or not secret or len(prefix) != PREFIX_BYTES * 2:
+        return None, None
+    return prefix, secret
+
+
+def generate_device_key():
+    """Return (key, prefix, key_hash) for a new credential. The key is shown to the caller once."""
+    prefix = secrets.token_hex(PREFIX_BYTES)
+    key = f'{prefix}.{secrets.token_urlsafe(32)}'
+    return key, prefix, hash_device_key(key)
+
+
+def create_device_credential(name, vehicle_id='', owner=None):
+    """Create a DeviceCredential and return (credential, plaintext key)."""
+    from .models import DeviceCredential
+
+    key, prefix, key_hash = generate_device_key()
+    credential = DeviceCredential.objects.create(
+        name=name,
+        vehicle_id=str(vehicle_id or ''),
+        key_prefix=prefix,
+        key_hash=key_hash,
+        owner=owner,
+    )
+    return credential, key
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count taken from PASSWORD_HASH_ITERATIONS.
+
+    Uses the same algorithm name as Django's hasher, so existing hashes keep
+    verifying and are transparently re-hashed at the new cost on next login.
+    Defaults to Django's own iteration count when the setting is unset.
+    """
+
+    iterations = getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
@@ -0,0 +1,99 @@
+"""
+Protection for the login and registration endpoints against login storms.
+
+- Password verification and hashing run on a small bounded thread pool, so a burst
+  of logins queues (and eventually gets a 503) instead of occupying every worker
+  needed by the prediction endpoints.
+- Credentials that just failed are remembered for a short time in the cache, keyed
+  by an HMAC of username and password, so retry loops with the same wrong password
+  are answered without running the hasher again.
+"""
+import hashlib
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from monitoring.metrics import record_cache_lookup, timed
+
+
+class LoginOverloaded(Exception):
+    """Raised when the password worker pool and its queue are full."""
+
+
+class PasswordWorkerPool:
+    """Thread pool with a bounded number of queued plus running password checks."""
+
+    def __init__(self, workers, queue_size, wait_timeout):
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password')
+            return self._executor
+
+    def run(self, func, *args, **kwargs):
+        """Run `func` on the pool and wait for its result. Runs inline when workers is 0."""
+        if not self.workers:
+            return func(*args, **kwargs)
+
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise LoginOverloaded()
+        try:
+            future = self._get_executor().submit(self._call, func, args, kwargs)
+            return future.result()
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _call(func, args, kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Worker threads hold their own DB connections; honour CONN_MAX_AGE for them too
+            close_old_connections()
+
+
+password_pool = PasswordWorkerPool(
+    workers=getattr(settings, 'LOGIN_HASHER_WORKERS', 2),
+    queue_size=getattr(settings, 'LOGIN_HASHER_QUEUE_SIZE', 32),
+    wait_timeout=getattr(settings, 'LOGIN_HASHER_QUEUE_TIMEOUT', 5),
+)
+
+
+def _failure_key(username, password):
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(), f'{username}\0{password}'.encode(), hashlib.sha256
+    ).hexdigest()
+    return f'login-failure:{digest}'
+
+
+def is_recent_failure(username, password):
+    hit = cache.get(_failure_key(username, password)) is not None
+    record_cache_lookup('login_failure', hit)
+    return hit
+
+
+def remember_failure(username, password):
+    cache.set(_failure_key(username, password), 1, getattr(settings, 'LOGIN_FAILURE_CACHE_TTL', 60))
+
+
+def forget_failure(username, password):
+    """Call when `password` becomes valid for `username` (registration, password reset)."""
+    cache.delete(_failure_key(username, password))
+
+
+def verify_credentials(username, password):
+    """authenticate() on the password pool. May raise LoginOverloaded."""
+    from django.contrib.auth import authenticate
+
+    with timed('password_verification'):
+        return password_pool.run(authenticate, username=username, password=password)
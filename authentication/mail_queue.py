@@ -0,0 +1,195 @@
+"""
+Outbound email queue.
+
+Emails are stored in the OutboundEmail table and sent by a background worker, so
+SMTP latency never shows up in request latency. The worker sends due messages in
+batches over a single backend connection and retries failures with exponential
+backoff. By default the worker is a daemon thread in the web process, woken when a
+message is queued; set EMAIL_QUEUE_WORKER = 'external' to run it only through
+`manage.py process_email_queue` instead.
+
+Bodies can hold secrets (password reset links), so a row's body is blanked once the
+message is sent or given up on, and finished rows are deleted after
+EMAIL_QUEUE_RETENTION_HOURS.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+emails_total = registry.counter(
+    'autointell_outbound_emails_total', 'Queued emails by delivery outcome.', labels=('result',)
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_email(subject, message, from_email, recipient_list):
+    """Persist an email for background delivery and wake the worker once the transaction commits."""
+    from .models import OutboundEmail
+
+    email = OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email,
+        recipients=list(recipient_list),
+    )
+    emails_total.inc(result='queued')
+    transaction.on_commit(wake_worker)
+    return email
+
+
+def claim_due_emails(batch_size):
+    """
+    Claim up to `batch_size` due emails for this worker.
+    Each row is claimed with a conditional update on its next_attempt_at, so
+    concurrent workers never send the same message twice within a lease.
+    """
+    from .models import OutboundEmail
+
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=_setting('EMAIL_QUEUE_LEASE_SECONDS', 300))
+    candidates = list(
+        OutboundEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('pk', 'next_attempt_at')[:batch_size]
+    )
+
+    claimed = []
+    for pk, due in candidates:
+        if OutboundEmail.objects.filter(pk=pk, status='pending', next_attempt_at=due).update(
+            next_attempt_at=lease_until
+        ):
+            claimed.append(pk)
+    return list(OutboundEmail.objects.filter(pk__in=claimed).order_by('created_at'))
+
+
+def _backoff(attempts):
+    base = _setting('EMAIL_QUEUE_RETRY_BASE_SECONDS', 30)
+    return timedelta(seconds=min(base * (2 ** (attempts - 1)), _setting('EMAIL_QUEUE_RETRY_MAX_SECONDS', 3600)))
+
+
+def send_due_emails(batch_size=None):
+    """Send one batch of due emails over a single connection. Returns the number sent."""
+    batch_size = batch_size or _setting('EMAIL_QUEUE_BATCH_SIZE', 50)
+    emails = claim_due_emails(batch_size)
+    if not emails:
+        return 0
+
+    max_attempts = _setting('EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+    sent = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not open email connection: {e}")
+        for email in emails:
+            _record_failure(email, e, max_attempts)
+        return 0
+
+    try:
+        for email in emails:
+            try:
+                EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=email.from_email,
+                    to=email.recipients,
+                    connection=connection,
+                ).send()
+            except Exception as e:
+                logger.error(f"Failed to send queued email {email.pk}: {e}")
+                _record_failure(email, e, max_attempts)
+                continue
+
+            email.status = 'sent'
+            email.body = ''
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            email.save(update_fields=['status', 'body', 'attempts', 'sent_at', 'last_error'])
+            emails_total.inc(result='sent')
+            sent += 1
+    finally:
+        connection.close()
+    return sent
+
+
+def _record_failure(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+        email.body = ''
+        emails_total.inc(result='failed')
+    else:
+        email.next_attempt_at = timezone.now() + _backoff(email.attempts)
+        emails_total.inc(result='retried')
+    email.save(update_fields=['status', 'body', 'attempts', 'last_error', 'next_attempt_at'])
+
+
+def purge_finished_emails():
+    """Delete sent and failed emails older than EMAIL_QUEUE_RETENTION_HOURS. Returns the number deleted."""
+    from .models import OutboundEmail
+
+    cutoff = timezone.now() - timedelta(hours=_setting('EMAIL_QUEUE_RETENTION_HOURS', 72))
+    deleted, _ = OutboundEmail.objects.filter(status__in=('sent', 'failed'), created_at__lt=cutoff).delete()
+    return deleted
+
+
+def drain_queue(batch_size=None):
+    """Send batches until nothing is due, then purge finished emails. Returns the total number sent."""
+    total = 0
+    while True:
+        sent = send_due_emails(batch_size)
+        total += sent
+        if not sent:
+            break
+    purge_finished_emails()
+    return total
+
+
+class EmailQueueWorker:
+    """Daemon thread that drains the queue when woken and polls for retries in between."""
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-queue', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                drain_queue()
+            except Exception as e:
+                logger.error(f"Email queue worker error: {e}")
+            finally:
+                close_old_connections()
+
+
+worker = EmailQueueWorker(poll_interval=_setting('EMAIL_QUEUE_POLL_SECONDS', 30))
+
+
+def wake_worker():
+    if _setting('EMAIL_QUEUE_WORKER', 'thread') == 'thread':
+        worker.wake()
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.device_keys import create_device_credential
+
+
+class Command(BaseCommand):
+    help = 'Issue an API key for a telematics device or gateway. The key is printed once and never stored.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Human-readable name for the device or gateway')
+        parser.add_argument('--vehicle-id', default='', help='Restrict the key to this vehicle (omit for a gateway key)')
+        parser.add_argument('--owner', help='Username of the owning account')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            try:
+                owner = get_user_model().objects.get(username=options['owner'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User {options['owner']} does not exist")
+
+        credential, key = create_device_credential(options['name'], options['vehicle_id'], owner)
+        self.stdout.write(self.style.SUCCESS(f'Created device credential {credential.pk} ({credential})'))
+        self.stdout.write(key)
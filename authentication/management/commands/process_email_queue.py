@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from authentication.mail_queue import drain_queue
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound emails. Runs continuously unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--batch-size', type=int, help='Emails sent per connection')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = drain_queue(options['batch_size'])
+            if sent:
+                self.stdout.write(f'Sent {sent} email(s)')
+            if options['once']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
@@ -18,3 +20,69 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+class DeviceCredential(models.Model):
+    """
+    API key for a telematics device or gateway.
+
+    Keys look like '<prefix>.<secret>'. Only an HMAC-SHA256 of the full key is
+    stored; the prefix is kept in clear so a presented key maps to one row.
+    A credential with a vehicle_id may only act for that vehicle; one without
+    is a gateway credential that may act for any vehicle.
+    """
+    name = models.CharField(max_length=100)
+    vehicle_id = models.CharField(max_length=50, blank=True)
+    key_prefix = models.CharField(max_length=16, unique=True)
+    key_hash = models.CharField(max_length=64)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='device_credentials'
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+
+    def may_access(self, vehicle_id):
+        """Whether this credential may read or write data for `vehicle_id`."""
+        if not self.vehicle_id:
+            return True
+        return vehicle_id is not None and str(vehicle_id) == self.vehicle_id
+
+    def __str__(self):
+        return f'{self.name} ({self.vehicle_id or "gateway"})'
+
+
+class OutboundEmail(models.Model):
+    """
+    Email waiting to be sent by the background mail queue (see mail_queue.py).
+    A worker claims a row by pushing next_attempt_at into the future, so rows
+    claimed by a worker that died become due again on their own.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='auth_outbound_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.recipients)} ({self.status})'
@@ -0,0 +1,39 @@
+from rest_framework.permissions import BasePermission
+
+from .models import DeviceCredential
+
+
+class DeviceVehicleScope(BasePermission):
+    """
+    Restrict device-key requests to the credential's own vehicle.
+    The vehicle comes from the URL (vehicle_id kwarg) or the request body, and for
+    single readings from the reading itself (has_object_permission). Devices only
+    report data, so no device key may delete it; a gateway key may otherwise act
+    for every vehicle. Requests not authenticated with a device key are unaffected.
+    """
+
+    message = 'This device key is not authorized for this vehicle.'
+
+    def has_permission(self, request, view):
+        credential = request.auth
+        if not isinstance(credential, DeviceCredential):
+            return True
+
+        if getattr(view, 'action', None) == 'destroy':
+            self.message = 'Device keys may not delete readings.'
+            return False
+
+        kwargs = getattr(view, 'kwargs', {})
+        vehicle_id = kwargs.get('vehicle_id')
+        if vehicle_id is None and hasattr(request.data, 'get'):
+            vehicle_id = request.data.get('vehicle_id')
+        if vehicle_id is None and getattr(view, 'lookup_field', None) in kwargs:
+            # A single reading: decided by its vehicle in has_object_permission
+            return True
+        return credential.may_access(vehicle_id)
+
+    def has_object_permission(self, request, view, obj):
+        credential = request.auth
+        if not isinstance(credential, DeviceCredential):
+            return True
+        return credential.may_access(obj.vehicle.external_id)
@@ -0,0 +1,16 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import device_key_cache, user_status_cache
+from .models import DeviceCredential
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def invalidate_user_status(sender, instance, **kwargs):
+    user_status_cache.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=DeviceCredential)
+def invalidate_device_key(sender, instance, **kwargs):
+    device_key_cache.invalidate_credential(instance.pk)
@@ -1,3 +1,274 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.backends import device_key_cache, user_status_cache
+from authentication.device_keys import create_device_credential
+from authentication.hashers import ConfigurablePBKDF2PasswordHasher
+from authentication.login_guard import PasswordWorkerPool
+from authentication.mail_queue import drain_queue, enqueue_email
+from authentication.models import OutboundEmail
+from monitoring.query_budget import record_queries
+from monitoring.testing import QueryBudgetTestMixin
+from sensor_api.models import Vehicle, VehicleSensorData
+from sensor_api.tests import create_readings
+from sensor_api.vehicles import vehicle_cache
+
+
+class TelemetryAuthenticationTestCase(QueryBudgetTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', password='unused-password')
+        cls.vehicle = Vehicle.objects.create(external_id='veh-1', owner=cls.user)
+        create_readings(cls.vehicle, 12)
+        cls.credential, cls.key = create_device_credential('veh-1 logger', vehicle_id='veh-1')
+
+    def setUp(self):
+        vehicle_cache.clear()
+        user_status_cache.clear()
+        device_key_cache.clear()
+
+
+class DeviceKeyAuthenticationTests(TelemetryAuthenticationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Device {self.key}')
+
+    def test_history_within_budget_on_key_cache_miss(self):
+        with self.assertWithinQueryBudget('prediction-history'):
+            response = self.client.get(reverse('prediction-history', args=['veh-1']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 12)
+
+    def test_gateway_list_within_budget(self):
+        _, key = create_device_credential('depot gateway')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Device {key}')
+        with self.assertWithinQueryBudget('vehicle-sensor-list'):
+            response = self.client.get(reverse('vehicle-sensor-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 12)
+
+    def test_cached_key_costs_no_queries(self):
+        url = reverse('latest-sensor-data', args=['veh-1'])
+        self.client.get(url)
+        with record_queries() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(recorder.count, 0)
+
+    def test_revoked_key_is_rejected(self):
+        type(self.credential).objects.filter(pk=self.credential.pk).update(is_active=False)
+        response = self.client.get(reverse('latest-sensor-data', args=['veh-1']))
+        self.assertEqual(response.status_code, 401)
+
+    def test_malformed_key_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Device not-a-key')
+        response = self.client.get(reverse('latest-sensor-data', args=['veh-1']))
+        self.assertEqual(response.status_code, 401)
+
+    def test_key_is_scoped_to_its_vehicle(self):
+        response = self.client.get(reverse('prediction-history', args=['veh-2']))
+        self.assertEqual(response.status_code, 403)
+
+
+class DeviceVehicleScopeTests(TelemetryAuthenticationTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.victim = Vehicle.objects.create(external_id='veh-2')
+        cls.victim_reading = create_readings(cls.victim, 1)[0]
+        cls.own_reading = VehicleSensorData.objects.filter(vehicle=cls.vehicle).first()
+
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Device {self.key}')
+
+    def detail_url(self, reading):
+        return reverse('vehicle-sensor-detail', args=[reading.pk])
+
+    def test_get_own_reading(self):
+        response = self.client.get(self.detail_url(self.own_reading))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['vehicle_id'], 'veh-1')
+
+    def test_get_other_vehicles_reading_is_forbidden(self):
+        response = self.client.get(self.detail_url(self.victim_reading))
+        self.assertEqual(response.status_code, 403)
+
+    def test_patch_other_vehicles_reading_is_forbidden(self):
+        # The body names the key's own vehicle; the reading belongs to another
+        response = self.client.patch(
+            self.detail_url(self.victim_reading), {'vehicle_id': 'veh-1', 'engine_rpm': 1.0}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.victim_reading.refresh_from_db()
+        self.assertEqual(self.victim_reading.vehicle_id, self.victim.pk)
+        self.assertNotEqual(self.victim_reading.engine_rpm, 1.0)
+
+    def test_patch_own_reading(self):
+        with self.assertWithinQueryBudget('vehicle-sensor-detail'):
+            response = self.client.patch(
+                self.detail_url(self.own_reading), {'engine_rpm': 900.0}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.own_reading.refresh_from_db()
+        self.assertEqual(self.own_reading.engine_rpm, 900.0)
+
+    def test_delete_other_vehicles_reading_is_forbidden(self):
+        response = self.client.delete(self.detail_url(self.victim_reading))
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(VehicleSensorData.objects.filter(pk=self.victim_reading.pk).exists())
+
+    def test_gateway_key_may_not_delete(self):
+        _, key = create_device_credential('depot gateway')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Device {key}')
+        response = self.client.delete(self.detail_url(self.victim_reading))
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(VehicleSensorData.objects.filter(pk=self.victim_reading.pk).exists())
+
+    def test_reading_cannot_change_vehicle(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.patch(self.detail_url(self.own_reading), {'vehicle_id': 'veh-2'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('vehicle_id', response.data)
+        self.own_reading.refresh_from_db()
+        self.assertEqual(self.own_reading.vehicle_id, self.vehicle.pk)
+        self.assertFalse(Vehicle.objects.filter(external_id='veh-3').exists())
+
+
+class StatelessJWTAuthenticationTests(TelemetryAuthenticationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_history_within_budget(self):
+        with self.assertWithinQueryBudget('prediction-history'):
+            response = self.client.get(reverse('prediction-history', args=['veh-1']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_fleet_within_budget(self):
+        with self.assertWithinQueryBudget('fleet-faulty-readings'):
+            response = self.client.get(reverse('fleet-faulty-readings'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_inactive_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.get(reverse('latest-sensor-data', args=['veh-1']))
+        self.assertEqual(response.status_code, 401)
+
+
+
+class RecordingPool(PasswordWorkerPool):
+    """Runs inline, on the test's DB connection, and records what it was given."""
+
+    def __init__(self):
+        super().__init__(workers=0, queue_size=0, wait_timeout=0)
+        self.calls = []
+
+    def run(self, func, *args, **kwargs):
+        self.calls.append(func)
+        return super().run(func, *args, **kwargs)
+
+
+class LoginGuardTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.pool = RecordingPool()
+        for target in ('authentication.login_guard.password_pool', 'authentication.views.password_pool'):
+            patcher = mock.patch(target, self.pool)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Django's default cost makes every hash take a noticeable fraction of a second
+        patcher = mock.patch.object(ConfigurablePBKDF2PasswordHasher, 'iterations', 1000)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def login(self, username, password):
+        return self.client.post(reverse('login'), {'username': username, 'password': password}, format='json')
+
+    def register(self, username, password):
+        return self.client.post(
+            reverse('register'), {'username': username, 'email': f'{username}@example.com', 'password': password},
+            format='json',
+        )
+
+    def test_register_hashes_on_the_pool_and_saves_on_the_request_thread(self):
+        response = self.register('driver', 'correct-horse')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.pool.calls, [make_password])
+        self.assertTrue(User.objects.get(username='driver').check_password('correct-horse'))
+
+    def test_failed_credentials_are_answered_from_the_cache(self):
+        User.objects.create_user('driver', password='correct-horse')
+        self.assertEqual(self.login('driver', 'wrong-horse').status_code, 400)
+        self.assertEqual(self.login('driver', 'wrong-horse').status_code, 400)
+        self.assertEqual(len(self.pool.calls), 1)
+
+        self.assertEqual(self.login('driver', 'correct-horse').status_code, 200)
+        self.assertEqual(len(self.pool.calls), 2)
+
+    def test_registration_forgets_a_cached_failure(self):
+        self.assertEqual(self.login('driver', 'correct-horse').status_code, 400)
+        self.register('driver', 'correct-horse')
+        self.assertEqual(self.login('driver', 'correct-horse').status_code, 200)
+
+    def test_saturated_pool_answers_503(self):
+        User.objects.create_user('driver', password='correct-horse')
+        self.pool.workers = 1
+        self.pool._slots = mock.Mock(**{'acquire.return_value': False})
+
+        for response in (self.login('driver', 'correct-horse'), self.register('other', 'correct-horse')):
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(User.objects.filter(username='other').exists())
+
+    def test_login_rehashes_at_the_configured_iterations(self):
+        with mock.patch.object(ConfigurablePBKDF2PasswordHasher, 'iterations', 500):
+            user = User.objects.create_user('driver', password='correct-horse')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$500$'))
+
+        self.assertEqual(self.login('driver', 'correct-horse').status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+
+class MailQueueTests(TestCase):
+
+    def test_body_is_blanked_once_sent(self):
+        email = enqueue_email('Reset', 'token=secret', 'noreply@example.com', ['user@example.com'])
+        self.assertEqual(drain_queue(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].body, 'token=secret')
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'sent')
+        self.assertEqual(email.body, '')
 
-# Create your tests here.
+    def test_finished_emails_are_purged(self):
+        old = enqueue_email('Old', 'body', 'noreply@example.com', ['user@example.com'])
+        drain_queue()
+        OutboundEmail.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        recent = enqueue_email('Recent', 'body', 'noreply@example.com', ['user@example.com'])
+        pending = enqueue_email('Later', 'body', 'noreply@example.com', ['user@example.com'])
+        OutboundEmail.objects.filter(pk=pending.pk).update(
+            created_at=timezone.now() - timedelta(days=30), next_attempt_at=timezone.now() + timedelta(hours=1)
+        )
+        drain_queue()
+        self.assertEqual(
+            set(OutboundEmail.objects.values_list('pk', flat=True)), {recent.pk, pending.pk}
+        )
@@ -3,25 +3,61 @@ from django.contrib.auth.hashers import make_password
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
 from django.conf import settings
 from rest_framework import status
 from rest_framework.decorators import api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.throttling import AnonRateThrottle
-from django.contrib.auth import authenticate
+from rest_framework.throttling import AnonRateThrottle, SimpleRateThrottle
 import logging
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
+from .mail_queue import enqueue_email
+from .login_guard import (
+    LoginOverloaded,
+    forget_failure,
+    is_recent_failure,
+    password_pool,
+    remember_failure,
+    verify_credentials,
+)
 
 logger = logging.getLogger(__name__)
 
 class PasswordResetRateThrottle(AnonRateThrottle):
     rate = getattr(settings, 'PASSWORD_RESET_THROTTLE_RATE', '5/h')
 
+class LoginRateThrottle(AnonRateThrottle):
+    """Per-IP limit on login attempts."""
+    scope = 'login'
+    rate = getattr(settings, 'LOGIN_THROTTLE_RATE', '30/min')
+
+class LoginUsernameRateThrottle(SimpleRateThrottle):
+    """Per-username limit on login attempts, whatever IP they come from."""
+    scope = 'login_username'
+    rate = getattr(settings, 'LOGIN_USERNAME_THROTTLE_RATE', '10/min')
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not username:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': str(username).lower()}
+
+class RegisterRateThrottle(AnonRateThrottle):
+    """Per-IP limit on account creation, which also runs the password hasher."""
+    scope = 'register'
+    rate = getattr(settings, 'REGISTER_THROTTLE_RATE', '10/h')
+
+def overloaded_response():
+    return Response(
+        {'error': 'Login service is busy. Please try again shortly.'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '5'}
+    )
+
 # User registration API
 @api_view(['POST'])
+@throttle_classes([RegisterRateThrottle])
 def register_user(request):
     """
     Register a new user with username, email, and password.
@@ -61,18 +97,22 @@ def register_user(request):
         )
 
     try:
-        # Create user with email
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            password=password  # create_user handles password hashing
+        # Only the hashing runs on the password pool; the user is saved on the request thread
+        hashed_password = password_pool.run(make_password, password)
+        User.objects.create(
+            username=User.normalize_username(username),
+            email=User.objects.normalize_email(email),
+            password=hashed_password
         )
+        forget_failure(username, password)
         
         logger.info(f"User registered successfully: {username}")
         return Response(
             {'message': 'User registered successfully'},
             status=status.HTTP_201_CREATED
         )
+    except LoginOverloaded:
+        return overloaded_response()
     except Exception as e:
         logger.error(f"Error registering user: {str(e)}")
         return Response(
@@ -82,6 +122,7 @@ def register_user(request):
 
 # User login API
 @api_view(['POST'])
+@throttle_classes([LoginRateThrottle, LoginUsernameRateThrottle])
 def login_user(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -89,9 +130,18 @@ def login_user(request):
     if not username or not password:
         return Response({'error': 'Username and password are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = authenticate(username=username, password=password)
+    # Same wrong credentials again: answer from the cache instead of re-running the hasher
+    if is_recent_failure(username, password):
+        return Response({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        user = verify_credentials(username, password)
+    except LoginOverloaded:
+        logger.warning("Login rejected: password worker pool is saturated")
+        return overloaded_response()
 
     if not user:
+        remember_failure(username, password)
         return Response({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
 
     # Generate JWT tokens
@@ -145,7 +195,7 @@ def request_password_reset(request):
         # Construct reset link
         reset_url = f"{settings.FRONTEND_URL}/reset-password-confirm/{uid}/{token}/"
         
-        # Send email
+        # Compose email
         subject = 'Password Reset Requested - AutoIntell'
         message = f"""
         Hello {user.username},
@@ -163,17 +213,17 @@ def request_password_reset(request):
         AutoIntell Team
         """
         
+        # Queue the email; the mail queue worker delivers it outside the request
         try:
-            send_mail(
+            enqueue_email(
                 subject=subject,
                 message=message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[user.email],
-                fail_silently=False,
             )
-            logger.info(f"Password reset email sent to {email}")
+            logger.info(f"Password reset email queued for {email}")
         except Exception as e:
-            logger.error(f"Failed to send password reset email to {email}: {str(e)}")
+            logger.error(f"Failed to queue password reset email for {email}: {str(e)}")
             return Response(
                 {'error': 'Failed to send password reset email. Please try again later.'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -234,8 +284,12 @@ def confirm_password_reset(request):
             )
 
         # Set new password
-        user.set_password(new_password1)
+        try:
+            password_pool.run(user.set_password, new_password1)
+        except LoginOverloaded:
+            return overloaded_response()
         user.save()
+        forget_failure(user.username, new_password1)
         
         logger.info(f"Password reset successful for user {user.username}")
         return Response(
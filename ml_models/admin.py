@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DriftSketch, ScoringJob
+
+
+@admin.register(ScoringJob)
+class ScoringJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'original_name', 'owner', 'status', 'rows_scored', 'rows_failed', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    raw_id_fields = ('owner',)
+    readonly_fields = ('input_offset', 'result_offset', 'attempts', 'lease_until', 'started_at', 'finished_at')
+
+
+@admin.register(DriftSketch)
+class DriftSketchAdmin(admin.ModelAdmin):
+    list_display = ('window_start', 'feature', 'reading_count', 'updated_at')
+    list_filter = ('feature',)
+    readonly_fields = ('window_start', 'feature', 'reading_count', 'sketch', 'updated_at')
@@ -0,0 +1,256 @@
+"""
+Data-drift monitoring of live sensor values against the training data.
+
+Every reading scored by the prediction endpoint is added to per-sensor quantile
+sketches (monitoring.sketches.KLLSketch) in this process; that is an append per
+sensor. A daemon thread merges the process's sketches into DriftSketch rows, one
+per sensor and WINDOW_MINUTES window, every FLUSH_SECONDS (sooner after
+FLUSH_READINGS readings), then starts afresh. Rows older than RETENTION_DAYS are
+dropped, so memory per process and storage overall stay bounded whatever the
+traffic.
+
+The reference distribution is a sketch of each column of engine_dataset.csv, the
+data the scaler and model were fit on. drift_report() merges the windows in a
+time range and compares them to it:
+
+    psi   population stability index over BINS reference-quantile bins
+    ks    largest gap between the two cumulative distributions (Kolmogorov-Smirnov)
+
+Readings not yet flushed (at most one interval per process) are not reported,
+and are lost if the process dies.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from monitoring.metrics import registry
+from monitoring.sketches import KLLSketch
+from sensor_api.archive import SENSOR_FIELDS
+from sensor_api.synthetic import DATASET_COLUMNS, DEFAULT_DATASET_PATH
+
+from .models import DriftSketch
+
+logger = logging.getLogger(__name__)
+
+drift_flushes_total = registry.counter(
+    'autointell_drift_flushes_total', 'Drift sketch flushes to the database.', labels=('result',)
+)
+
+
+def get_drift_settings():
+    options = {
+        'ENABLED': True,
+        'SKETCH_K': 200,
+        'WINDOW_MINUTES': 60,
+        'FLUSH_SECONDS': 60,
+        'FLUSH_READINGS': 5000,
+        'RETENTION_DAYS': 30,
+        'BINS': 10,
+        'PSI_WARNING': 0.1,
+        'PSI_CRITICAL': 0.25,
+    }
+    options.update(getattr(settings, 'DRIFT_MONITOR', {}))
+    return options
+
+
+def window_start(moment, minutes):
+    """Start of the `minutes`-long window containing `moment` (UTC, aligned to the epoch)."""
+    seconds = minutes * 60
+    stamp = int(moment.timestamp()) // seconds * seconds
+    return datetime.fromtimestamp(stamp, tz=dt_timezone.utc)
+
+
+@lru_cache(maxsize=1)
+def reference_sketches():
+    """Per-sensor sketches of the training dataset."""
+    k = get_drift_settings()['SKETCH_K']
+    data = np.loadtxt(DEFAULT_DATASET_PATH, delimiter=',', skiprows=1)
+    sketches = {}
+    for column, field in enumerate(SENSOR_FIELDS[:DATASET_COLUMNS]):
+        sketches[field] = KLLSketch(k=k, seed=column)
+        sketches[field].extend(data[:, column])
+    return sketches
+
+
+def _merge_into_window(start, field, sketch):
+    """Merge a sketch into the stored (window, sensor) row under a row lock."""
+    with transaction.atomic():
+        row = DriftSketch.objects.select_for_update().filter(window_start=start, feature=field).first()
+        if row is None:
+            try:
+                with transaction.atomic():
+                    DriftSketch.objects.create(
+                        window_start=start, feature=field, reading_count=sketch.n, sketch=sketch.to_dict()
+                    )
+                return
+            except IntegrityError:
+                # Another process created the window first
+                row = DriftSketch.objects.select_for_update().get(window_start=start, feature=field)
+        stored = KLLSketch.from_dict(row.sketch).merge(sketch)
+        row.sketch = stored.to_dict()
+        row.reading_count = stored.n
+        row.save(update_fields=['sketch', 'reading_count', 'updated_at'])
+
+
+class DriftMonitor:
+    """This process's live sketches, keyed by window, and the thread that flushes them."""
+
+    def __init__(self):
+        self._pending = {}
+        self._observed = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def observe(self, values):
+        """Add one reading; `values` are the sensor values in SENSOR_FIELDS order."""
+        options = get_drift_settings()
+        if not options['ENABLED']:
+            return
+        seconds = options['WINDOW_MINUTES'] * 60
+        start = int(time.time()) // seconds * seconds
+        with self._lock:
+            sketches = self._pending.get(start)
+            if sketches is None:
+                sketches = self._pending[start] = {
+                    field: KLLSketch(k=options['SKETCH_K']) for field in SENSOR_FIELDS
+                }
+            for field, value in zip(SENSOR_FIELDS, values):
+                sketches[field].update(value)
+            self._observed += 1
+            due = self._observed >= options['FLUSH_READINGS']
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='drift-monitor', daemon=True)
+                self._thread.start()
+        if due:
+            self._wake.set()
+
+    def flush(self):
+        """Merge pending sketches into the database. Returns the number of rows written."""
+        with self._lock:
+            pending, self._pending, self._observed = self._pending, {}, 0
+        written = 0
+        try:
+            for stamp, sketches in sorted(pending.items()):
+                start = datetime.fromtimestamp(stamp, tz=dt_timezone.utc)
+                for field in list(sketches):
+                    if sketches[field].n:
+                        _merge_into_window(start, field, sketches[field])
+                        written += 1
+                    # Written sketches must not be queued again if a later one fails
+                    del sketches[field]
+        except Exception:
+            # Keep the unsaved sketches for the next attempt
+            k = get_drift_settings()['SKETCH_K']
+            with self._lock:
+                for stamp, sketches in pending.items():
+                    current = self._pending.setdefault(stamp, {field: KLLSketch(k=k) for field in SENSOR_FIELDS})
+                    for field, sketch in sketches.items():
+                        current[field].merge(sketch)
+            drift_flushes_total.inc(result='error')
+            raise
+        drift_flushes_total.inc(result='ok')
+        return written
+
+    def _run(self):
+        while True:
+            options = get_drift_settings()
+            self._wake.wait(options['FLUSH_SECONDS'])
+            self._wake.clear()
+            try:
+                self.flush()
+                prune_windows()
+            except Exception as e:
+                logger.error(f"Drift sketch flush failed: {e}")
+            finally:
+                close_old_connections()
+
+
+monitor = DriftMonitor()
+
+
+def observe(values):
+    monitor.observe(values)
+
+
+def prune_windows():
+    cutoff = timezone.now() - timedelta(days=get_drift_settings()['RETENTION_DAYS'])
+    DriftSketch.objects.filter(window_start__lt=cutoff).delete()
+
+
+def population_stability_index(reference, live, bins):
+    """PSI over `bins` equal-mass bins of the reference distribution."""
+    edges = sorted({reference.quantile(i / bins) for i in range(1, bins)})
+    expected = np.diff([0.0] + [reference.cdf(edge) for edge in edges] + [1.0])
+    actual = np.diff([0.0] + [live.cdf(edge) for edge in edges] + [1.0])
+    # Floor empty bins so the log term stays finite
+    expected = np.clip(expected, 1e-4, None)
+    actual = np.clip(actual, 1e-4, None)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_statistic(reference, live, points=99):
+    """Largest CDF gap, evaluated at quantiles of both distributions."""
+    qs = [i / (points + 1) for i in range(1, points + 1)]
+    grid = {reference.quantile(q) for q in qs} | {live.quantile(q) for q in qs}
+    return max(abs(reference.cdf(x) - live.cdf(x)) for x in grid)
+
+
+def _summary(sketch):
+    return {q: round(sketch.quantile(value), 4) for q, value in (('p05', 0.05), ('p50', 0.5), ('p95', 0.95))}
+
+
+def drift_report(since, until=None):
+    """Drift of live readings in [since, until) against the training data, per sensor."""
+    options = get_drift_settings()
+    until = until or timezone.now()
+    rows = DriftSketch.objects.filter(
+        window_start__gte=window_start(since, options['WINDOW_MINUTES']), window_start__lt=until
+    ).values_list('feature', 'sketch')
+    live = {}
+    for field, data in rows:
+        sketch = KLLSketch.from_dict(data)
+        if field in live:
+            live[field].merge(sketch)
+        else:
+            live[field] = sketch
+
+    reference = reference_sketches()
+    features = {}
+    levels = ('ok', 'warning', 'critical')
+    worst = 'ok'
+    for field in SENSOR_FIELDS:
+        sketch = live.get(field)
+        if sketch is None or not sketch.n:
+            features[field] = {'readings': 0, 'psi': None, 'ks': None, 'status': 'no data'}
+            continue
+        psi = population_stability_index(reference[field], sketch, options['BINS'])
+        if psi >= options['PSI_CRITICAL']:
+            level = 'critical'
+        elif psi >= options['PSI_WARNING']:
+            level = 'warning'
+        else:
+            level = 'ok'
+        worst = max(worst, level, key=levels.index)
+        features[field] = {
+            'readings': sketch.n,
+            'psi': round(psi, 4),
+            'ks': round(ks_statistic(reference[field], sketch), 4),
+            'status': level,
+            'live': _summary(sketch),
+            'reference': _summary(reference[field]),
+        }
+
+    return {
+        'since': since,
+        'until': until,
+        'status': worst if any(f['readings'] for f in features.values()) else 'no data',
+        'features': features,
+    }
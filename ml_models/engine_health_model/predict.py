@@ -1,6 +1,7 @@
 import numpy as np
 import joblib
 from keras import models
+from monitoring.metrics import model_batch_size, timed
 
 lstm_model = models.load_model("ml_models/model_weights/lstm_engine.h5")
 scaler = joblib.load("ml_models/model_weights/scaler_engine.pkl")
@@ -8,9 +9,12 @@ scaler = joblib.load("ml_models/model_weights/scaler_engine.pkl")
 def predict_engine_health(engine_rpm, lub_oil_pressure, fuel_pressure, coolant_pressure, lub_oil_temp, coolant_temp):
     input_features = np.array([engine_rpm, lub_oil_pressure, fuel_pressure, coolant_pressure,lub_oil_temp, coolant_temp])
 
-    input_scaled = scaler.transform(input_features.reshape(1, -1))
+    with timed('scaler_transform'):
+        input_scaled = scaler.transform(input_features.reshape(1, -1))
 
-    lstm_prediction = lstm_model.predict(input_scaled)[0][0]
+    model_batch_size.observe(1, model='lstm')
+    with timed('model_predict'):
+        lstm_prediction = lstm_model.predict(input_scaled)[0][0]
 
     engine_condition = 1 if lstm_prediction > 0.5 else 0
 
@@ -18,3 +22,29 @@ def predict_engine_health(engine_rpm, lub_oil_pressure, fuel_pressure, coolant_p
         "lstm_prediction": float(lstm_prediction),
         "engine_condition": engine_condition
     }
+
+def predict_engine_health_batch(features, batch_size=4096):
+    """
+    Score many readings at once. `features` is an (n, 6) array in the same column
+    order as predict_engine_health's arguments. Returns (scores, conditions) arrays
+    of length n, with conditions 1 (healthy) or 0 as in predict_engine_health.
+    """
+    features = np.asarray(features, dtype=np.float64).reshape(-1, 6)
+    if len(features) == 0:
+        return np.empty(0), np.empty(0, dtype=np.int8)
+
+    with timed('scaler_transform'):
+        input_scaled = scaler.transform(features)
+
+    # Pad to whole batches: every distinct input shape costs a graph recompile
+    count = len(input_scaled)
+    padded = -count % batch_size if count > batch_size else 0
+    if padded:
+        input_scaled = np.concatenate([input_scaled, np.zeros((padded, input_scaled.shape[1]))])
+
+    model_batch_size.observe(count, model='lstm')
+    with timed('model_predict'):
+        scores = lstm_model.predict(input_scaled, batch_size=min(batch_size, count), verbose=0)[:count, 0]
+
+    scores = scores.astype(np.float64)
+    return scores, (scores > 0.5).astype(np.int8)
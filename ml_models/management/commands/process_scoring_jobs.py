@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ml_models.scoring_jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued offline scoring jobs. Runs continuously unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the pending jobs once and exit')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls')
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(f'Ran {count} scoring job(s)')
+            if options['once']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,53 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ml_models.rescoring import RescoreError, rescore
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute prediction_result and prediction_score for stored readings with the '
+        'current engine health model. Progress is checkpointed after every chunk; rerun '
+        'the command to resume an interrupted run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkpoint', default=str(Path(settings.BASE_DIR) / 'rescore_checkpoint.json'))
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over')
+        parser.add_argument('--chunk-size', type=int, default=50000,
+                            help='Primary key range per unit of work (fixed for the whole run)')
+        parser.add_argument('--batch-size', type=int, default=8192, help='Rows per model call')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes; each loads its own model copy (use 1 on SQLite)')
+
+    def handle(self, *args, **options):
+        began = time.perf_counter()
+
+        def progress(checkpoint, alias, lo, rows, changed):
+            done = len(checkpoint.data['completed'])
+            total = len(checkpoint.ranges())
+            elapsed = time.perf_counter() - began
+            self.stdout.write(
+                f'chunk {alias}:{lo}: {rows} row(s), {changed} changed [{done}/{total}] '
+                f"{checkpoint.data['rows'] / max(elapsed, 1e-9):.0f} rows/s"
+            )
+
+        try:
+            checkpoint = rescore(
+                options['checkpoint'],
+                chunk_size=options['chunk_size'],
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                restart=options['restart'],
+                progress=progress,
+            )
+        except RescoreError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rescored {checkpoint.data['rows']} reading(s), {checkpoint.data['changed']} changed "
+            f"(checkpoint {options['checkpoint']}; pass --restart for a new run)"
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_models', '0001_scoringjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriftSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField()),
+                ('feature', models.CharField(max_length=32)),
+                ('reading_count', models.BigIntegerField(default=0)),
+                ('sketch', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-window_start', 'feature'],
+                'constraints': [models.UniqueConstraint(fields=('window_start', 'feature'), name='ml_drift_sketch_window_uniq')],
+            },
+        ),
+    ]
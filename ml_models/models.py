@@ -1,3 +1,70 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class ScoringJob(models.Model):
+    """
+    Offline scoring of an uploaded CSV file (see scoring_jobs.py). The worker
+    checkpoints input_offset/result_offset after every chunk and holds the job
+    through lease_until, so a job whose worker died is picked up again and resumes
+    from its last checkpoint.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='scoring_jobs')
+    original_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    error = models.TextField(blank=True)
+
+    # Progress: input bytes consumed and result bytes written up to the last checkpoint
+    input_bytes = models.BigIntegerField(default=0)
+    input_offset = models.BigIntegerField(default=0)
+    result_offset = models.BigIntegerField(default=0)
+    rows_scored = models.BigIntegerField(default=0)
+    rows_failed = models.BigIntegerField(default=0)
+    faulty_count = models.BigIntegerField(default=0)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    lease_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'lease_until'], name='ml_scoring_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.original_name} ({self.status})'
+
+
+class DriftSketch(models.Model):
+    """
+    Quantile sketch (monitoring.sketches.KLLSketch) of one sensor's live values
+    over one time window. Web processes merge their in-memory sketches into the
+    window's row periodically (see drift.py); reports merge rows across windows.
+    """
+    window_start = models.DateTimeField()
+    feature = models.CharField(max_length=32)
+    reading_count = models.BigIntegerField(default=0)
+    sketch = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-window_start', 'feature']
+        constraints = [
+            models.UniqueConstraint(fields=['window_start', 'feature'], name='ml_drift_sketch_window_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.feature} @ {self.window_start} ({self.reading_count} readings)'
@@ -0,0 +1,285 @@
+"""
+Bulk re-scoring of stored readings after the engine health model is retrained.
+
+The readings table is split into fixed-width primary key ranges ("chunks"). With
+sharding (sensor_api/sharding.py) every database that may hold readings is split
+on its own, per block of ids in use there: a shard's ids start at its own block,
+and readings moved by rebalance_shards keep theirs. Each chunk is streamed with a
+server-side cursor, scored in batches through predict_engine_health_batch, and
+only rows whose result or score changed are written back (bulk_update, or a join
+against VALUES on PostgreSQL). Chunks run in-process or across a pool of worker
+processes, each with its own database connection and model copy.
+
+Finished chunks are recorded in a JSON checkpoint file, so an interrupted run
+resumes where it stopped. The checkpoint also stores a fingerprint of the model
+weights and scaler; resuming with a different model is refused, because the
+chunks already done would then have been scored by another model.
+
+Readings inserted after a run starts are scored by the live model already and
+are not part of the run; run rebalance_shards before, not during, a run. Hourly
+rollups and archived segments are not rescored; the columnar store is marked stale
+and rebuilt by `manage.py build_columnar_store --stale`.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import django
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.utils import timezone
+
+from sensor_api import columnar, sharding
+from sensor_api.archive import SENSOR_FIELDS
+from sensor_api.models import Vehicle, VehicleSensorData
+from sensor_api.vehicles import touch_vehicles
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILES = ['ml_models/model_weights/lstm_engine.h5', 'ml_models/model_weights/scaler_engine.pkl']
+SCORE_TOLERANCE = 1e-6
+
+
+class RescoreError(Exception):
+    pass
+
+
+def model_fingerprint():
+    digest = hashlib.sha256()
+    for name in MODEL_FILES:
+        with open(Path(settings.BASE_DIR) / name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def chunk_ranges(min_pk, max_pk, chunk_size):
+    """Half-open [lo, hi) primary key ranges covering min_pk..max_pk."""
+    return [(lo, min(lo + chunk_size, max_pk + 1)) for lo in range(min_pk, max_pk + 1, chunk_size)]
+
+
+def pk_extents(alias):
+    """
+    [min_pk, max_pk] of the readings on `alias`, one pair per block of ids in use
+    (sharding.ID_BLOCK_BITS), so the gaps between blocks are not chunked.
+    """
+    readings = VehicleSensorData.objects.using(alias)
+    extents = []
+    lo = readings.aggregate(pk=Min('pk'))['pk']
+    while lo is not None:
+        block_end = ((lo >> sharding.ID_BLOCK_BITS) + 1) << sharding.ID_BLOCK_BITS
+        hi = readings.filter(pk__lt=block_end).aggregate(pk=Max('pk'))['pk']
+        extents.append([lo, hi])
+        lo = readings.filter(pk__gte=block_end).aggregate(pk=Min('pk'))['pk']
+    return extents
+
+
+class Checkpoint:
+    """Progress of one rescoring run, persisted as JSON after every chunk."""
+
+    def __init__(self, path, data):
+        self.path = Path(path)
+        self.data = data
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        if 'extents' not in data:
+            # Written before sharding support: one range on 'default'
+            data['extents'] = {DEFAULT_DB_ALIAS: [[data.pop('min_pk'), data.pop('max_pk')]]}
+            data['completed'] = [[DEFAULT_DB_ALIAS, lo] for lo in data['completed']]
+        return cls(path, data)
+
+    @classmethod
+    def start(cls, path, fingerprint, extents, chunk_size):
+        """`extents` maps database aliases to their pk_extents()."""
+        return cls(path, {
+            'fingerprint': fingerprint,
+            'extents': extents,
+            'chunk_size': chunk_size,
+            'started_at': timezone.now().isoformat(),
+            'completed': [],
+            'rows': 0,
+            'changed': 0,
+        })
+
+    def ranges(self):
+        """(alias, lo, hi) chunks of the run."""
+        return [
+            (alias, lo, hi)
+            for alias, extents in self.data['extents'].items()
+            for min_pk, max_pk in extents
+            for lo, hi in chunk_ranges(min_pk, max_pk, self.data['chunk_size'])
+        ]
+
+    def pending(self):
+        done = {(alias, lo) for alias, lo in self.data['completed']}
+        return [r for r in self.ranges() if r[:2] not in done]
+
+    def mark_done(self, alias, lo, rows, changed):
+        self.data['completed'].append([alias, lo])
+        self.data['rows'] += rows
+        self.data['changed'] += changed
+        self.save()
+
+    def save(self):
+        tmp = self.path.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+
+def _score_rows(rows, batch_size, write_batch_size, using):
+    from ml_models.engine_health_model.predict import predict_engine_health_batch
+
+    values = np.array([row[1:1 + len(SENSOR_FIELDS)] for row in rows], dtype=np.float64)
+    scores, conditions = predict_engine_health_batch(values, batch_size=batch_size)
+
+    changed = []
+    for row, score, condition in zip(rows, scores, conditions):
+        result = 'H' if condition == 1 else 'F'
+        old_result, old_score = row[-2], row[-1]
+        if result != old_result or old_score is None or abs(old_score - score) > SCORE_TOLERANCE:
+            changed.append((row[0], result, float(score)))
+
+    if changed:
+        with transaction.atomic(using=using):
+            write_scores(changed, write_batch_size, using)
+    return len(changed)
+
+
+def write_scores(changed, batch_size, using=DEFAULT_DB_ALIAS):
+    """Apply (pk, prediction_result, prediction_score) tuples to the readings on `using`."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        # A join against VALUES is an order of magnitude faster than the CASE
+        # expression bulk_update builds, which is evaluated per row per WHEN.
+        # Plain placeholders, so it runs on psycopg2 and psycopg 3 alike.
+        table = connection.ops.quote_name(VehicleSensorData._meta.db_table)
+        with connection.cursor() as cursor:
+            for start in range(0, len(changed), batch_size):
+                batch = changed[start:start + batch_size]
+                values = ', '.join(['(%s::bigint, %s::varchar, %s::double precision)'] * len(batch))
+                cursor.execute(
+                    f'UPDATE {table} AS t SET prediction_result = v.result, prediction_score = v.score '
+                    f'FROM (VALUES {values}) AS v(id, result, score) WHERE t.id = v.id',
+                    [value for row in batch for value in row],
+                )
+        return
+    VehicleSensorData.objects.using(using).bulk_update(
+        [VehicleSensorData(pk=pk, prediction_result=result, prediction_score=score) for pk, result, score in changed],
+        ['prediction_result', 'prediction_score'],
+        batch_size=batch_size,
+    )
+
+
+def rescore_range(lo, hi, batch_size=8192, write_batch_size=5000, using=DEFAULT_DB_ALIAS):
+    """Rescore readings on `using` with lo <= pk < hi. Returns (rows scored, rows changed)."""
+    queryset = (
+        VehicleSensorData.objects.using(using).filter(pk__gte=lo, pk__lt=hi)
+        .order_by('pk')
+        .values_list('pk', *SENSOR_FIELDS, 'prediction_result', 'prediction_score')
+    )
+    total = changed = 0
+    rows = []
+    for row in queryset.iterator(chunk_size=batch_size):
+        rows.append(row)
+        if len(rows) >= batch_size:
+            changed += _score_rows(rows, batch_size, write_batch_size, using)
+            total += len(rows)
+            rows = []
+    if rows:
+        changed += _score_rows(rows, batch_size, write_batch_size, using)
+        total += len(rows)
+    return total, changed
+
+
+def refresh_vehicle_predictions(batch_size=5000):
+    """Copy rescored values onto Vehicle.latest_prediction_*. Returns vehicles updated."""
+    vehicles = Vehicle.objects.filter(latest_reading__isnull=False)
+    if not sharding.is_enabled():
+        latest = VehicleSensorData.objects.filter(pk=OuterRef('latest_reading'))
+        return vehicles.update(
+            latest_prediction_result=Subquery(latest.values('prediction_result')[:1]),
+            latest_prediction_score=Subquery(latest.values('prediction_score')[:1]),
+        )
+
+    # Readings and vehicles are in different databases: look the latest readings up
+    # on every database and write the values back in batches
+    latest = dict(vehicles.values_list('latest_reading', 'pk'))
+    ids = list(latest)
+    updated = []
+    for alias in sharding.source_databases():
+        for start in range(0, len(ids), batch_size):
+            rows = VehicleSensorData.objects.using(alias).filter(pk__in=ids[start:start + batch_size])
+            updated += [
+                Vehicle(pk=latest[pk], latest_prediction_result=result, latest_prediction_score=score)
+                for pk, result, score in rows.values_list('pk', 'prediction_result', 'prediction_score')
+            ]
+    Vehicle.objects.bulk_update(
+        updated, ['latest_prediction_result', 'latest_prediction_score'], batch_size=batch_size
+    )
+    return len(updated)
+
+
+def rescore(checkpoint_path, chunk_size=50000, batch_size=8192, workers=1, restart=False, progress=None):
+    """
+    Rescore every reading that existed when the run started, resuming from
+    `checkpoint_path` if it holds an unfinished run. `progress(checkpoint, alias, lo,
+    rows, changed)` is called after each chunk. Returns the checkpoint.
+    """
+    fingerprint = model_fingerprint()
+    checkpoint = None if restart else Checkpoint.load(checkpoint_path)
+    if checkpoint is not None and checkpoint.data['fingerprint'] != fingerprint:
+        raise RescoreError(
+            f'{checkpoint_path} belongs to a run with a different model; pass --restart to start over'
+        )
+    if checkpoint is None:
+        extents = {alias: pk_extents(alias) for alias in sharding.source_databases()}
+        extents = {alias: ranges for alias, ranges in extents.items() if ranges}
+        if not extents:
+            raise RescoreError('There are no readings to rescore')
+        checkpoint = Checkpoint.start(checkpoint_path, fingerprint, extents, chunk_size)
+        checkpoint.save()
+
+    pending = checkpoint.pending()
+
+    def finished(alias, lo, rows, changed):
+        checkpoint.mark_done(alias, lo, rows, changed)
+        if progress:
+            progress(checkpoint, alias, lo, rows, changed)
+
+    if workers <= 1:
+        for alias, lo, hi in pending:
+            finished(alias, lo, *rescore_range(lo, hi, batch_size, using=alias))
+    else:
+        # Fork would share the parent's database connection and model runtime state.
+        # Spawned workers set Django up before unpickling their first task, which
+        # imports this module and with it the models.
+        context = multiprocessing.get_context('spawn')
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=django.setup) as pool:
+            futures = {
+                pool.submit(rescore_range, lo, hi, batch_size, using=alias): (alias, lo) for alias, lo, hi in pending
+            }
+            for future in as_completed(futures):
+                finished(*futures[future], *future.result())
+
+    updated = refresh_vehicle_predictions()
+    if checkpoint.data['changed']:
+        # Invalidate cached history responses and the columnar copies of the old scores
+        touch_vehicles()
+        columnar.invalidate_vehicles()
+    logger.info(f"Rescoring finished: {checkpoint.data['rows']} rows, {checkpoint.data['changed']} changed, "
+                f"{updated} vehicles refreshed")
+    return checkpoint
@@ -0,0 +1,357 @@
+"""
+Offline batch scoring of uploaded CSV files.
+
+An upload is stored under SCORING_JOBS_DIR/<job id>/input.csv and recorded as a
+queued ScoringJob. A worker claims the job, reads the file CHUNK_ROWS lines at a
+time, scores each chunk with one predict_engine_health_batch call and appends the
+rows, with prediction_score and prediction_result columns added, to result.csv.
+After every chunk the job row is updated with the input and result byte offsets
+and the row counts. Those offsets are the checkpoint: a job whose worker died
+(its lease expired) is claimed again, the result file is cut back to
+result_offset and reading resumes at input_offset.
+
+Each claim increments attempts, and every update a worker makes to the job row
+is fenced on the attempts value it claimed, so a worker that lost its job to a
+new claim stops at its next update. The lease is renewed between scoring batches
+within a chunk and before every write to the result file; a worker that is still
+writing therefore never has its job claimed by another.
+
+Input files use engine_dataset.csv's header; the six sensor columns are matched
+by name (case-insensitively) and any other columns are copied through. Each line
+is one record. Rows that cannot be parsed are written with an error column
+instead of a score.
+
+Like the mail queue, the worker is a daemon thread in the web process woken when
+a job is queued, unless SCORING_JOB_WORKER = 'external'; then only
+`manage.py process_scoring_jobs` runs jobs.
+"""
+import csv
+import io
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from monitoring.metrics import registry
+
+from .models import ScoringJob
+
+logger = logging.getLogger(__name__)
+
+scoring_job_rows_total = registry.counter(
+    'autointell_scoring_job_rows_total', 'Rows processed by offline scoring jobs.', labels=('result',)
+)
+
+# Sensor columns in predict_engine_health argument order, as named in engine_dataset.csv
+FEATURE_COLUMNS = ['Engine rpm', 'Lub oil pressure', 'Fuel pressure', 'Coolant pressure', 'lub oil temp', 'Coolant temp']
+RESULT_COLUMNS = ['prediction_score', 'prediction_result', 'error']
+
+
+class InvalidUpload(ValueError):
+    pass
+
+
+class LeaseLost(Exception):
+    """The job was claimed by another worker after this worker's lease expired."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def jobs_dir():
+    return Path(_setting('SCORING_JOBS_DIR', Path(settings.BASE_DIR) / 'scoring_jobs'))
+
+
+def input_path(job):
+    return jobs_dir() / str(job.pk) / 'input.csv'
+
+
+def result_path(job):
+    return jobs_dir() / str(job.pk) / 'result.csv'
+
+
+def feature_indexes(header):
+    """Positions of FEATURE_COLUMNS in a header row. Raises InvalidUpload if any is missing."""
+    names = [name.strip().lower() for name in header]
+    missing = [column for column in FEATURE_COLUMNS if column.lower() not in names]
+    if missing:
+        raise InvalidUpload(f"Missing column(s): {', '.join(missing)}")
+    return [names.index(column.lower()) for column in FEATURE_COLUMNS]
+
+
+def create_job(owner, upload):
+    """
+    Store an uploaded file and queue a job for it; the worker is woken once the
+    transaction commits. Raises InvalidUpload for a bad header or oversized file.
+    """
+    max_bytes = _setting('SCORING_JOB_MAX_BYTES', 512 * 1024 * 1024)
+    if upload.size > max_bytes:
+        raise InvalidUpload(f'File is larger than {max_bytes} bytes')
+
+    first_line = next(upload.chunks()).split(b'\n', 1)[0]
+    upload.seek(0)
+    header = next(csv.reader([first_line.decode('utf-8-sig', errors='replace')]), [])
+    feature_indexes(header)
+
+    # The file is in place before the row exists, so a worker never sees a partial upload
+    job = ScoringJob(owner=owner, original_name=upload.name[:255], input_bytes=upload.size)
+    path = input_path(job)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    job.save(force_insert=True)
+    transaction.on_commit(wake_worker)
+    return job
+
+
+def delete_job_files(job):
+    shutil.rmtree(jobs_dir() / str(job.pk), ignore_errors=True)
+
+
+def claim_job():
+    """
+    Claim the oldest queued job, or a running one whose lease expired. The claim
+    is a conditional update on status and lease_until, so two workers never run
+    the same job at once. Returns the job or None.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=_setting('SCORING_JOB_LEASE_SECONDS', 300))
+    candidates = (
+        ScoringJob.objects.filter(Q(status='queued') | Q(status='running', lease_until__lt=now))
+        .order_by('created_at')
+        .values_list('pk', 'status', 'lease_until')[:5]
+    )
+    for pk, status, lease_until in candidates:
+        claimed = ScoringJob.objects.filter(pk=pk, status=status, lease_until=lease_until).update(
+            status='running',
+            lease_until=now + lease,
+            attempts=F('attempts') + 1,
+            started_at=F('started_at') if status == 'running' else now,
+        )
+        if claimed:
+            return ScoringJob.objects.get(pk=pk)
+    return None
+
+
+class Lease:
+    """A worker's hold on a claimed job: fenced updates of its row, and renewal."""
+
+    def __init__(self, job, seconds):
+        self.job = job
+        self.seconds = seconds
+        self.renewed_at = time.monotonic()
+
+    def update(self, **fields):
+        """Update the job row if this worker still holds the job; raise LeaseLost otherwise."""
+        if not ScoringJob.objects.filter(pk=self.job.pk, attempts=self.job.attempts).update(**fields):
+            raise LeaseLost(f'Scoring job {self.job.pk} was claimed by another worker')
+
+    def renew(self, force=False):
+        """Extend the lease once a third of it has passed (or now, with `force`)."""
+        if force or time.monotonic() - self.renewed_at > self.seconds / 3:
+            self.update(lease_until=timezone.now() + timedelta(seconds=self.seconds))
+            self.renewed_at = time.monotonic()
+
+
+def _parse_chunk(lines, indexes):
+    """Split raw lines into CSV rows and a feature matrix; rows that do not parse get an error."""
+    rows = list(csv.reader(line.decode('utf-8', errors='replace').rstrip('\r\n') for line in lines))
+    features = np.zeros((len(rows), len(indexes)))
+    errors = [''] * len(rows)
+    for i, row in enumerate(rows):
+        try:
+            features[i] = [float(row[index]) for index in indexes]
+        except (ValueError, IndexError):
+            errors[i] = 'unparseable sensor values'
+    return rows, features, errors
+
+
+def _score_chunk(lines, indexes, batch_size, lease=None):
+    """
+    Score one chunk, renewing `lease` between batches. Returns (csv text, rows
+    scored, rows failed, faulty rows).
+    """
+    from .engine_health_model.predict import predict_engine_health_batch
+
+    rows, features, errors = _parse_chunk(lines, indexes)
+    valid = np.array([not error for error in errors], dtype=bool)
+    scores = np.full(len(rows), np.nan)
+    valid_scores = np.empty(int(valid.sum()))
+    valid_features = features[valid]
+    for start in range(0, len(valid_features), batch_size):
+        valid_scores[start:start + batch_size], _ = predict_engine_health_batch(
+            valid_features[start:start + batch_size], batch_size=batch_size
+        )
+        if lease is not None:
+            lease.renew()
+    scores[valid] = valid_scores
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    faulty = 0
+    for row, score, error in zip(rows, scores, errors):
+        if error:
+            writer.writerow(row + ['', '', error])
+            continue
+        result = 'H' if score > 0.5 else 'F'
+        faulty += result == 'F'
+        writer.writerow(row + [f'{score:.6f}', result, ''])
+    failed = len(rows) - int(valid.sum())
+    return out.getvalue(), len(rows) - failed, failed, faulty
+
+
+def _read_lines(f, count):
+    lines = []
+    for _ in range(count):
+        line = f.readline()
+        if not line:
+            break
+        if line.strip():
+            lines.append(line)
+    return lines
+
+
+def run_job(job, chunk_rows=None, batch_size=8192):
+    """Process a claimed job from its checkpoint to the end. Returns the job."""
+    chunk_rows = chunk_rows or _setting('SCORING_JOB_CHUNK_ROWS', 50000)
+    lease = Lease(job, _setting('SCORING_JOB_LEASE_SECONDS', 300))
+    max_attempts = _setting('SCORING_JOB_MAX_ATTEMPTS', 3)
+    try:
+        if job.attempts > max_attempts:
+            # Workers keep dying on this job (e.g. out of memory); stop retrying it
+            lease.update(
+                status='failed', error=f'Abandoned after {max_attempts} attempts', finished_at=timezone.now()
+            )
+        else:
+            _run_claimed_job(job, lease, chunk_rows, batch_size)
+    except LeaseLost as e:
+        logger.warning(str(e))
+
+    job.refresh_from_db()
+    return job
+
+
+def _run_claimed_job(job, lease, chunk_rows, batch_size):
+    try:
+        # Still ours before the result file is touched
+        lease.renew(force=True)
+        with open(input_path(job), 'rb') as src, open(result_path(job), 'ab') as dst:
+            header_line = src.readline()
+            header = next(csv.reader([header_line.decode('utf-8-sig', errors='replace')]))
+            indexes = feature_indexes(header)
+
+            # Drop anything written after the last checkpoint
+            dst.truncate(job.result_offset)
+            dst.seek(job.result_offset)
+            if job.result_offset == 0:
+                dst.write(_csv_line([name.strip() for name in header] + RESULT_COLUMNS))
+            if job.input_offset:
+                src.seek(job.input_offset)
+
+            while True:
+                lines = _read_lines(src, chunk_rows)
+                if not lines:
+                    break
+                text, scored, failed, faulty = _score_chunk(lines, indexes, batch_size, lease)
+                lease.renew(force=True)
+                dst.write(text.encode())
+                dst.flush()
+                os.fsync(dst.fileno())
+
+                job.input_offset = src.tell()
+                job.result_offset = dst.tell()
+                lease.update(
+                    input_offset=job.input_offset,
+                    result_offset=job.result_offset,
+                    rows_scored=F('rows_scored') + scored,
+                    rows_failed=F('rows_failed') + failed,
+                    faulty_count=F('faulty_count') + faulty,
+                )
+                scoring_job_rows_total.inc(scored, result='scored')
+                scoring_job_rows_total.inc(failed, result='failed')
+    except LeaseLost:
+        raise
+    except Exception as e:
+        logger.error(f"Scoring job {job.pk} failed: {e}")
+        lease.update(status='failed', error=str(e), finished_at=timezone.now())
+    else:
+        lease.update(status='succeeded', finished_at=timezone.now(), lease_until=None)
+        logger.info(f"Scoring job {job.pk} finished")
+
+
+def _csv_line(values):
+    out = io.StringIO()
+    csv.writer(out).writerow(values)
+    return out.getvalue().encode()
+
+
+def run_pending_jobs():
+    """Run claimable jobs until none are left. Returns the number of jobs run."""
+    count = 0
+    while True:
+        job = claim_job()
+        if job is None:
+            return count
+        run_job(job)
+        count += 1
+
+
+def job_progress(job):
+    """Progress fields for the API: fraction of input consumed and rows per second so far."""
+    fraction = job.input_offset / job.input_bytes if job.input_bytes else 0.0
+    if job.status == 'succeeded':
+        fraction = 1.0
+    elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds() if job.started_at else 0
+    rows = job.rows_scored + job.rows_failed
+    return {
+        'fraction': round(min(fraction, 1.0), 4),
+        'rows_processed': rows,
+        'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+class ScoringJobWorker:
+    """Daemon thread that runs jobs when woken and polls for abandoned ones in between."""
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='scoring-jobs', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                run_pending_jobs()
+            except Exception as e:
+                logger.error(f"Scoring job worker error: {e}")
+            finally:
+                close_old_connections()
+
+
+worker = ScoringJobWorker(poll_interval=_setting('SCORING_JOB_POLL_SECONDS', 60))
+
+
+def wake_worker():
+    if _setting('SCORING_JOB_WORKER', 'thread') == 'thread':
+        worker.wake()
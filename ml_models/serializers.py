@@ -0,0 +1,28 @@
+from rest_framework import serializers
+
+from .models import ScoringJob
+from .scoring_jobs import job_progress
+
+
+class ScoringJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ScoringJob
+        fields = [
+            'id',
+            'original_name',
+            'status',
+            'error',
+            'input_bytes',
+            'rows_scored',
+            'rows_failed',
+            'faulty_count',
+            'progress',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+
+    def get_progress(self, obj):
+        return job_progress(obj)
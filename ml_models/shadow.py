@@ -0,0 +1,237 @@
+"""
+Shadow evaluation of candidate models on live prediction traffic.
+
+A SAMPLE_RATE fraction of requests to the prediction endpoint hands its features
+and the primary model's score to submit(). That is a random draw and a
+non-blocking put on a queue of QUEUE_SIZE entries: when the queue is full the
+sample is dropped (and counted), so the request never waits on shadow work.
+
+A daemon thread takes samples off the queue in batches of up to BATCH_SIZE
+(waiting at most MAX_WAIT_SECONDS for a batch to fill) and scores each batch with
+every backend in SHADOW_EVALUATION['BACKENDS']:
+
+    {'MODEL': 'path/to/model.h5', 'SCALER': 'path/to/scaler.pkl'}   Keras model;
+                                                                      SCALER defaults
+                                                                      to the primary's
+    {'CALLABLE': 'package.module.function'}                          features (n, 6) ->
+                                                                      scores (n,)
+
+Per backend it records, in the metrics registry (/metrics): predictions that
+agree or disagree with the primary's condition, the absolute score delta and the
+latency of each batch call. Backends are loaded, and run once on a dummy batch,
+in the worker thread on first use; the thread runs at a lower OS priority than
+request threads. Statistics are per process, like every other metric.
+"""
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from monitoring.metrics import model_batch_size, registry
+
+logger = logging.getLogger(__name__)
+
+SCORE_DELTA_BUCKETS = (0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+shadow_samples_total = registry.counter(
+    'autointell_shadow_samples_total', 'Prediction requests sampled for shadow scoring.', labels=('result',)
+)
+shadow_predictions_total = registry.counter(
+    'autointell_shadow_predictions_total', 'Shadow predictions by agreement with the primary model.',
+    labels=('backend', 'agreement'),
+)
+shadow_score_delta = registry.histogram(
+    'autointell_shadow_score_delta', 'Absolute difference between shadow and primary scores.',
+    labels=('backend',), buckets=SCORE_DELTA_BUCKETS,
+)
+shadow_batch_duration = registry.histogram(
+    'autointell_shadow_batch_duration_seconds', 'Latency of one shadow backend call on a batch.',
+    labels=('backend',),
+)
+shadow_errors_total = registry.counter(
+    'autointell_shadow_errors_total', 'Shadow backend batches that failed.', labels=('backend',)
+)
+
+
+def get_shadow_settings():
+    options = {
+        'ENABLED': False,
+        'SAMPLE_RATE': 0.05,
+        'QUEUE_SIZE': 1000,
+        'BATCH_SIZE': 64,
+        'MAX_WAIT_SECONDS': 0.5,
+        'BACKENDS': {},
+    }
+    options.update(getattr(settings, 'SHADOW_EVALUATION', {}))
+    return options
+
+
+def keras_backend(model_path, scaler_path=None, batch_size=64):
+    """Scoring function for a Keras model file, using the primary scaler unless given one."""
+    import joblib
+    from keras import models
+
+    from .engine_health_model.predict import scaler as primary_scaler
+
+    model = models.load_model(model_path)
+    scaler = joblib.load(scaler_path) if scaler_path else primary_scaler
+
+    def score(features):
+        scaled = scaler.transform(features)
+        count = len(scaled)
+        # Always predict full batches: every new input shape costs a graph recompile
+        padded = -count % batch_size
+        if padded:
+            scaled = np.concatenate([scaled, np.zeros((padded, scaled.shape[1]))])
+        return model.predict(scaled, batch_size=batch_size, verbose=0)[:count, 0]
+
+    return score
+
+
+def load_backend(name, spec, batch_size):
+    if 'CALLABLE' in spec:
+        return import_string(spec['CALLABLE'])
+    if 'MODEL' in spec:
+        return keras_backend(spec['MODEL'], spec.get('SCALER'), batch_size=batch_size)
+    raise ValueError(f"Shadow backend {name} needs MODEL or CALLABLE")
+
+
+class ShadowEvaluator:
+    """Bounded sample queue and the worker thread that scores it."""
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._backends = None
+
+    def submit(self, features, primary_score):
+        """Maybe queue a request for shadow scoring. Never blocks."""
+        options = get_shadow_settings()
+        if not options['ENABLED'] or not options['BACKENDS'] or random.random() >= options['SAMPLE_RATE']:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._start(options)
+        try:
+            self._queue.put_nowait((features, primary_score))
+        except queue.Full:
+            shadow_samples_total.inc(result='dropped')
+        else:
+            shadow_samples_total.inc(result='queued')
+
+    def _start(self, options):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=options['QUEUE_SIZE'])
+            self._thread = threading.Thread(target=self._run, name='shadow-evaluation', daemon=True)
+            self._thread.start()
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _next_batch(self, options):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + options['MAX_WAIT_SECONDS']
+        while len(batch) < options['BATCH_SIZE']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _load_backends(self, options):
+        backends = {}
+        for name, spec in options['BACKENDS'].items():
+            try:
+                backend = load_backend(name, spec, options['BATCH_SIZE'])
+                # Compile now rather than inside the first measured batch
+                backend(np.zeros((options['BATCH_SIZE'], 6)))
+                backends[name] = backend
+            except Exception as e:
+                logger.error(f"Could not load shadow backend {name}: {e}")
+                shadow_errors_total.inc(backend=name)
+        return backends
+
+    def _run(self):
+        try:
+            # Lower this thread's CPU priority below the request threads' (Linux)
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            options = get_shadow_settings()
+            batch = self._next_batch(options)
+            if self._backends is None:
+                self._backends = self._load_backends(options)
+            try:
+                self.evaluate(batch)
+            except Exception as e:
+                logger.error(f"Shadow evaluation failed: {e}")
+
+    def evaluate(self, batch):
+        """Score one batch of (features, primary score) samples with every backend."""
+        features = np.array([item[0] for item in batch], dtype=np.float64).reshape(-1, 6)
+        primary = np.array([item[1] for item in batch], dtype=np.float64)
+        primary_condition = primary > 0.5
+        for name, backend in self._backends.items():
+            start = time.perf_counter()
+            try:
+                scores = np.asarray(backend(features), dtype=np.float64).reshape(-1)
+            except Exception as e:
+                logger.error(f"Shadow backend {name} failed: {e}")
+                shadow_errors_total.inc(backend=name)
+                continue
+            shadow_batch_duration.observe(time.perf_counter() - start, backend=name)
+            model_batch_size.observe(len(features), model=f'shadow:{name}')
+
+            agree = int(np.count_nonzero((scores > 0.5) == primary_condition))
+            shadow_predictions_total.inc(agree, backend=name, agreement='agree')
+            shadow_predictions_total.inc(len(scores) - agree, backend=name, agreement='disagree')
+            for delta in np.abs(scores - primary):
+                shadow_score_delta.observe(float(delta), backend=name)
+
+
+evaluator = ShadowEvaluator()
+
+
+def submit(features, primary_score):
+    evaluator.submit(features, primary_score)
+
+
+def backend_stats():
+    """This process's shadow statistics per configured backend."""
+    options = get_shadow_settings()
+    stats = {}
+    for name in options['BACKENDS']:
+        agree = shadow_predictions_total.value(backend=name, agreement='agree')
+        disagree = shadow_predictions_total.value(backend=name, agreement='disagree')
+        _, delta_sum, delta_count = shadow_score_delta.snapshot(backend=name)
+        _, latency_sum, batches = shadow_batch_duration.snapshot(backend=name)
+        stats[name] = {
+            'predictions': agree + disagree,
+            'agreement_rate': round(agree / (agree + disagree), 4) if agree + disagree else None,
+            'mean_abs_score_delta': round(delta_sum / delta_count, 6) if delta_count else None,
+            'batches': batches,
+            'mean_batch_latency_ms': round(latency_sum / batches * 1000, 3) if batches else None,
+            'errors': shadow_errors_total.value(backend=name),
+        }
+    return {
+        'enabled': options['ENABLED'],
+        'sample_rate': options['SAMPLE_RATE'],
+        'queue_depth': evaluator.queue_depth(),
+        'queue_capacity': options['QUEUE_SIZE'],
+        'samples_queued': shadow_samples_total.value(result='queued'),
+        'samples_dropped': shadow_samples_total.value(result='dropped'),
+        'backends': stats,
+    }
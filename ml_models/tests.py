@@ -0,0 +1,329 @@
+import queue
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.backends import device_key_cache, user_status_cache
+from ml_models import scoring_jobs, shadow
+from ml_models.engine_health_model.predict import predict_engine_health_batch
+from ml_models.models import ScoringJob
+from ml_models.rescoring import pk_extents, rescore
+from monitoring.testing import QueryBudgetTestMixin
+from sensor_api import sharding
+from sensor_api.archive import SENSOR_FIELDS
+from sensor_api.models import Vehicle, VehicleSensorData
+from sensor_api.tests import READING, create_readings
+from sensor_api.vehicles import vehicle_cache
+
+SAMPLE = {
+    'Engine rpm': 800,
+    'Lub oil pressure': 3.5,
+    'Fuel pressure': 6.0,
+    'Coolant pressure': 2.5,
+    'Lub oil temp': 78.0,
+    'Coolant temp': 75.0,
+}
+
+
+class PredictionQueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('driver', password='unused-password')
+        cls.admin = User.objects.create_user('ops', password='unused-password', is_staff=True)
+        cls.vehicle = Vehicle.objects.create(external_id='veh-1', owner=cls.user)
+
+    def setUp(self):
+        vehicle_cache.clear()
+        user_status_cache.clear()
+        device_key_cache.clear()
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_prediction_within_budget(self):
+        with self.assertWithinQueryBudget('predict-engine-health'):
+            response = self.client.post(
+                reverse('predict-engine-health'), {'vehicle_id': 'veh-1', **SAMPLE}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.data['status'], ('H', 'F'))
+        reading = VehicleSensorData.objects.get(vehicle=self.vehicle)
+        self.assertEqual(reading.prediction_result, response.data['status'])
+        # The stored result follows the score: above 0.5 is healthy
+        self.assertEqual(reading.prediction_result == 'H', reading.prediction_score > 0.5)
+
+    def test_prediction_requires_every_sensor(self):
+        sample = {key: value for key, value in SAMPLE.items() if key != 'Coolant temp'}
+        response = self.client.post(
+            reverse('predict-engine-health'), {'vehicle_id': 'veh-1', **sample}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(VehicleSensorData.objects.exists())
+
+    def test_remaining_kilometers_within_budget(self):
+        with self.assertWithinQueryBudget('predict-engine-kilometers'):
+            response = self.client.get(reverse('predict-engine-kilometers', args=['veh-1']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_remaining_kilometers_fields(self):
+        url = reverse('predict-engine-kilometers', args=['veh-1'])
+        response = self.client.get(url, {'fields': 'health_metrics, current_readings'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('current_readings', response.data)
+        self.assertNotIn('maintenance_recommendations', response.data)
+        for fields in ('', ' ', ',', 'health_metrics,unknown'):
+            self.assertEqual(self.client.get(url, {'fields': fields}).status_code, 400, fields)
+
+    def test_scoring_jobs_list_within_budget(self):
+        with self.assertWithinQueryBudget('scoring-jobs'):
+            response = self.client.get(reverse('scoring-jobs'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_drift_within_budget(self):
+        self.authenticate(self.admin)
+        with self.assertWithinQueryBudget('data-drift'):
+            response = self.client.get(reverse('data-drift'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_drift_is_staff_only(self):
+        response = self.client.get(reverse('data-drift'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_shadow_evaluation_within_budget(self):
+        self.authenticate(self.admin)
+        with self.assertWithinQueryBudget('shadow-evaluation'):
+            response = self.client.get(reverse('shadow-evaluation'))
+        self.assertEqual(response.status_code, 200)
+
+
+class RescoreTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        # Enough vehicles that every reading database holds some
+        cls.vehicles = []
+        while len(cls.vehicles) < 4 or (
+            {sharding.shard_for(v.pk) for v in cls.vehicles} != set(sharding.reading_databases())
+        ):
+            vehicle = Vehicle.objects.create(external_id=f'veh-{len(cls.vehicles) + 1}')
+            create_readings(vehicle, 3)
+            cls.vehicles.append(vehicle)
+        scores, _ = predict_engine_health_batch(np.array([[READING[field] for field in SENSOR_FIELDS]]))
+        cls.expected_score = float(scores[0])
+
+    def run_rescore(self):
+        with tempfile.TemporaryDirectory() as directory:
+            return rescore(Path(directory) / 'checkpoint.json', chunk_size=2)
+
+    def assertRescored(self):
+        for alias in sharding.source_databases():
+            for score in VehicleSensorData.objects.using(alias).values_list('prediction_score', flat=True):
+                self.assertAlmostEqual(score, self.expected_score, places=5)
+        for vehicle in Vehicle.objects.all():
+            self.assertAlmostEqual(vehicle.latest_prediction_score, self.expected_score, places=5)
+
+    def test_rescore_updates_every_reading(self):
+        checkpoint = self.run_rescore()
+        self.assertEqual(checkpoint.data['rows'], 3 * len(self.vehicles))
+        self.assertEqual(set(checkpoint.data['extents']), {sharding.shard_for(v.pk) for v in self.vehicles})
+        self.assertRescored()
+
+    @skipUnless(sharding.is_enabled(), 'Readings are not sharded (see AutoIntell.sharded_test_settings)')
+    def test_rescore_covers_moved_readings(self):
+        # Moved readings keep their ids: the target then holds ids from two blocks
+        vehicle = self.vehicles[0]
+        source = sharding.shard_for(vehicle.pk)
+        target = next(sharding.shard_for(v.pk) for v in self.vehicles if sharding.shard_for(v.pk) != source)
+        sharding.move_readings(vehicle.pk, source, target)
+        self.assertEqual(len(pk_extents(target)), 2)
+
+        checkpoint = self.run_rescore()
+        self.assertEqual(checkpoint.data['rows'], 3 * len(self.vehicles))
+        self.assertRescored()
+
+
+class ScoringJobTests(TestCase):
+    rows = [
+        '800,3.5,6.0,2.5,78.0,75.0,a',
+        '700,2.0,5.0,2.0,80.0,90.0,b',
+        '800,not-a-number,6.0,2.5,78.0,75.0,c',
+        '900,4.0,7.0,3.0,76.0,70.0,d',
+        '650,1.5,4.0,1.5,85.0,95.0,e',
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SCORING_JOBS_DIR=directory.name, SCORING_JOB_WORKER='external')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.owner = User.objects.create_user('analyst', password='unused-password')
+
+    def create_job(self):
+        content = '\n'.join([','.join(scoring_jobs.FEATURE_COLUMNS + ['label']), *self.rows]) + '\n'
+        return scoring_jobs.create_job(self.owner, SimpleUploadedFile('readings.csv', content.encode()))
+
+    def expire_lease(self, job):
+        ScoringJob.objects.filter(pk=job.pk).update(lease_until=timezone.now() - timedelta(seconds=1))
+
+    def result_lines(self, job):
+        return scoring_jobs.result_path(job).read_text().splitlines()
+
+    def test_claim_takes_a_job_once(self):
+        job = self.create_job()
+        claimed = scoring_jobs.claim_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.status, claimed.attempts), ('running', 1))
+        self.assertIsNone(scoring_jobs.claim_job())
+
+        self.expire_lease(job)
+        self.assertEqual(scoring_jobs.claim_job().attempts, 2)
+
+    def test_run_job_scores_rows_and_marks_unparseable_ones(self):
+        self.create_job()
+        job = scoring_jobs.run_job(scoring_jobs.claim_job(), chunk_rows=2)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual((job.rows_scored, job.rows_failed), (4, 1))
+
+        lines = self.result_lines(job)
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[0].endswith('label,prediction_score,prediction_result,error'))
+        self.assertEqual(lines[3], '800,not-a-number,6.0,2.5,78.0,75.0,c,,,unparseable sensor values')
+        self.assertRegex(lines[1], r',a,0\.\d{6},[HF],$')
+
+    def test_reclaimed_job_resumes_from_its_checkpoint(self):
+        self.create_job()
+        expected = self.result_lines(scoring_jobs.run_job(scoring_jobs.claim_job(), chunk_rows=2))
+        job = self.create_job()
+        score_chunk = scoring_jobs._score_chunk
+        calls = []
+
+        def killed_on_second_chunk(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise SystemExit('worker killed')
+            return score_chunk(*args, **kwargs)
+
+        with mock.patch.object(scoring_jobs, '_score_chunk', killed_on_second_chunk):
+            with self.assertRaises(SystemExit):
+                scoring_jobs.run_job(scoring_jobs.claim_job(), chunk_rows=2)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_scored), ('running', 2))
+        self.assertGreater(job.input_offset, 0)
+        # Half a chunk written after the checkpoint
+        with open(scoring_jobs.result_path(job), 'ab') as f:
+            f.write(b'700,2.0,5.0,2.0,80.0,9')
+
+        self.expire_lease(job)
+        job = scoring_jobs.run_job(scoring_jobs.claim_job(), chunk_rows=2)
+        self.assertEqual((job.status, job.attempts), ('succeeded', 2))
+        self.assertEqual((job.rows_scored, job.rows_failed), (4, 1))
+        self.assertEqual(self.result_lines(job), expected)
+
+    def test_worker_stops_once_its_job_is_claimed_again(self):
+        self.create_job()
+        stale = scoring_jobs.claim_job()
+        self.expire_lease(stale)
+        current = scoring_jobs.claim_job()
+
+        job = scoring_jobs.run_job(stale, chunk_rows=2)
+        self.assertEqual((job.status, job.attempts, job.input_offset), ('running', current.attempts, 0))
+        self.assertFalse(scoring_jobs.result_path(job).exists())
+
+    @override_settings(SCORING_JOB_MAX_ATTEMPTS=2)
+    def test_job_is_abandoned_after_max_attempts(self):
+        job = self.create_job()
+        for _ in range(2):
+            scoring_jobs.claim_job()
+            self.expire_lease(job)
+        job = scoring_jobs.run_job(scoring_jobs.claim_job())
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertEqual(job.error, 'Abandoned after 2 attempts')
+        self.assertIsNone(scoring_jobs.claim_job())
+
+
+def rpm_scores(features):
+    """Shadow backend for the tests: engine rpm / 1000."""
+    return features[:, 0] / 1000
+
+
+def broken_scores(features):
+    if features.any():
+        raise RuntimeError('backend failed')
+    return features[:, 0]
+
+
+class ShadowEvaluatorTests(SimpleTestCase):
+
+    def evaluator(self, **backends):
+        options = {
+            **shadow.get_shadow_settings(),
+            'BATCH_SIZE': 4,
+            'BACKENDS': {name: {'CALLABLE': f'ml_models.tests.{function}'} for name, function in backends.items()},
+        }
+        evaluator = shadow.ShadowEvaluator()
+        evaluator._backends = evaluator._load_backends(options)
+        return evaluator
+
+    def sample(self, engine_rpm, primary_score):
+        return [engine_rpm, 3.5, 6.0, 2.5, 78.0, 75.0], primary_score
+
+    def test_evaluate_records_agreement_and_score_deltas(self):
+        evaluator = self.evaluator(test_agreement='rpm_scores')
+        # Shadow scores 0.9, 0.1, 0.7 and 0.3: the middle two disagree on the condition
+        evaluator.evaluate([
+            self.sample(900, 0.75), self.sample(100, 0.65), self.sample(700, 0.4), self.sample(300, 0.3),
+        ])
+
+        totals = shadow.shadow_predictions_total
+        self.assertEqual(totals.value(backend='test_agreement', agreement='agree'), 2)
+        self.assertEqual(totals.value(backend='test_agreement', agreement='disagree'), 2)
+        counts, total, count = shadow.shadow_score_delta.snapshot(backend='test_agreement')
+        # Deltas 0.15, 0.55, 0.3 and 0 in buckets le 0.001 ... 1.0, +Inf
+        self.assertEqual(counts, [1, 0, 0, 0, 0, 0, 1, 1, 1, 0])
+        self.assertAlmostEqual(total, 1.0)
+        self.assertEqual(count, 4)
+        self.assertEqual(shadow.shadow_batch_duration.snapshot(backend='test_agreement')[2], 1)
+
+    def test_failing_backend_is_counted_and_skipped(self):
+        evaluator = self.evaluator(test_failing='broken_scores', test_healthy='rpm_scores')
+        evaluator.evaluate([self.sample(900, 0.8), self.sample(100, 0.2)])
+
+        self.assertEqual(shadow.shadow_errors_total.value(backend='test_failing'), 1)
+        self.assertEqual(shadow.shadow_predictions_total.value(backend='test_failing', agreement='agree'), 0)
+        self.assertEqual(shadow.shadow_predictions_total.value(backend='test_healthy', agreement='agree'), 2)
+
+    def test_full_queue_drops_samples(self):
+        settings = override_settings(SHADOW_EVALUATION={
+            'ENABLED': True, 'SAMPLE_RATE': 1.0, 'QUEUE_SIZE': 2,
+            'BACKENDS': {'test_queue': {'CALLABLE': 'ml_models.tests.rpm_scores'}},
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        evaluator = shadow.ShadowEvaluator()
+        # A worker that is busy and takes nothing off the queue
+        evaluator._queue = queue.Queue(maxsize=2)
+        evaluator._thread = mock.Mock(**{'is_alive.return_value': True})
+        queued = shadow.shadow_samples_total.value(result='queued')
+        dropped = shadow.shadow_samples_total.value(result='dropped')
+
+        for _ in range(5):
+            evaluator.submit(*self.sample(800, 0.9))
+        self.assertEqual(evaluator.queue_depth(), 2)
+        self.assertEqual(shadow.shadow_samples_total.value(result='queued'), queued + 2)
+        self.assertEqual(shadow.shadow_samples_total.value(result='dropped'), dropped + 3)
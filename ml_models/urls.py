@@ -1,6 +1,18 @@
 from django.urls import path, include
-from .views import get_engine_health_prediction
+from .views import (
+    create_scoring_job,
+    download_scoring_job_result,
+    get_data_drift,
+    get_engine_health_prediction,
+    get_scoring_job,
+    get_shadow_evaluation,
+)
 
 urlpatterns = [
     path('predict/engine/', get_engine_health_prediction, name='predict-engine-health'),
-]
\ No newline at end of file
+    path('drift/', get_data_drift, name='data-drift'),
+    path('shadow/', get_shadow_evaluation, name='shadow-evaluation'),
+    path('jobs/', create_scoring_job, name='scoring-jobs'),
+    path('jobs/<uuid:job_id>/', get_scoring_job, name='scoring-job-detail'),
+    path('jobs/<uuid:job_id>/result/', download_scoring_job_result, name='scoring-job-result'),
+]
@@ -1,12 +1,30 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from datetime import timedelta
+
+from django.http import FileResponse
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from authentication.backends import TELEMETRY_AUTHENTICATION_CLASSES
+from authentication.permissions import DeviceVehicleScope
+from ml_models import drift, shadow
 from ml_models.engine_health_model.predict import predict_engine_health
+from ml_models.models import ScoringJob
+from ml_models.scoring_jobs import InvalidUpload, create_job, result_path
+from ml_models.serializers import ScoringJobSerializer
+from monitoring.metrics import timed
 from sensor_api.models import VehicleSensorData
+from sensor_api.vehicles import get_vehicle
+import logging
+
+logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
+@authentication_classes(TELEMETRY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated, DeviceVehicleScope])
 def get_engine_health_prediction(request):
     """
     Make a prediction about engine health and save the record to history.
@@ -32,35 +50,40 @@ def get_engine_health_prediction(request):
             )
 
         # Get prediction from ML model
-        predictions = predict_engine_health(
+        features = [
             data['Engine rpm'],
             data['Lub oil pressure'],
             data['Fuel pressure'],
             data['Coolant pressure'],
             data['Lub oil temp'],
             data['Coolant temp']
-        )
+        ]
+        predictions = predict_engine_health(*features)
+        drift.observe(features)
 
         # Determine prediction result
         prediction_status = 'H' if predictions['engine_condition'] == 1 else 'F'
         prediction_score = float(predictions['lstm_prediction'])
+        # Candidate models score a sample of requests in the background
+        shadow.submit(features, prediction_score)
 
         # Save to history
         try:
-            VehicleSensorData.objects.create(
-                vehicle_id=str(vehicle_id),
-                engine_rpm=float(data['Engine rpm']),
-                lub_oil_pressure=float(data['Lub oil pressure']),
-                fuel_pressure=float(data['Fuel pressure']),
-                coolant_pressure=float(data['Coolant pressure']),
-                lub_oil_temp=float(data['Lub oil temp']),
-                coolant_temp=float(data['Coolant temp']),
-                prediction_result=prediction_status,
-                prediction_score=prediction_score
-            )
+            with timed('db_insert'):
+                VehicleSensorData.objects.create(
+                    vehicle=get_vehicle(vehicle_id, create=True),
+                    engine_rpm=float(data['Engine rpm']),
+                    lub_oil_pressure=float(data['Lub oil pressure']),
+                    fuel_pressure=float(data['Fuel pressure']),
+                    coolant_pressure=float(data['Coolant pressure']),
+                    lub_oil_temp=float(data['Lub oil temp']),
+                    coolant_temp=float(data['Coolant temp']),
+                    prediction_result=prediction_status,
+                    prediction_score=prediction_score
+                )
         except Exception as e:
             # Log the error but don't fail the request
-            print(f"Error saving prediction history: {e}")
+            logger.error(f"Error saving prediction history: {e}")
 
         return Response({
             'prediction': predictions,
@@ -77,4 +100,124 @@ def get_engine_health_prediction(request):
         return Response(
             {'error': f'Error processing prediction: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_data_drift(request):
+    """
+    Drift of live sensor values scored over the last `hours` (default 24) against
+    the training data: per-sensor PSI and KS statistics with live and reference
+    percentiles (see drift.py).
+    """
+    retention_hours = drift.get_drift_settings()['RETENTION_DAYS'] * 24
+    try:
+        hours = int(request.query_params.get('hours', 24))
+        if not 1 <= hours <= retention_hours:
+            raise ValueError
+    except ValueError:
+        return Response(
+            {'error': f'hours must be an integer between 1 and {retention_hours}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        until = timezone.now()
+        return Response(drift.drift_report(until - timedelta(hours=hours), until))
+    except Exception as e:
+        logger.error(f"Error computing data drift: {e}")
+        return Response(
+            {'error': f'Error computing data drift: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_shadow_evaluation(request):
+    """
+    Shadow evaluation statistics of this worker process: samples queued and
+    dropped, and per candidate backend the agreement rate with the primary model,
+    mean absolute score delta and batch latency (see shadow.py). The full
+    histograms are exported on /metrics.
+    """
+    return Response(shadow.backend_stats())
+
+def _owned_job(request, job_id):
+    """The job if it exists and the user may see it (its owner or staff), else None."""
+    jobs = ScoringJob.objects.all() if request.user.is_staff else ScoringJob.objects.filter(owner=request.user)
+    return jobs.filter(pk=job_id).first()
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def create_scoring_job(request):
+    """
+    POST: upload a CSV file (multipart field `file`) with engine_dataset.csv's
+    sensor columns; it is scored in the background. Returns 202 with the job.
+    GET: the user's jobs, newest first.
+    """
+    if request.method == 'GET':
+        try:
+            paginator = PageNumberPagination()
+            paginator.page_size = 10
+            page = paginator.paginate_queryset(ScoringJob.objects.filter(owner=request.user), request)
+            return paginator.get_paginated_response(ScoringJobSerializer(page, many=True).data)
+        except Exception as e:
+            return Response(
+                {'error': f'Error retrieving scoring jobs: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        job = create_job(request.user, upload)
+    except InvalidUpload as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error creating scoring job: {e}")
+        return Response(
+            {'error': f'Error creating scoring job: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return Response(
+        ScoringJobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': request.build_absolute_uri(reverse('scoring-job-detail', args=[job.pk]))},
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scoring_job(request, job_id):
+    """Status, row counts and progress (fraction of input read, rows per second) of a job."""
+    job = _owned_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Scoring job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ScoringJobSerializer(job).data)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_scoring_job_result(request, job_id):
+    """Stream the scored CSV of a finished job."""
+    job = _owned_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Scoring job not found'}, status=status.HTTP_404_NOT_FOUND)
+    if job.status != 'succeeded':
+        return Response(
+            {'error': f'Scoring job is {job.status}; results are available once it has succeeded'},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    try:
+        stem = job.original_name.rsplit('.', 1)[0] or 'scores'
+        return FileResponse(
+            open(result_path(job), 'rb'),
+            as_attachment=True,
+            filename=f'{stem}-scored.csv',
+            content_type='text/csv',
+        )
+    except FileNotFoundError:
+        return Response({'error': 'Result file is missing'}, status=status.HTTP_410_GONE)
@@ -0,0 +1,52 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+from .metrics import db_queries_per_request, db_queries_total, http_request_duration, http_requests_total
+
+
+class QueryCounter:
+    """Database execute wrapper that only counts statements."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def endpoint_label(request):
+    """
+    Label requests by their URL route (e.g. 'api/sensor/history/<str:vehicle_id>/')
+    rather than the raw path, so per-vehicle URLs do not explode metric cardinality.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.route or match.view_name
+
+
+class MetricsMiddleware:
+    """Record per-endpoint latency, status codes and SQL query counts."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        endpoint = endpoint_label(request)
+        http_requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        http_request_duration.observe(duration, endpoint=endpoint, method=request.method)
+        db_queries_per_request.observe(counter.count, endpoint=endpoint)
+        if counter.count:
+            db_queries_total.inc(counter.count, endpoint=endpoint)
+        return response
@@ -0,0 +1,157 @@
+"""
+Opt-in per-request profiling.
+
+A request is profiled when it carries an ``X-Profile-Request`` header matching
+PROFILING_TOKEN, or the ``_profile=1`` query flag from a staff user (admin session
+or JWT bearer token). The whole
+request (DRF view, ORM and model inference) runs under cProfile and the stats are
+written as a pstats file that can be downloaded or opened with snakeviz/flameprof.
+"""
+import cProfile
+import hmac
+import logging
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Request'
+PROFILE_QUERY_FLAG = '_profile'
+PROFILE_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+profiles_total = registry.counter(
+    'autointell_profiles_total', 'Profiling requests by outcome.', labels=('result',)
+)
+
+
+def get_profile_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def profile_path(profile_id):
+    """Return the pstats path for a profile id, or None if the id is malformed."""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    return get_profile_dir() / f'{profile_id}.prof'
+
+
+class ProfileRateLimiter:
+    """
+    Token bucket plus a single-flight lock: at most `per_minute` profiles per
+    minute and never more than one profiled request at a time per process.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = max(0, per_minute)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60.0)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            if not self._active.acquire(blocking=False):
+                return False
+            self.tokens -= 1
+            return True
+
+    def release(self):
+        self._active.release()
+
+
+class ProfilingMiddleware:
+    """Capture a cProfile profile for explicitly flagged requests."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiter = ProfileRateLimiter(getattr(settings, 'PROFILING_MAX_PER_MINUTE', 6))
+        self.max_files = getattr(settings, 'PROFILING_MAX_FILES', 50)
+
+    def __call__(self, request):
+        if not self.wants_profile(request):
+            return self.get_response(request)
+
+        if not self.limiter.acquire():
+            profiles_total.inc(result='rate_limited')
+            response = self.get_response(request)
+            response['X-Profile-Status'] = 'rate-limited'
+            return response
+
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            profile_id = self.save(profiler)
+        finally:
+            self.limiter.release()
+
+        if profile_id:
+            profiles_total.inc(result='captured')
+            response['X-Profile-Id'] = profile_id
+        else:
+            profiles_total.inc(result='error')
+            response['X-Profile-Status'] = 'error'
+        return response
+
+    def wants_profile(self, request):
+        token = getattr(settings, 'PROFILING_TOKEN', None)
+        supplied = request.headers.get(PROFILE_HEADER)
+        if supplied and token and hmac.compare_digest(supplied, token):
+            return True
+        if request.GET.get(PROFILE_QUERY_FLAG) == '1':
+            user = getattr(request, 'user', None)
+            if user is None or not user.is_authenticated:
+                user = self.bearer_user(request)
+            return bool(user is not None and user.is_authenticated and user.is_staff)
+        return False
+
+    def bearer_user(self, request):
+        """
+        The user of the request's JWT, if any. API clients are authenticated by DRF
+        inside the view, after this middleware, so their flag is checked here.
+        """
+        from rest_framework.exceptions import AuthenticationFailed
+
+        from authentication.backends import TimedJWTAuthentication
+
+        try:
+            result = TimedJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        return result[0] if result else None
+
+    def save(self, profiler):
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+        directory = get_profile_dir()
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(directory / f'{profile_id}.prof')
+            self.prune(directory)
+        except OSError as e:
+            logger.error(f"Error saving request profile: {e}")
+            return None
+        return profile_id
+
+    def prune(self, directory):
+        """Keep only the newest `max_files` profiles on disk."""
+        files = sorted(directory.glob('*.prof'))
+        for stale in files[:-self.max_files] if self.max_files else []:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
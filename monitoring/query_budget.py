@@ -0,0 +1,98 @@
+"""
+Per-endpoint SQL query budgets.
+
+QUERY_BUDGETS maps URL names to the maximum number of queries a single request to
+that endpoint may run. Budgets are constant, so anything that starts issuing a query
+per row (an N+1) on a paginated endpoint blows the budget as soon as a page has
+more than a couple of rows. QUERY_BUDGET_MODE controls what happens at runtime:
+'off', 'log' (warn with the recorded SQL) or 'raise' (fail the request; for tests).
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+query_budget_exceeded_total = registry.counter(
+    'autointell_query_budget_exceeded_total', 'Requests that ran more SQL queries than their budget.',
+    labels=('endpoint',)
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder:
+    """Database execute wrapper that keeps the SQL of every statement run."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+
+@contextmanager
+def record_queries():
+    """Record queries on every configured database while the block runs."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+def get_budget(url_name):
+    return getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+
+
+def check_budget(url_name, recorder, budget=None):
+    """
+    Compare recorded queries with the endpoint budget.
+    Returns True when within budget (or no budget is configured).
+    """
+    budget = get_budget(url_name) if budget is None else budget
+    if budget is None or recorder.count <= budget:
+        return True
+
+    query_budget_exceeded_total.inc(endpoint=url_name)
+    return False
+
+
+def describe_overrun(url_name, recorder, budget):
+    statements = '\n'.join(f'  {i + 1}. {sql}' for i, sql in enumerate(recorder.queries))
+    return f"{url_name} ran {recorder.count} queries, budget is {budget}:\n{statements}"
+
+
+class QueryBudgetMiddleware:
+    """Enforce QUERY_BUDGETS on every request according to QUERY_BUDGET_MODE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+        if mode == 'off':
+            return self.get_response(request)
+
+        with record_queries() as recorder:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        if url_name and not check_budget(url_name, recorder):
+            message = describe_overrun(url_name, recorder, get_budget(url_name))
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
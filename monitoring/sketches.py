@@ -0,0 +1,220 @@
+"""
+Mergeable sketches for streaming aggregates: quantiles (KLL) and distinct
+counts (HyperLogLog).
+
+A KLLSketch summarizes any number of values in O(k) memory. Values enter level 0;
+a level that outgrows its capacity is sorted and every other item (from a random
+offset) is promoted to the level above with twice the weight. Capacities shrink
+geometrically (by C) towards the lower levels, so the whole sketch holds roughly
+k / (1 - C) items plus a couple per level. Rank error is about 1.7 / k of the
+count with high probability; k=200 gives under 1%.
+
+Adding a value is an append plus an occasional compaction (amortized O(1)).
+Sketches with the same k merge by concatenating levels and compacting, so
+per-process sketches can be combined into one without losing accuracy.
+
+A HyperLogLog counts distinct values in 2**p one-byte registers (4 KiB at p=12)
+with a standard error of about 1.04 / sqrt(2**p), 1.6% at p=12. Merging takes the
+register-wise maximum.
+"""
+import hashlib
+import math
+import random
+from bisect import bisect_right
+
+import numpy as np
+
+C = 2 / 3
+MIN_CAPACITY = 2
+
+
+class KLLSketch:
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels = [[]]
+        self._size = 0
+        self._rng = random.Random(seed)
+        self._sorted = None
+
+    def __len__(self):
+        return self.n
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * C ** depth)), MIN_CAPACITY)
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def update(self, value):
+        value = float(value)
+        # A missing (NaN) or infinite reading has no rank; it would corrupt min/max and the levels
+        if not math.isfinite(value):
+            return
+        self.levels[0].append(value)
+        self._size += 1
+        self.n += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self._sorted = None
+        if self._size >= self._max_size():
+            self._compress()
+
+    def extend(self, values):
+        """Add many values at once (e.g. a whole dataset column)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+        self.n += int(values.size)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._sorted = None
+        chunk = self.k
+        for start in range(0, values.size, chunk):
+            self.levels[0].extend(values[start:start + chunk].tolist())
+            self._size += min(chunk, values.size - start)
+            if self._size >= self._max_size():
+                self._compress()
+
+    def _compress(self):
+        for level in range(len(self.levels)):
+            items = self.levels[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items.sort()
+            # An odd item out stays behind so no weight is lost
+            keep = [items.pop()] if len(items) % 2 else []
+            offset = self._rng.randint(0, 1)
+            self.levels[level + 1].extend(items[offset::2])
+            self.levels[level] = keep
+            self._size = sum(len(items) for items in self.levels)
+            # Lazy compaction: one level per call keeps the amortized cost low
+            if self._size < self._max_size():
+                break
+
+    def merge(self, other):
+        """Fold another sketch into this one."""
+        if other.k != self.k:
+            raise ValueError(f'Cannot merge sketches with k={other.k} into k={self.k}')
+        if not other.n:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._size = sum(len(items) for items in self.levels)
+        self._sorted = None
+        while self._size >= self._max_size():
+            self._compress()
+        return self
+
+    def _weighted(self):
+        """Sorted values with their cumulative weights, cached until the next change."""
+        if self._sorted is None:
+            pairs = sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+            values = [value for value, _ in pairs]
+            cumulative = np.cumsum([weight for _, weight in pairs]).tolist()
+            self._sorted = (values, cumulative)
+        return self._sorted
+
+    def cdf(self, value):
+        """Estimated fraction of values <= `value`."""
+        if not self.n:
+            return math.nan
+        values, cumulative = self._weighted()
+        index = bisect_right(values, value)
+        return cumulative[index - 1] / cumulative[-1] if index else 0.0
+
+    def quantile(self, q):
+        """Estimated value at quantile `q` (0..1)."""
+        if not self.n:
+            return math.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cumulative = self._weighted()
+        target = q * cumulative[-1]
+        index = bisect_right(cumulative, target - 1e-9)
+        return values[min(index, len(values) - 1)]
+
+    def to_dict(self):
+        return {
+            'k': self.k,
+            'n': self.n,
+            'min': self.min if self.n else None,
+            'max': self.max if self.n else None,
+            'levels': self.levels,
+        }
+
+    @classmethod
+    def from_dict(cls, data, seed=None):
+        sketch = cls(k=data['k'], seed=seed)
+        sketch.n = data['n']
+        if sketch.n:
+            sketch.min, sketch.max = data['min'], data['max']
+        sketch.levels = [list(items) for items in data['levels']] or [[]]
+        sketch._size = sum(len(items) for items in sketch.levels)
+        return sketch
+
+
+class HyperLogLog:
+
+    def __init__(self, p=12, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError(f'Expected {self.m} registers for p={p}, got {len(self.registers)}')
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        h = int.from_bytes(digest, 'big')
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        # Position of the leftmost 1-bit in the remaining bits
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError(f'Cannot merge HyperLogLog with p={other.p} into p={self.p}')
+        self.registers = bytearray(np.maximum(
+            np.frombuffer(self.registers, dtype=np.uint8), np.frombuffer(other.registers, dtype=np.uint8)
+        ).tobytes())
+        return self
+
+    def count(self):
+        """Estimated number of distinct values added."""
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.sum(np.exp2(-registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # Small range: linear counting is more accurate
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    @property
+    def standard_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data, p=12):
+        return cls(p=p, registers=data)
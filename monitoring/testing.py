@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+
+from .query_budget import check_budget, describe_overrun, get_budget, record_queries
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin asserting that a block stays within an endpoint's query budget:
+
+        with self.assertWithinQueryBudget('prediction-history'):
+            self.client.get(url)
+    """
+
+    @contextmanager
+    def assertWithinQueryBudget(self, url_name, budget=None):
+        budget = get_budget(url_name) if budget is None else budget
+        if budget is None:
+            self.fail(f'No query budget configured for {url_name}')
+
+        with record_queries() as recorder:
+            yield recorder
+
+        if not check_budget(url_name, recorder, budget):
+            self.fail(describe_overrun(url_name, recorder, budget))
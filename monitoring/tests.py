@@ -0,0 +1,160 @@
+import math
+import pstats
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .metrics import MetricsRegistry, http_requests_total
+from .profiling import get_profile_dir, profile_path
+from .sketches import KLLSketch
+
+
+class KLLSketchTests(SimpleTestCase):
+
+    def test_update_skips_non_finite_values(self):
+        sketch = KLLSketch(k=50, seed=1)
+        for value in [3.0, math.nan, 1.0, math.inf, 2.0, -math.inf]:
+            sketch.update(value)
+        self.assertEqual(len(sketch), 3)
+        self.assertEqual((sketch.min, sketch.max), (1.0, 3.0))
+        self.assertEqual(sketch.quantile(0.5), 2.0)
+
+    def test_update_and_extend_agree(self):
+        values = [float(i) for i in range(1000)] + [math.nan] * 10
+        one_by_one = KLLSketch(k=50, seed=1)
+        for value in values:
+            one_by_one.update(value)
+        batched = KLLSketch(k=50, seed=1)
+        batched.extend(values)
+        self.assertEqual(len(one_by_one), len(batched))
+        self.assertAlmostEqual(one_by_one.quantile(0.5), 500, delta=50)
+        self.assertAlmostEqual(batched.quantile(0.5), 500, delta=50)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    def test_exposition_format(self):
+        registry = MetricsRegistry()
+        requests = registry.counter('app_requests_total', 'Requests served.', labels=('method',))
+        registry.counter('app_errors_total', 'Errors.')
+        self.assertIs(registry.counter('app_requests_total', 'Requests served.', labels=('method',)), requests)
+        requests.inc(method='POST')
+        requests.inc(2, method='GET')
+        self.assertEqual(registry.render(), (
+            '# HELP app_errors_total Errors.\n'
+            '# TYPE app_errors_total counter\n'
+            '# HELP app_requests_total Requests served.\n'
+            '# TYPE app_requests_total counter\n'
+            'app_requests_total{method="GET"} 2\n'
+            'app_requests_total{method="POST"} 1\n'
+        ))
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter('app_requests_total', 'Requests served.', labels=('path',)).inc(path='a\\b"c\nd')
+        self.assertIn('app_requests_total{path="a\\\\b\\"c\\nd"} 1\n', registry.render())
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        sizes = registry.histogram('app_batch_size', 'Rows per batch.', labels=('model',), buckets=(10, 1, 5))
+        for value in (1, 3, 10, 50):
+            sizes.observe(value, model='engine')
+        sizes.observe(0.5, model='drift')
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[1], '# TYPE app_batch_size histogram')
+        self.assertEqual(lines[8:], [
+            'app_batch_size_bucket{model="engine",le="1"} 1',
+            'app_batch_size_bucket{model="engine",le="5"} 2',
+            'app_batch_size_bucket{model="engine",le="10"} 3',
+            'app_batch_size_bucket{model="engine",le="+Inf"} 4',
+            'app_batch_size_sum{model="engine"} 64',
+            'app_batch_size_count{model="engine"} 4',
+        ])
+        self.assertEqual(lines[6:8], ['app_batch_size_sum{model="drift"} 0.5', 'app_batch_size_count{model="drift"} 1'])
+
+
+class MetricsEndpointTests(SimpleTestCase):
+
+    @override_settings(METRICS_AUTH_TOKEN=None)
+    def test_scrape_without_token(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('# TYPE autointell_http_requests_total counter\n', response.content.decode())
+
+    @override_settings(METRICS_AUTH_TOKEN='scrape-token')
+    def test_token_is_required_when_set(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer other').status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_AUTH_TOKEN=None)
+    def test_requests_are_counted_by_route(self):
+        before = http_requests_total.value(endpoint='metrics', method='GET', status=200)
+        self.client.get(reverse('metrics'))
+        self.assertEqual(http_requests_total.value(endpoint='metrics', method='GET', status=200), before + 1)
+        self.assertEqual(self.client.post(reverse('metrics')).status_code, 405)
+
+
+class ProfilingMiddlewareTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('ops', password='unused-password', is_staff=True)
+        cls.user = User.objects.create_user('fleet', password='unused-password')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILING_DIR=directory.name, PROFILING_TOKEN='profile-token')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, **extra):
+        return self.client.get(reverse('fleet-faulty-readings'), **extra)
+
+    def flagged(self, user):
+        token = RefreshToken.for_user(user).access_token
+        return self.client.get(
+            reverse('fleet-faulty-readings'), {'_profile': '1'}, HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+
+    def test_header_token_writes_a_profile(self):
+        response = self.get(HTTP_X_PROFILE_REQUEST='profile-token')
+        path = profile_path(response['X-Profile-Id'])
+        self.assertEqual(path.parent, get_profile_dir())
+        self.assertGreater(pstats.Stats(str(path)).total_calls, 0)
+
+        self.assertNotIn('X-Profile-Id', self.get(HTTP_X_PROFILE_REQUEST='wrong-token'))
+        self.assertNotIn('X-Profile-Id', self.get())
+
+    def test_query_flag_needs_a_staff_user(self):
+        self.assertIn('X-Profile-Id', self.flagged(self.staff))
+        self.assertNotIn('X-Profile-Id', self.flagged(self.user))
+
+        self.client.force_login(self.staff)
+        self.assertIn('X-Profile-Id', self.client.get(reverse('fleet-faulty-readings'), {'_profile': '1'}))
+
+    def test_invalid_bearer_token_is_not_profiled(self):
+        response = self.client.get(
+            reverse('fleet-faulty-readings'), {'_profile': '1'}, HTTP_AUTHORIZATION='Bearer not-a-token'
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('X-Profile-Id', response)
+
+    @override_settings(PROFILING_MAX_PER_MINUTE=1)
+    def test_profiles_are_rate_limited(self):
+        self.assertIn('X-Profile-Id', self.get(HTTP_X_PROFILE_REQUEST='profile-token'))
+        response = self.get(HTTP_X_PROFILE_REQUEST='profile-token')
+        self.assertEqual(response['X-Profile-Status'], 'rate-limited')
+        self.assertNotIn('X-Profile-Id', response)
+
+    @override_settings(PROFILING_MAX_FILES=2)
+    def test_only_the_newest_profiles_are_kept(self):
+        ids = [self.get(HTTP_X_PROFILE_REQUEST='profile-token')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(sorted(path.stem for path in get_profile_dir().glob('*.prof')), sorted(ids)[1:])
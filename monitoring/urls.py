@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import download_profile, list_profiles
+
+urlpatterns = [
+    path('profiles/', list_profiles, name='profile-list'),
+    path('profiles/<str:profile_id>/', download_profile, name='profile-download'),
+]
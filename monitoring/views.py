@@ -0,0 +1,50 @@
+import hmac
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .metrics import registry
+from .profiling import get_profile_dir, profile_path
+
+
+@require_GET
+def metrics(request):
+    """
+    Expose in-process metrics in the Prometheus text format.
+    If METRICS_AUTH_TOKEN is set, scrapers must send it as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', None)
+    if token:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f'Bearer {token}'):
+            return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_profiles(request):
+    """List captured request profiles, newest first."""
+    directory = get_profile_dir()
+    files = sorted(directory.glob('*.prof'), reverse=True) if directory.exists() else []
+    return Response([
+        {'id': f.stem, 'size_bytes': f.stat().st_size}
+        for f in files
+    ])
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def download_profile(request, profile_id):
+    """Download a captured profile as a pstats file."""
+    path = profile_path(profile_id)
+    if path is None or not path.exists():
+        return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name,
+                        content_type='application/octet-stream')
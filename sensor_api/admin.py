@@ -1,3 +1,38 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import FaultAlert, FleetSummaryWindow, Vehicle, VehicleHealthTrend
+
+
+@admin.register(Vehicle)
+class VehicleAdmin(admin.ModelAdmin):
+    list_display = ('external_id', 'owner', 'model_year', 'last_seen_at', 'latest_prediction_result', 'reading_count')
+    search_fields = ('external_id',)
+    raw_id_fields = ('owner',)
+    readonly_fields = (
+        'created_at', 'last_seen_at', 'latest_reading', 'latest_prediction_result', 'latest_prediction_score',
+        'reading_count', 'readings_modified_at',
+    )
+
+
+@admin.register(FaultAlert)
+class FaultAlertAdmin(admin.ModelAdmin):
+    list_display = ('vehicle', 'kind', 'parameter', 'severity', 'occurrences', 'last_seen_at', 'acknowledged_at')
+    list_filter = ('kind', 'severity')
+    search_fields = ('vehicle__external_id', 'message')
+    raw_id_fields = ('vehicle', 'acknowledged_by')
+    list_select_related = ('vehicle',)
+
+
+@admin.register(VehicleHealthTrend)
+class VehicleHealthTrendAdmin(admin.ModelAdmin):
+    list_display = ('vehicle', 'readings', 'last_reading_at', 'updated_at')
+    search_fields = ('vehicle__external_id',)
+    list_select_related = ('vehicle',)
+    readonly_fields = [field.name for field in VehicleHealthTrend._meta.fields]
+
+
+@admin.register(FleetSummaryWindow)
+class FleetSummaryWindowAdmin(admin.ModelAdmin):
+    list_display = ('window_start', 'reading_count', 'scored_count', 'faulty_count', 'updated_at')
+    exclude = ('vehicles', 'sketches')
+    readonly_fields = ('window_start', 'reading_count', 'scored_count', 'faulty_count', 'updated_at')
@@ -0,0 +1,210 @@
+"""
+Streaming fault detection over incoming readings.
+
+Every new VehicleSensorData row is checked (see signals.py) in O(1):
+
+    threshold   get_parameter_status() reports a parameter as Critical
+    anomaly     the value is more than Z_SCORE standard deviations from the
+                vehicle's exponentially weighted moving average of that parameter
+    prediction  the model marked the reading Faulty
+
+EWMA state lives in a bounded in-process LRU keyed by vehicle. It is per worker
+process and starts cold after a restart; anomaly checks only begin once a vehicle
+has MIN_SAMPLES readings in this process.
+
+Alerts are deduplicated in the database: while an alert for (vehicle, kind,
+parameter) is unacknowledged, repeats only bump its occurrences and last_seen_at.
+Within COOLDOWN_SECONDS of this process writing an alert, repeats are counted in
+memory and folded into the next write if it follows within another cooldown, so a
+persistent fault costs at most one write per key per cooldown.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .analysis import PARAMETER_NAMES, get_parameter_status
+from .archive import SENSOR_FIELDS
+from .models import FaultAlert
+
+logger = logging.getLogger(__name__)
+
+
+def get_alert_settings():
+    options = {
+        'ENABLED': True,
+        'EWMA_ALPHA': 0.1,
+        'Z_SCORE': 4.0,
+        'MIN_SAMPLES': 30,
+        'COOLDOWN_SECONDS': 300,
+        'MAX_TRACKED_VEHICLES': 10000,
+    }
+    options.update(getattr(settings, 'SENSOR_ALERTS', {}))
+    return options
+
+
+class Ewma:
+    """Exponentially weighted mean and variance, updated in constant time."""
+
+    __slots__ = ('mean', 'var', 'count')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def update(self, value, alpha):
+        """Fold `value` in and return its z-score against the state before it (None while empty)."""
+        if self.count == 0:
+            self.mean = value
+            self.count = 1
+            return None
+
+        diff = value - self.mean
+        z = diff / math.sqrt(self.var) if self.var > 0 else None
+        increment = alpha * diff
+        self.mean += increment
+        self.var = (1 - alpha) * (self.var + diff * increment)
+        self.count += 1
+        return z
+
+
+class RollingStats:
+    """LRU of per-vehicle Ewma state, bounded to `max_vehicles` entries."""
+
+    def __init__(self, max_vehicles=10000):
+        self.max_vehicles = max_vehicles
+        self._vehicles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, vehicle_pk, values, alpha):
+        """Update the vehicle's state with `values` ({field: value}); return {field: (z, samples)}."""
+        with self._lock:
+            state = self._vehicles.get(vehicle_pk)
+            if state is None:
+                state = {field: Ewma() for field in SENSOR_FIELDS}
+                self._vehicles[vehicle_pk] = state
+                if len(self._vehicles) > self.max_vehicles:
+                    self._vehicles.popitem(last=False)
+            else:
+                self._vehicles.move_to_end(vehicle_pk)
+            return {
+                field: (state[field].update(value, alpha), state[field].count)
+                for field, value in values.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._vehicles.clear()
+
+
+class AlertWriter:
+    """Writes deduplicated alerts, holding repeats in memory during the cooldown."""
+
+    def __init__(self):
+        self._last_write = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def raise_alert(self, vehicle_pk, kind, parameter, severity, message, value, seen_at, cooldown):
+        key = (vehicle_pk, kind, parameter)
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_write.get(key)
+            if last is not None and now - last < cooldown:
+                self._pending[key] = self._pending.get(key, 0) + 1
+                return None
+            repeats = self._pending.pop(key, 0)
+            if last is not None and now - last >= 2 * cooldown:
+                # The fault went quiet in between; old repeats belong to the earlier episode
+                repeats = 0
+            self._last_write[key] = now
+            if len(self._last_write) > 100000:
+                self._prune(now, cooldown)
+
+        return self._write(key, severity, message, value, seen_at, 1 + repeats)
+
+    def _write(self, key, severity, message, value, seen_at, occurrences):
+        vehicle_pk, kind, parameter = key
+        open_alerts = FaultAlert.objects.filter(
+            vehicle_id=vehicle_pk, kind=kind, parameter=parameter, acknowledged_at__isnull=True
+        )
+        updated = open_alerts.update(
+            occurrences=F('occurrences') + occurrences,
+            last_seen_at=seen_at,
+            value=value,
+            message=message,
+        )
+        if updated:
+            return None
+        try:
+            with transaction.atomic():
+                return FaultAlert.objects.create(
+                    vehicle_id=vehicle_pk, kind=kind, parameter=parameter, severity=severity,
+                    message=message, value=value, occurrences=occurrences,
+                    first_seen_at=seen_at, last_seen_at=seen_at,
+                )
+        except IntegrityError:
+            # Another process opened the same alert in between
+            open_alerts.update(occurrences=F('occurrences') + occurrences, last_seen_at=seen_at, value=value)
+            return None
+
+    def _prune(self, now, cooldown):
+        expired = [key for key, last in self._last_write.items() if now - last >= 2 * cooldown]
+        for key in expired:
+            del self._last_write[key]
+            self._pending.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._last_write.clear()
+            self._pending.clear()
+
+
+rolling_stats = RollingStats()
+alert_writer = AlertWriter()
+
+
+def check_reading(reading):
+    """
+    Run every check against a saved reading. Returns the alerts that were newly
+    created (repeats folded into open alerts are not returned).
+    """
+    options = get_alert_settings()
+    if not options['ENABLED']:
+        return []
+
+    rolling_stats.max_vehicles = options['MAX_TRACKED_VEHICLES']
+    values = {field: getattr(reading, field) for field in SENSOR_FIELDS}
+    scores = rolling_stats.update(reading.vehicle_id, values, options['EWMA_ALPHA'])
+
+    raised = []
+
+    def emit(kind, parameter, severity, message, value):
+        alert = alert_writer.raise_alert(
+            reading.vehicle_id, kind, parameter, severity, message, value,
+            reading.timestamp, options['COOLDOWN_SECONDS'],
+        )
+        if alert is not None:
+            raised.append(alert)
+
+    for field, value in values.items():
+        name = PARAMETER_NAMES[field]
+        if get_parameter_status(name, value) == 'Critical':
+            emit('threshold', field, 'critical', f'{name} at {value:.2f} is outside its operating range', value)
+
+        z, samples = scores[field]
+        if z is not None and samples > options['MIN_SAMPLES'] and abs(z) >= options['Z_SCORE']:
+            emit('anomaly', field, 'warning', f'{name} at {value:.2f} is {z:+.1f} standard deviations from its recent average', value)
+
+    if reading.prediction_result == 'F':
+        emit('prediction', '', 'critical', 'Engine health model predicted a fault', reading.prediction_score)
+
+    for alert in raised:
+        logger.warning(f"Alert raised for vehicle {reading.vehicle_id}: {alert.message}")
+    return raised
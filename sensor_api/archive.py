@@ -0,0 +1,331 @@
+"""
+Cold storage for sensor readings and rollups that aged out of the database.
+
+Each vehicle gets one compressed NumPy ``.npz`` segment per month and kind
+('raw' readings or 'rollup' buckets), stored column by column:
+
+    <SENSOR_ARCHIVE_DIR>/<kind>/<vehicle>/<YYYY-MM>.npz
+    <SENSOR_ARCHIVE_DIR>/<kind>/<vehicle>/index.json   {"YYYY-MM": row count}
+
+The small index lets history reads count and skip whole months without opening
+segments; only the months a requested page actually touches are decompressed.
+"""
+import heapq
+import itertools
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import VehicleSensorData, VehicleSensorRollup
+from .vehicles import display_vehicle
+
+SENSOR_FIELDS = [
+    'engine_rpm',
+    'lub_oil_pressure',
+    'fuel_pressure',
+    'coolant_pressure',
+    'lub_oil_temp',
+    'coolant_temp',
+]
+
+# Per kind: the time column segments are sorted on, and the model rows are rebuilt as
+KINDS = {
+    'raw': {'time_field': 'timestamp', 'model': VehicleSensorData},
+    'rollup': {'time_field': 'bucket_start', 'model': VehicleSensorRollup},
+}
+
+PREDICTION_CODES = {None: 0, 'H': 1, 'F': 2}
+PREDICTION_VALUES = {code: value for value, code in PREDICTION_CODES.items()}
+
+
+def get_archive_dir():
+    return Path(getattr(settings, 'SENSOR_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'sensor_archive'))
+
+
+def vehicle_path_component(vehicle_id):
+    """Percent-encode a vehicle id so it is always a single, safe path component."""
+    return quote(str(vehicle_id), safe='').replace('.', '%2E')
+
+
+def vehicle_dir(kind, vehicle_id):
+    return get_archive_dir() / kind / vehicle_path_component(vehicle_id)
+
+
+def month_key(value):
+    return f'{value.year:04d}-{value.month:02d}'
+
+
+def to_micros(value):
+    return int(value.timestamp() * 1_000_000)
+
+
+def _from_micros(value):
+    return datetime.fromtimestamp(int(value) / 1_000_000, tz=dt_timezone.utc)
+
+
+def rows_to_columns(kind, rows):
+    """Convert a list of value dicts (model field -> value) into archive columns."""
+    time_field = KINDS[kind]['time_field']
+    columns = {time_field: np.array([to_micros(r[time_field]) for r in rows], dtype=np.int64)}
+    for field, value in rows[0].items() if rows else []:
+        if field in (time_field, 'vehicle_id', 'id'):
+            continue
+        if field == 'prediction_result':
+            columns[field] = np.array([PREDICTION_CODES.get(r[field], 0) for r in rows], dtype=np.int8)
+        elif field in ('reading_count', 'faulty_count'):
+            columns[field] = np.array([r[field] for r in rows], dtype=np.int64)
+        else:
+            columns[field] = np.array(
+                [np.nan if r[field] is None else r[field] for r in rows], dtype=np.float64
+            )
+    return columns
+
+
+def load_index(kind, vehicle_id):
+    path = vehicle_dir(kind, vehicle_id) / 'index.json'
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_index(kind, vehicle_id, index):
+    path = vehicle_dir(kind, vehicle_id) / 'index.json'
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(dict(sorted(index.items())), f)
+    os.replace(tmp, path)
+
+
+def read_segment(kind, vehicle_id, month):
+    """Load one monthly segment as a dict of column arrays (empty dict if missing)."""
+    path = vehicle_dir(kind, vehicle_id) / f'{month}.npz'
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    except FileNotFoundError:
+        return {}
+
+
+def write_segment(kind, vehicle_id, month, columns):
+    """
+    Merge `columns` into the vehicle's segment for `month`, keeping rows sorted by
+    time and de-duplicated on the time column, then update the index.
+    """
+    time_field = KINDS[kind]['time_field']
+    existing = read_segment(kind, vehicle_id, month)
+    if existing:
+        columns = {name: np.concatenate([existing[name], columns[name]]) for name in columns}
+
+    _, unique_idx = np.unique(columns[time_field][::-1], return_index=True)
+    # Reverse first so the most recently written copy of a duplicate wins
+    keep = (len(columns[time_field]) - 1 - unique_idx)
+    keep.sort()
+    columns = {name: values[keep] for name, values in columns.items()}
+
+    directory = vehicle_dir(kind, vehicle_id)
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / f'{month}.tmp.npz'
+    np.savez_compressed(tmp, **columns)
+    os.replace(tmp, directory / f'{month}.npz')
+
+    index = load_index(kind, vehicle_id)
+    index[month] = int(len(columns[time_field]))
+    _write_index(kind, vehicle_id, index)
+    return index[month]
+
+
+def columns_to_instances(kind, vehicle_id, columns, start=0, stop=None):
+    """Rebuild unsaved model instances for rows [start:stop] of a segment."""
+    model = KINDS[kind]['model']
+    time_field = KINDS[kind]['time_field']
+    times = columns[time_field][start:stop]
+    vehicle = display_vehicle(vehicle_id)
+    instances = []
+    for i, micros in enumerate(times):
+        row = start + i
+        values = {'vehicle': vehicle, time_field: _from_micros(micros)}
+        for name, array in columns.items():
+            if name == time_field:
+                continue
+            value = array[row].item()
+            if name == 'prediction_result':
+                value = PREDICTION_VALUES.get(value)
+            elif isinstance(value, float) and np.isnan(value):
+                value = None
+            values[name] = value
+        instances.append(model(**values))
+    return instances
+
+
+class ArchivedSegments:
+    """
+    Newest-first, sliceable view over a vehicle's archived rows of one kind,
+    optionally bounded to [since, until).
+    """
+
+    def __init__(self, kind, vehicle_id, since=None, until=None):
+        self.kind = kind
+        self.vehicle_id = str(vehicle_id)
+        self.since = since
+        self.until = until
+        self.time_field = KINDS[kind]['time_field']
+        index = load_index(kind, self.vehicle_id)
+        self.months = [
+            (month, count) for month, count in sorted(index.items(), reverse=True)
+            if self._month_in_range(month)
+        ]
+        self._cache = {}
+
+    def _month_in_range(self, month):
+        year, mon = map(int, month.split('-'))
+        start = datetime(year, mon, 1, tzinfo=dt_timezone.utc)
+        end = datetime(year + mon // 12, mon % 12 + 1, 1, tzinfo=dt_timezone.utc)
+        if self.since and end <= self.since:
+            return False
+        if self.until and start >= self.until:
+            return False
+        return True
+
+    def _month_is_bounded(self, month):
+        """True when since/until cut through the month, so its index count is not exact."""
+        year, mon = map(int, month.split('-'))
+        start = datetime(year, mon, 1, tzinfo=dt_timezone.utc)
+        end = datetime(year + mon // 12, mon % 12 + 1, 1, tzinfo=dt_timezone.utc)
+        return bool((self.since and self.since > start) or (self.until and self.until < end))
+
+    def _segment(self, month):
+        """Segment columns for a month, newest first and clipped to the time bounds."""
+        if month not in self._cache:
+            columns = read_segment(self.kind, self.vehicle_id, month)
+            if columns:
+                order = np.argsort(columns[self.time_field], kind='stable')[::-1]
+                times = columns[self.time_field][order]
+                mask = np.ones(len(times), dtype=bool)
+                if self.since:
+                    mask &= times >= to_micros(self.since)
+                if self.until:
+                    mask &= times < to_micros(self.until)
+                columns = {name: values[order][mask] for name, values in columns.items()}
+            self._cache[month] = columns
+        return self._cache[month]
+
+    def _month_count(self, month, indexed_count):
+        if self._month_is_bounded(month):
+            columns = self._segment(month)
+            return len(columns[self.time_field]) if columns else 0
+        return indexed_count
+
+    def count(self):
+        return sum(self._month_count(month, count) for month, count in self.months)
+
+    def newest(self):
+        """Time of the newest archived row in range, or None."""
+        for month, _ in self.months:
+            columns = self._segment(month)
+            if columns and len(columns[self.time_field]):
+                return _from_micros(columns[self.time_field][0])
+        return None
+
+    def slice(self, start, stop):
+        """Rows [start:stop] in newest-first order, as unsaved model instances."""
+        results = []
+        offset = 0
+        for month, indexed_count in self.months:
+            if offset >= stop:
+                break
+            count = self._month_count(month, indexed_count)
+            if offset + count > start:
+                columns = self._segment(month)
+                if columns:
+                    lo = max(0, start - offset)
+                    hi = min(count, stop - offset)
+                    results.extend(columns_to_instances(self.kind, self.vehicle_id, columns, lo, hi))
+            offset += count
+        return results
+
+
+class MergedHistory:
+    """
+    Paginator-compatible sequence: hot database rows first, then archived rows.
+    Retention archives rows older than everything left in the table, so normally
+    the concatenation is in newest-first order. Readings that arrived late, older
+    than the newest archived row, stay in the table until the next retention run;
+    until then they are merged into the archived rows by time.
+    """
+
+    def __init__(self, queryset, archived):
+        self.archived = archived
+        self.time_field = archived.time_field
+        self.all_rows = queryset
+        self.newest_archived = archived.newest()
+        if self.newest_archived is None:
+            self.queryset, self.late = queryset, queryset.none()
+        else:
+            self.queryset = queryset.filter(**{f'{self.time_field}__gt': self.newest_archived})
+            self.late = queryset.filter(**{f'{self.time_field}__lte': self.newest_archived})
+        self._counts = None
+
+    def _count_rows(self):
+        """(hot, late) row counts, in one query."""
+        if self._counts is None:
+            if self.newest_archived is None:
+                self._counts = (self.queryset.count(), 0)
+            else:
+                late = Q(**{f'{self.time_field}__lte': self.newest_archived})
+                counts = self.all_rows.aggregate(hot=Count('pk', filter=~late), late=Count('pk', filter=late))
+                self._counts = (counts['hot'], counts['late'])
+        return self._counts
+
+    def hot_count(self):
+        return self._count_rows()[0]
+
+    def late_count(self):
+        return self._count_rows()[1]
+
+    def count(self):
+        return self.hot_count() + self.late_count() + self.archived.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            items = self[index:index + 1]
+            if not items:
+                raise IndexError(index)
+            return items[0]
+
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        hot = self.hot_count()
+        results = []
+        if start < hot:
+            results.extend(self.queryset[start:min(stop, hot)])
+        if stop > hot:
+            start, stop = max(0, start - hot), stop - hot
+            if not self.late_count():
+                results.extend(self.archived.slice(start, stop))
+            else:
+                # Both sides are newest first; only the first `stop` rows of each can make the page
+                merged = heapq.merge(
+                    list(self.late[:stop]), self.archived.slice(0, stop),
+                    key=lambda row: getattr(row, self.time_field), reverse=True,
+                )
+                results.extend(itertools.islice(merged, start, stop))
+        return results
+
+
+def with_archive(queryset, kind, vehicle_id, since=None, until=None):
+    """Return `queryset` unchanged if the vehicle has nothing archived, else a MergedHistory."""
+    archived = ArchivedSegments(kind, vehicle_id, since, until)
+    if not archived.months:
+        return queryset
+    return MergedHistory(queryset, archived)
@@ -0,0 +1,181 @@
+"""
+Micro-benchmark harness for the engine analysis functions in sensor_api.analysis.
+
+The analysis helpers run on every ``remaining-km`` request, so this module times
+them over a fixed, seeded sample of ``engine_dataset.csv`` rows and reports per-call
+and per-batch cost together with tracemalloc allocation figures. Results can be
+saved as a JSON baseline and compared against later runs.
+"""
+import csv
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+
+from .analysis import (
+    analyze_engine_performance,
+    calculate_engine_health,
+    get_maintenance_recommendations,
+    get_operational_recommendations,
+    get_parameter_status,
+)
+
+DEFAULT_DATASET_PATH = Path(settings.BASE_DIR) / 'ml_models' / 'datasets' / 'engine_dataset.csv'
+
+# Dataset column -> key used by the analysis functions
+DATASET_COLUMNS = {
+    'Engine rpm': 'Engine rpm',
+    'Lub oil pressure': 'Lub oil pressure',
+    'Fuel pressure': 'Fuel pressure',
+    'Coolant pressure': 'Coolant pressure',
+    'lub oil temp': 'Lub oil temp',
+    'Coolant temp': 'Coolant temp',
+}
+
+
+def _status_of_every_parameter(data):
+    return [get_parameter_status(param, value) for param, value in data.items()]
+
+
+# Each target takes one sensor reading (dict keyed like the remaining-km view builds it)
+BENCHMARK_TARGETS = {
+    'calculate_engine_health': calculate_engine_health,
+    'get_parameter_status': _status_of_every_parameter,
+    'get_maintenance_recommendations': get_maintenance_recommendations,
+    'analyze_engine_performance': analyze_engine_performance,
+    'get_operational_recommendations': lambda data: get_operational_recommendations(
+        data, calculate_engine_health(data)
+    ),
+}
+
+
+def load_dataset_rows(path=None, sample_size=1000, seed=42):
+    """
+    Load a reproducible sample of sensor readings from the engine dataset.
+    The same seed and sample size always yield the same rows in the same order.
+    """
+    path = Path(path) if path else DEFAULT_DATASET_PATH
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        rows = [
+            {key: float(row[column]) for column, key in DATASET_COLUMNS.items()}
+            for row in reader
+        ]
+
+    rng = random.Random(seed)
+    if sample_size and sample_size < len(rows):
+        rows = rng.sample(rows, sample_size)
+    else:
+        rng.shuffle(rows)
+    return rows
+
+
+def _time_batches(func, batches, repeat):
+    """Return the median wall time (seconds) of each batch across `repeat` rounds."""
+    timings = []
+    for _ in range(repeat):
+        for batch in batches:
+            start = time.perf_counter()
+            for row in batch:
+                func(row)
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _measure_allocations(func, batch):
+    """Run one batch under tracemalloc and return (allocated bytes, peak bytes)."""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        for row in batch:
+            func(row)
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, after - before), max(0, peak - before)
+
+
+def run_benchmarks(rows, batch_size=100, repeat=5, targets=None):
+    """
+    Time every benchmark target over `rows`, split into batches of `batch_size`.
+
+    Timing and allocation tracking are done in separate passes so tracemalloc
+    overhead does not inflate the reported latencies.
+    """
+    targets = targets or BENCHMARK_TARGETS
+    batches = [rows[i:i + batch_size] for i in range(0, len(rows), batch_size)]
+    if not batches:
+        raise ValueError('No rows to benchmark')
+
+    results = {}
+    for name, func in targets.items():
+        # Warm-up pass so first-call effects do not skew the numbers
+        for row in batches[0]:
+            func(row)
+
+        batch_timings = _time_batches(func, batches, repeat)
+        per_call = [t / len(batch) for t, batch in zip(batch_timings, batches * repeat)]
+        allocated, peak = _measure_allocations(func, batches[0])
+
+        results[name] = {
+            'calls': len(rows) * repeat,
+            'per_call_us': round(statistics.median(per_call) * 1e6, 3),
+            'per_call_p95_us': round(_percentile(per_call, 95) * 1e6, 3),
+            'per_batch_ms': round(statistics.median(batch_timings) * 1e3, 3),
+            'batch_size': batch_size,
+            'alloc_bytes_per_call': round(allocated / len(batches[0]), 1),
+            'peak_alloc_bytes_per_batch': peak,
+        }
+    return results
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+# Metrics compared against the baseline; lower is better for all of them
+REGRESSION_METRICS = ('per_call_us', 'per_batch_ms', 'peak_alloc_bytes_per_batch')
+
+
+def find_regressions(results, baseline, threshold=0.2):
+    """
+    Compare results against a baseline and return a list of regressions.
+    A metric regresses when it is more than `threshold` (a fraction) above the baseline.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        for metric in REGRESSION_METRICS:
+            old = reference.get(metric)
+            new = metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions.append({
+                    'function': name,
+                    'metric': metric,
+                    'baseline': old,
+                    'current': new,
+                    'change': round(change, 3),
+                })
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path, results, **metadata):
+    with open(path, 'w') as f:
+        json.dump({'metadata': metadata, 'results': results}, f, indent=2, sort_keys=True)
@@ -0,0 +1,372 @@
+"""
+Optional append-only columnar store for per-vehicle sensor history.
+
+Layout, one directory per vehicle under SENSOR_COLUMNAR_STORE['PATH']:
+
+    <field>.f32           float32 per sensor and for prediction_score (NaN = none)
+    prediction_result.u8  0 = none, 1 = Healthy, 2 = Faulty
+    timestamp.d32         int32 millisecond deltas from the previous row
+                          (timestamps are kept at millisecond resolution)
+    index.json            row count, delta blocks and time bounds
+
+Timestamps are stored as deltas; a new block with an absolute base time starts
+whenever a delta does not fit in int32 (about 24 days). Column files are opened
+with np.memmap, so slicing a column for analytics or a model window does not copy.
+The index row count is authoritative: rows past it (from an interrupted append)
+are dropped by the next append.
+
+Rows are kept in timestamp order. A reading older than the newest stored one (two
+inserts committing out of order) is merged in by rewriting the column tails from
+its position on; files only ever grow, so concurrent readers never map past them.
+Rows are never updated or deleted in place: when readings change in the database
+the vehicle is marked stale (invalidate_vehicles) and reads fall back to the
+database until `manage.py build_columnar_store` rebuilds it.
+"""
+import fcntl
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+from urllib.parse import unquote
+
+import numpy as np
+from django.conf import settings
+
+from .archive import PREDICTION_CODES, PREDICTION_VALUES, SENSOR_FIELDS, vehicle_path_component
+from .models import VehicleSensorData
+from .vehicles import display_vehicle
+
+FLOAT_FIELDS = SENSOR_FIELDS + ['prediction_score']
+COLUMNS = {field: ('f32', np.float32) for field in FLOAT_FIELDS}
+COLUMNS['prediction_result'] = ('u8', np.uint8)
+TIMESTAMP_FILE = 'timestamp.d32'
+INT32_MAX = np.iinfo(np.int32).max
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+class StoreUnavailable(Exception):
+    """A vehicle's columns cannot answer range reads (stale or not time-ordered); use the database."""
+
+
+def get_store_settings():
+    options = {'ENABLED': False, 'PATH': Path(settings.BASE_DIR) / 'columnar_store'}
+    options.update(getattr(settings, 'SENSOR_COLUMNAR_STORE', {}))
+    return options
+
+
+def is_enabled():
+    return bool(get_store_settings()['ENABLED'])
+
+
+def vehicle_store_dir(vehicle_id):
+    return Path(get_store_settings()['PATH']) / vehicle_path_component(vehicle_id)
+
+
+def _to_millis(value):
+    return int(round(value.timestamp() * 1000))
+
+
+def _from_millis(value):
+    return datetime.fromtimestamp(int(value) / 1000, tz=dt_timezone.utc)
+
+
+@contextmanager
+def _vehicle_lock(directory):
+    """Serialize appends to one vehicle across threads (dict of locks) and processes (flock)."""
+    key = str(directory)
+    with _locks_guard:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_index(directory):
+    try:
+        with open(directory / 'index.json') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {
+            'count': 0, 'blocks': [], 'min_ts': None, 'max_ts': None, 'last_ts': None, 'sorted': True, 'stale': False,
+        }
+
+
+def _write_index(directory, index):
+    tmp = directory / 'index.json.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, directory / 'index.json')
+
+
+def append_readings(vehicle_id, readings):
+    """
+    Add readings (dicts or VehicleSensorData instances) to a vehicle's column
+    files, merging them into timestamp order. Returns the new row count.
+    """
+    if not readings:
+        return None
+
+    def value(reading, field):
+        return reading[field] if isinstance(reading, dict) else getattr(reading, field)
+
+    millis = np.array([_to_millis(value(r, 'timestamp')) for r in readings], dtype=np.int64)
+    columns = {
+        field: np.array(
+            [np.nan if value(r, field) is None else value(r, field) for r in readings], dtype=np.float32
+        )
+        for field in FLOAT_FIELDS
+    }
+    columns['prediction_result'] = np.array(
+        [PREDICTION_CODES.get(value(r, 'prediction_result'), 0) for r in readings], dtype=np.uint8
+    )
+
+    directory = vehicle_store_dir(vehicle_id)
+    with _vehicle_lock(directory):
+        index = _read_index(directory)
+        count = index['count']
+        start, previous = count, index['last_ts']
+
+        if count and index['sorted'] and millis.min() < index['last_ts']:
+            # Late rows: rewrite from the first stored row newer than the oldest of them
+            stored = VehicleColumns(vehicle_id)
+            stored_millis = stored.timestamps()
+            start = int(np.searchsorted(stored_millis, millis.min(), side='right'))
+            previous = int(stored_millis[start - 1]) if start else None
+            millis = np.concatenate([stored_millis[start:], millis])
+            for field in COLUMNS:
+                columns[field] = np.concatenate([np.asarray(stored.column(field)[start:]), columns[field]])
+            index['blocks'] = [block for block in index['blocks'] if block[0] < start]
+
+        order = np.argsort(millis, kind='stable')
+        millis = millis[order]
+        columns = {field: values[order] for field, values in columns.items()}
+
+        deltas = millis - np.concatenate([[previous if previous is not None else millis[0]], millis[:-1]])
+        # Start a new block at the first row and wherever a delta overflows int32
+        new_blocks = {int(i) for i in np.flatnonzero(np.abs(deltas) > INT32_MAX)}
+        if previous is None:
+            new_blocks.add(0)
+        for i in sorted(new_blocks):
+            index['blocks'].append([start + i, int(millis[i])])
+            deltas[i] = 0
+
+        for field, (suffix, dtype) in COLUMNS.items():
+            _write_column(directory / f'{field}.{suffix}', columns[field], start, dtype)
+        _write_column(directory / TIMESTAMP_FILE, deltas.astype(np.int32), start, np.int32)
+
+        index.update({
+            'count': start + len(millis),
+            'min_ts': int(min(millis[0], index['min_ts'] if index['min_ts'] is not None else millis[0])),
+            'max_ts': int(max(millis[-1], index['max_ts'] if index['max_ts'] is not None else millis[-1])),
+            'last_ts': int(millis[-1]),
+            # Stores written before appends were merged may be out of order; rebuild them
+            'sorted': bool(index['sorted'] and (previous is None or millis[0] >= previous)),
+        })
+        _write_index(directory, index)
+        return index['count']
+
+
+def invalidate_vehicles(vehicle_ids=None):
+    """
+    Mark vehicles' columns stale after their readings changed in the database
+    (all stored vehicles when `vehicle_ids` is None). Appends continue; range reads
+    raise StoreUnavailable until the vehicle is rebuilt.
+    """
+    if not is_enabled():
+        return
+    if vehicle_ids is None:
+        vehicle_ids = stored_vehicles()
+    for vehicle_id in vehicle_ids:
+        directory = vehicle_store_dir(vehicle_id)
+        if not (directory / 'index.json').exists():
+            continue
+        with _vehicle_lock(directory):
+            index = _read_index(directory)
+            if not index.get('stale'):
+                index['stale'] = True
+                _write_index(directory, index)
+
+
+def stored_vehicles(stale_only=False):
+    """Ids of the vehicles with columns in the store, optionally only the stale ones."""
+    root = Path(get_store_settings()['PATH'])
+    if not root.is_dir():
+        return []
+    vehicle_ids = []
+    for directory in sorted(root.iterdir()):
+        if not (directory / 'index.json').exists():
+            continue
+        if stale_only and not _read_index(directory).get('stale'):
+            continue
+        vehicle_ids.append(unquote(directory.name))
+    return vehicle_ids
+
+
+def reset_vehicle(vehicle_id):
+    """Delete a vehicle's columns (before a rebuild)."""
+    directory = vehicle_store_dir(vehicle_id)
+    if not directory.exists():
+        return
+    with _vehicle_lock(directory):
+        for path in directory.iterdir():
+            if path.name != '.lock':
+                path.unlink()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def _write_column(path, values, start_row, dtype):
+    """Write `values` from row `start_row` on, dropping anything after them."""
+    with open(path, 'r+b' if path.exists() else 'wb') as f:
+        f.seek(start_row * np.dtype(dtype).itemsize)
+        f.write(values.tobytes())
+        # Left over from an interrupted append: rows the index never recorded
+        f.truncate()
+
+
+class VehicleColumns:
+    """Read-only, memory-mapped view of one vehicle's columns."""
+
+    def __init__(self, vehicle_id):
+        self.vehicle_id = str(vehicle_id)
+        self.directory = vehicle_store_dir(vehicle_id)
+        self.index = _read_index(self.directory)
+        self.count = self.index['count']
+        self._timestamps = None
+
+    def __len__(self):
+        return self.count
+
+    def column(self, field):
+        """Zero-copy memmap of a column (an empty array when the vehicle has no data)."""
+        if field == 'timestamp':
+            return self.timestamps()
+        suffix, dtype = COLUMNS[field]
+        if not self.count:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.directory / f'{field}.{suffix}', dtype=dtype, mode='r', shape=(self.count,))
+
+    def timestamps(self):
+        """Absolute timestamps in epoch milliseconds (decoded from the deltas, cached)."""
+        if self._timestamps is None:
+            if not self.count:
+                self._timestamps = np.empty(0, dtype=np.int64)
+            else:
+                deltas = np.memmap(self.directory / TIMESTAMP_FILE, dtype=np.int32, mode='r', shape=(self.count,))
+                millis = np.empty(self.count, dtype=np.int64)
+                blocks = self.index['blocks'] + [[self.count, None]]
+                for (start, base), (stop, _) in zip(blocks, blocks[1:]):
+                    millis[start:stop] = base + np.cumsum(deltas[start:stop], dtype=np.int64)
+                self._timestamps = millis
+        return self._timestamps
+
+    def row_range(self, since=None, until=None):
+        """Row bounds [start, stop) for readings in [since, until)."""
+        if self.index.get('stale'):
+            raise StoreUnavailable(f'Columnar store for vehicle {self.vehicle_id} is stale')
+        if not self.index['sorted']:
+            raise StoreUnavailable(f'Columnar store for vehicle {self.vehicle_id} is not time-ordered')
+        millis = self.timestamps()
+        start = int(np.searchsorted(millis, _to_millis(since), side='left')) if since else 0
+        stop = int(np.searchsorted(millis, _to_millis(until), side='left')) if until else self.count
+        return start, stop
+
+    def window(self, size, fields=SENSOR_FIELDS):
+        """
+        The latest `size` readings as a (rows, len(fields)) float32 matrix, the shape
+        the engine models take. Stacking columns into one matrix is the only copy made.
+        """
+        start = max(0, self.count - size)
+        return np.column_stack([self.column(field)[start:] for field in fields])
+
+    def instances(self, start, stop):
+        """Unsaved VehicleSensorData instances for rows [start, stop) in storage order."""
+        millis = self.timestamps()[start:stop]
+        vehicle = display_vehicle(self.vehicle_id)
+        columns = {field: self.column(field)[start:stop] for field in COLUMNS}
+        rows = []
+        for i, ts in enumerate(millis):
+            # str() of a float32 is its shortest round-trip form, so 0.9 reads back as 0.9
+            values = {field: float(str(columns[field][i])) for field in FLOAT_FIELDS}
+            if np.isnan(values['prediction_score']):
+                values['prediction_score'] = None
+            rows.append(VehicleSensorData(
+                vehicle=vehicle,
+                timestamp=_from_millis(ts),
+                prediction_result=PREDICTION_VALUES.get(int(columns['prediction_result'][i])),
+                **values,
+            ))
+        return rows
+
+    def hourly_rollups(self, since=None, until=None):
+        """Hourly averages computed straight from the columns, newest bucket first."""
+        start, stop = self.row_range(since, until)
+        if start >= stop:
+            return []
+
+        hours = self.timestamps()[start:stop] // 3_600_000
+        bucket_starts, first_rows, counts = np.unique(hours, return_index=True, return_counts=True)
+        result = {
+            'bucket_start': [_from_millis(h * 3_600_000) for h in bucket_starts],
+            'reading_count': counts,
+            'faulty_count': np.add.reduceat(
+                (np.asarray(self.column('prediction_result')[start:stop]) == PREDICTION_CODES['F']).astype(np.int64),
+                first_rows,
+            ),
+        }
+        for field in FLOAT_FIELDS:
+            values = np.asarray(self.column(field)[start:stop], dtype=np.float64)
+            present = ~np.isnan(values)
+            sums = np.add.reduceat(np.where(present, values, 0.0), first_rows)
+            seen = np.add.reduceat(present.astype(np.int64), first_rows)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[f'avg_{field}'] = np.where(seen > 0, sums / np.maximum(seen, 1), np.nan)
+
+        vehicle = display_vehicle(self.vehicle_id)
+        rows = []
+        for i in range(len(bucket_starts) - 1, -1, -1):
+            row = {'vehicle': vehicle}
+            for key, values in result.items():
+                value = values[i]
+                row[key] = value.item() if hasattr(value, 'item') else value
+                if isinstance(row[key], float) and np.isnan(row[key]):
+                    row[key] = None
+            rows.append(row)
+        return rows
+
+
+class ColumnarHistory:
+    """Paginator-compatible, newest-first sequence over a vehicle's columnar readings."""
+
+    def __init__(self, vehicle_id, since=None, until=None):
+        self.columns = VehicleColumns(vehicle_id)
+        self.start, self.stop = self.columns.row_range(since, until)
+
+    def count(self):
+        return max(0, self.stop - self.start)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            items = self[index:index + 1]
+            if not items:
+                raise IndexError(index)
+            return items[0]
+
+        first = index.start or 0
+        last = index.stop if index.stop is not None else self.count()
+        # Newest-first position i is storage row (stop - 1 - i)
+        lo = max(self.start, self.stop - last)
+        hi = max(self.start, self.stop - first)
+        return list(reversed(self.columns.instances(lo, hi)))
@@ -0,0 +1,74 @@
+"""
+HTTP conditional requests (ETag / Last-Modified) for the readings endpoints.
+
+Validators come from the denormalized Vehicle.reading_count and
+Vehicle.readings_modified_at, which change whenever one of the vehicle's readings
+is inserted, updated or deleted. Checking them is one indexed lookup, so a poll of
+an unchanged vehicle is answered with 304 Not Modified before the page is counted,
+fetched or serialized.
+
+The ETag also covers the request path with its query string (the page, page size
+and time range) and the negotiated media type, since JSON and msgpack bodies of
+the same page differ. Checks run inside the views, after authentication and
+permissions, so a 304 never reveals anything to a client that may not read the
+vehicle.
+"""
+import hashlib
+
+from django.db.models import Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Vehicle
+
+
+def vehicle_state(vehicle):
+    """(reading_count, readings_modified_at) of a vehicle, or None when it is unknown."""
+    if vehicle is None:
+        return None
+    return Vehicle.objects.filter(pk=vehicle.pk).values_list('reading_count', 'readings_modified_at').first()
+
+
+def fleet_state():
+    totals = Vehicle.objects.aggregate(count=Sum('reading_count'), modified=Max('readings_modified_at'))
+    return totals['count'] or 0, totals['modified']
+
+
+def make_validators(request, state):
+    """(etag, last_modified) for a response built from data in `state`."""
+    count, modified = state
+    media_type = getattr(request, 'accepted_media_type', '')
+    stamp = modified.timestamp() if modified else 0
+    key = f'{count}:{stamp}:{media_type}:{request.get_full_path()}'
+    digest = hashlib.md5(key.encode()).hexdigest()[:20]
+    return f'"{digest}"', modified
+
+
+def not_modified(request, validators):
+    """
+    A 304 (or 412) response when the client's cached copy is still current,
+    otherwise None.
+    """
+    etag, last_modified = validators
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is None:
+        return None
+    if response.status_code != status.HTTP_304_NOT_MODIFIED:
+        return response
+    return add_validators(Response(status=status.HTTP_304_NOT_MODIFIED), validators)
+
+
+def add_validators(response, validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients may keep the response but must revalidate; shared caches must not store it
+    response['Cache-Control'] = 'private, no-cache'
+    return response
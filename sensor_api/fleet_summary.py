@@ -0,0 +1,361 @@
+"""
+Fleet-wide summary statistics from aggregates maintained at write time.
+
+Every committed reading is added to this process's accumulator for its
+WINDOW_MINUTES window (by reading timestamp): reading, scored and faulty counts, a
+HyperLogLog of vehicle ids and a KLL sketch per sensor (monitoring.sketches). A
+daemon thread merges the accumulators into FleetSummaryWindow rows every
+FLUSH_SECONDS. A summary over any range then reads and merges one small row per
+window instead of scanning the readings, so its cost depends on the length of the
+range, not on the size of the table.
+
+Distinct vehicle counts are within about 1.6% and quantiles within about 1% in
+rank. Readings loaded in bulk (generate_telemetry --format db, benchmark seeding)
+and scores changed later (manage.py rescore) bypass the accumulators;
+`manage.py rebuild_fleet_summary` recomputes windows from the readings table
+(see rebuild_windows() for running it alongside ingestion).
+Summary windows outlive raw-reading retention until RETENTION_DAYS.
+
+summarize_exact() answers the same question with a scan, for comparison (with
+sharding, of every shard).
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, router, transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from monitoring.sketches import HyperLogLog, KLLSketch
+
+from . import sharding
+from .archive import SENSOR_FIELDS
+from .models import FleetSummaryWindow, VehicleSensorData
+
+logger = logging.getLogger(__name__)
+
+
+def get_fleet_summary_settings():
+    options = {
+        'ENABLED': True,
+        'WINDOW_MINUTES': 60,
+        'FLUSH_SECONDS': 10,
+        'HLL_PRECISION': 12,
+        'SKETCH_K': 200,
+        'RETENTION_DAYS': 400,
+    }
+    options.update(getattr(settings, 'SENSOR_FLEET_SUMMARY', {}))
+    return options
+
+
+def window_floor(moment, minutes):
+    seconds = minutes * 60
+    stamp = int(moment.timestamp()) // seconds * seconds
+    return datetime.fromtimestamp(stamp, tz=dt_timezone.utc)
+
+
+def aligned_range(since, until, minutes):
+    """[since, until) widened to whole windows, which is what a summary covers."""
+    step = timedelta(minutes=minutes)
+    start = window_floor(since, minutes)
+    end = window_floor(until, minutes)
+    if end < until:
+        end += step
+    return start, end
+
+
+class WindowAggregate:
+    """Counts and sketches for one window; mergeable with another of the same window."""
+
+    def __init__(self, options):
+        self.readings = 0
+        self.scored = 0
+        self.faulty = 0
+        self.vehicles = HyperLogLog(p=options['HLL_PRECISION'])
+        self.sketches = {field: KLLSketch(k=options['SKETCH_K']) for field in SENSOR_FIELDS}
+
+    def add(self, vehicle_id, values, prediction_result):
+        self.readings += 1
+        if prediction_result:
+            self.scored += 1
+            self.faulty += prediction_result == 'F'
+        self.vehicles.add(vehicle_id)
+        for field, value in zip(SENSOR_FIELDS, values):
+            self.sketches[field].update(value)
+
+    def merge(self, other):
+        self.readings += other.readings
+        self.scored += other.scored
+        self.faulty += other.faulty
+        self.vehicles.merge(other.vehicles)
+        for field, sketch in other.sketches.items():
+            self.sketches[field].merge(sketch)
+        return self
+
+    @classmethod
+    def from_row(cls, row, options):
+        aggregate = cls(options)
+        aggregate.readings = row.reading_count
+        aggregate.scored = row.scored_count
+        aggregate.faulty = row.faulty_count
+        aggregate.vehicles = HyperLogLog.from_bytes(bytes(row.vehicles), p=options['HLL_PRECISION'])
+        for field, data in row.sketches.items():
+            aggregate.sketches[field] = KLLSketch.from_dict(data)
+        return aggregate
+
+    def row_values(self):
+        return {
+            'reading_count': self.readings,
+            'scored_count': self.scored,
+            'faulty_count': self.faulty,
+            'vehicles': self.vehicles.to_bytes(),
+            'sketches': {field: sketch.to_dict() for field, sketch in self.sketches.items()},
+        }
+
+
+def merge_into_window(start, aggregate, options):
+    """Merge an aggregate into the stored window under a row lock."""
+    with transaction.atomic():
+        row = FleetSummaryWindow.objects.select_for_update().filter(window_start=start).first()
+        if row is None:
+            try:
+                with transaction.atomic():
+                    FleetSummaryWindow.objects.create(window_start=start, **aggregate.row_values())
+                return
+            except IntegrityError:
+                # Another process created the window first
+                row = FleetSummaryWindow.objects.select_for_update().get(window_start=start)
+        merged = WindowAggregate.from_row(row, options).merge(aggregate)
+        for name, value in merged.row_values().items():
+            setattr(row, name, value)
+        row.save()
+
+
+class FleetSummaryRecorder:
+    """This process's unflushed window aggregates and the thread that flushes them."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def observe(self, reading):
+        options = get_fleet_summary_settings()
+        if not options['ENABLED']:
+            return
+        start = window_floor(reading.timestamp, options['WINDOW_MINUTES'])
+        values = [getattr(reading, field) for field in SENSOR_FIELDS]
+        with self._lock:
+            aggregate = self._pending.get(start)
+            if aggregate is None:
+                aggregate = self._pending[start] = WindowAggregate(options)
+            aggregate.add(reading.vehicle_id, values, reading.prediction_result)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='fleet-summary', daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Merge pending aggregates into the database. Returns the number of windows written."""
+        options = get_fleet_summary_settings()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        done = set()
+        try:
+            for start, aggregate in sorted(pending.items()):
+                merge_into_window(start, aggregate, options)
+                done.add(start)
+        except Exception:
+            # Keep what was not written for the next attempt
+            with self._lock:
+                for start, aggregate in pending.items():
+                    if start in done:
+                        continue
+                    current = self._pending.setdefault(start, aggregate)
+                    if current is not aggregate:
+                        current.merge(aggregate)
+            raise
+        return len(done)
+
+    def _run(self):
+        while True:
+            time.sleep(get_fleet_summary_settings()['FLUSH_SECONDS'])
+            try:
+                self.flush()
+                prune_windows()
+            except Exception as e:
+                logger.error(f"Fleet summary flush failed: {e}")
+            finally:
+                close_old_connections()
+
+
+recorder = FleetSummaryRecorder()
+
+
+def observe(reading):
+    recorder.observe(reading)
+
+
+def prune_windows():
+    cutoff = timezone.now() - timedelta(days=get_fleet_summary_settings()['RETENTION_DAYS'])
+    FleetSummaryWindow.objects.filter(window_start__lt=cutoff).delete()
+
+
+def _result(since, until, readings, scored, faulty, distinct, quantiles):
+    return {
+        'since': since,
+        'until': until,
+        'readings': readings,
+        'distinct_vehicles': distinct,
+        'scored_readings': scored,
+        'faulty_readings': faulty,
+        'faulty_share': round(faulty / scored, 4) if scored else None,
+        'sensors': quantiles,
+    }
+
+
+def _quantile_label(q):
+    return f'p{q * 100:g}'
+
+
+def summarize(since, until, quantiles):
+    """Approximate summary of the windows covering [since, until)."""
+    options = get_fleet_summary_settings()
+    since, until = aligned_range(since, until, options['WINDOW_MINUTES'])
+    total = WindowAggregate(options)
+    windows = 0
+    for row in FleetSummaryWindow.objects.filter(window_start__gte=since, window_start__lt=until):
+        total.merge(WindowAggregate.from_row(row, options))
+        windows += 1
+
+    sensors = {
+        field: {_quantile_label(q): (round(sketch.quantile(q), 4) if sketch.n else None) for q in quantiles}
+        for field, sketch in total.sketches.items()
+    }
+    summary = _result(since, until, total.readings, total.scored, total.faulty, total.vehicles.count(), sensors)
+    summary['mode'] = 'approximate'
+    summary['windows'] = windows
+    summary['distinct_vehicles_std_error'] = round(total.vehicles.standard_error, 4)
+    return summary
+
+
+def _exact_quantiles(since, until, quantiles):
+    connection = connections[router.db_for_read(VehicleSensorData)]
+    if connection.vendor == 'postgresql' and not sharding.is_enabled():
+        columns = ', '.join(
+            f'percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY {field})' for field in SENSOR_FIELDS
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {columns} FROM {VehicleSensorData._meta.db_table} WHERE timestamp >= %s AND timestamp < %s',
+                [list(quantiles)] * len(SENSOR_FIELDS) + [since, until],
+            )
+            row = cursor.fetchone()
+        values = dict(zip(SENSOR_FIELDS, row))
+    else:
+        # Percentiles of separate shards do not combine, so shards send their values
+        readings = VehicleSensorData.objects.filter(timestamp__gte=since, timestamp__lt=until)
+        rows = sharding.gather(readings.values_list(*SENSOR_FIELDS))
+        data = np.array(rows, dtype=np.float64).reshape(-1, len(SENSOR_FIELDS))
+        values = {
+            field: (np.quantile(data[:, i], quantiles).tolist() if len(data) else None)
+            for i, field in enumerate(SENSOR_FIELDS)
+        }
+    return {
+        field: {
+            _quantile_label(q): (round(v, 4) if v is not None else None)
+            for q, v in zip(quantiles, values[field] or [None] * len(quantiles))
+        }
+        for field in SENSOR_FIELDS
+    }
+
+
+def summarize_exact(since, until, quantiles):
+    """The same summary computed by scanning the readings in the aligned range."""
+    options = get_fleet_summary_settings()
+    since, until = aligned_range(since, until, options['WINDOW_MINUTES'])
+    readings = VehicleSensorData.objects.filter(timestamp__gte=since, timestamp__lt=until).order_by()
+    aggregates = {
+        'readings': Count('id'),
+        'distinct': Count('vehicle', distinct=True),
+        'scored': Count('id', filter=Q(prediction_result__isnull=False)),
+        'faulty': Count('id', filter=Q(prediction_result='F')),
+    }
+    if sharding.is_enabled():
+        # A vehicle's readings are all on one shard, so distinct counts add up too
+        per_shard = sharding.scatter(lambda alias: readings.using(alias).aggregate(**aggregates))
+        totals = {name: sum(shard[name] for shard in per_shard) for name in aggregates}
+    else:
+        totals = readings.aggregate(**aggregates)
+    sensors = _exact_quantiles(since, until, quantiles)
+    summary = _result(
+        since, until, totals['readings'], totals['scored'], totals['faulty'], totals['distinct'], sensors
+    )
+    summary['mode'] = 'exact'
+    return summary
+
+
+def _reading_extent():
+    """Timestamps of the oldest and newest readings, or (None, None) without readings."""
+    readings = VehicleSensorData.objects.order_by()
+    aggregates = {'oldest': Min('timestamp'), 'newest': Max('timestamp')}
+    if sharding.is_enabled():
+        per_shard = sharding.scatter(lambda alias: readings.using(alias).aggregate(**aggregates))
+    else:
+        per_shard = [readings.aggregate(**aggregates)]
+    oldest = [shard['oldest'] for shard in per_shard if shard['oldest'] is not None]
+    newest = [shard['newest'] for shard in per_shard if shard['newest'] is not None]
+    return (min(oldest), max(newest)) if oldest else (None, None)
+
+
+def rebuild_windows(since=None, until=None, batch_size=10000):
+    """
+    Recompute the windows covering [since, until) from the readings table,
+    replacing stored windows in that range. `since` and `until` default to the
+    oldest and newest readings, so windows whose readings retention has already
+    removed are kept. Returns the number of windows written.
+
+    This process's pending aggregates are flushed first. Other processes may still
+    hold aggregates for readings committed in their last FLUSH_SECONDS; the rebuild
+    counts those readings and their flush adds them again. Rebuild while ingestion
+    is stopped, or end the range before the newest readings.
+    """
+    options = get_fleet_summary_settings()
+    recorder.flush()
+    if since is None or until is None:
+        oldest, newest = _reading_extent()
+        if oldest is None:
+            return 0
+        since = since or oldest
+        # The window holding the newest reading, even when it starts exactly there
+        until = until or newest + timedelta(microseconds=1)
+    since = window_floor(since, options['WINDOW_MINUTES'])
+    until = aligned_range(until, until, options['WINDOW_MINUTES'])[1]
+    readings = VehicleSensorData.objects.filter(timestamp__gte=since, timestamp__lt=until).order_by('timestamp')
+
+    written = 0
+    current, aggregate = None, None
+
+    def save():
+        FleetSummaryWindow.objects.update_or_create(window_start=current, defaults=aggregate.row_values())
+
+    with transaction.atomic():
+        FleetSummaryWindow.objects.filter(window_start__gte=since, window_start__lt=until).delete()
+
+        rows = readings.values_list('timestamp', 'vehicle_id', 'prediction_result', *SENSOR_FIELDS)
+        rows = sharding.merged_iterator(rows, key=lambda row: row[0], chunk_size=batch_size)
+        for timestamp, vehicle_id, prediction_result, *values in rows:
+            start = window_floor(timestamp, options['WINDOW_MINUTES'])
+            if start != current:
+                if aggregate is not None:
+                    save()
+                    written += 1
+                current, aggregate = start, WindowAggregate(options)
+            aggregate.add(vehicle_id, values, prediction_result)
+        if aggregate is not None:
+            save()
+            written += 1
+    return written
@@ -0,0 +1,209 @@
+"""
+Plan and latency comparison for the VehicleSensorData indexes.
+
+Seeds a synthetic fleet (vehicles named ``bench-NNNN``), then runs each query
+pattern from queries.py twice: once as deployed, and once inside a transaction
+that drops the pattern's index (and recreates whatever index the table had
+before it) and is rolled back afterwards. For each run it records the
+scan nodes of the EXPLAIN plan and the median wall-clock latency.
+
+Dropping an index takes an exclusive lock on the table for the length of the
+comparison, so run this against a scratch database, not production.
+"""
+import re
+import statistics
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import partitioning
+from .models import Vehicle, VehicleSensorData
+from .queries import high_score_readings, recent_faulty_readings, vehicle_history
+from .vehicles import recount_readings
+
+BENCH_PREFIX = 'bench-'
+TABLE = VehicleSensorData._meta.db_table
+PAGE_SIZE = 50
+
+# Per pattern: queryset builder, the index it is meant to use, and the SQL that
+# recreates what served the query before that index existed (None = nothing did)
+PATTERNS = {
+    'vehicle_history': {
+        'queryset': lambda ctx: vehicle_history(ctx['vehicle'])[:PAGE_SIZE],
+        'index': 'sensor_api_vehicle_ts_cov_idx',
+        'previous': 'CREATE INDEX "sensor_api_vehicle_ts_idx" ON {table} ("vehicle_id", "timestamp" DESC)',
+    },
+    'fleet_faulty': {
+        'queryset': lambda ctx: recent_faulty_readings()[:PAGE_SIZE],
+        'index': 'sensor_api_faulty_ts_idx',
+        'previous': None,
+    },
+    'fleet_high_score': {
+        'queryset': lambda ctx: high_score_readings(ctx['min_score'])[:PAGE_SIZE],
+        'index': 'sensor_api_score_idx',
+        'previous': None,
+    },
+}
+
+# Scan node kinds as they appear in PostgreSQL and SQLite plans, most specific first
+SCAN_KINDS = [
+    'Index Only Scan', 'Bitmap Index Scan', 'Index Scan', 'Seq Scan',
+    'USING COVERING INDEX', 'USING INDEX', 'SCAN',
+]
+
+
+def seed_readings(rows, vehicles=200, days=90, seed=42, faulty_rate=0.05, batch_size=10000):
+    """
+    Insert `rows` synthetic readings spread over `vehicles` bench vehicles and the
+    last `days` days. Returns the number of rows inserted.
+    """
+    now = timezone.now()
+    Vehicle.objects.bulk_create(
+        [Vehicle(external_id=f'{BENCH_PREFIX}{i:04d}') for i in range(vehicles)],
+        ignore_conflicts=True,
+    )
+    vehicle_pks = np.array(
+        Vehicle.objects.filter(external_id__startswith=BENCH_PREFIX).order_by('pk').values_list('pk', flat=True)
+    )
+
+    if partitioning.is_partitioned(connection):
+        # Give the seeded months their own partitions instead of the default one
+        partitioning.create_partitions_between(connection, now - timedelta(days=days), now)
+
+    rng = np.random.default_rng(seed)
+    columns = ['vehicle_id', 'timestamp', 'engine_rpm', 'lub_oil_pressure', 'fuel_pressure',
+               'coolant_pressure', 'lub_oil_temp', 'coolant_temp', 'prediction_result', 'prediction_score']
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(TABLE),
+        ', '.join(connection.ops.quote_name(c) for c in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+
+    inserted = 0
+    with connection.cursor() as cursor:
+        while inserted < rows:
+            n = min(batch_size, rows - inserted)
+            offsets = rng.uniform(0, days * 86400, n)
+            faulty = rng.random(n) < faulty_rate
+            # Scores above 0.5 are healthy, as the engine model reports them
+            scores = np.where(faulty, 0.5 * rng.beta(2, 5, n), 0.5 + 0.5 * rng.beta(5, 2, n))
+            scored = rng.random(n) >= 0.02
+            batch = [
+                (
+                    int(vehicle_pk),
+                    now - timedelta(seconds=float(offset)),
+                    float(rpm), float(oil_p), float(fuel_p), float(cool_p), float(oil_t), float(cool_t),
+                    'F' if is_faulty else 'H',
+                    float(score) if has_score else None,
+                )
+                for vehicle_pk, offset, rpm, oil_p, fuel_p, cool_p, oil_t, cool_t, is_faulty, score, has_score in zip(
+                    rng.choice(vehicle_pks, n), offsets,
+                    rng.normal(790, 260, n), rng.normal(3.3, 1.0, n), rng.normal(6.6, 2.7, n),
+                    rng.normal(2.3, 1.0, n), rng.normal(77.6, 3.1, n), rng.normal(78.4, 6.2, n),
+                    faulty, scores, scored,
+                )
+            ]
+            with transaction.atomic():
+                cursor.executemany(sql, batch)
+            inserted += n
+    recount_readings(vehicle_pks.tolist())
+    return inserted
+
+
+def bench_row_count():
+    return VehicleSensorData.objects.filter(vehicle__external_id__startswith=BENCH_PREFIX).count()
+
+
+def delete_seeded():
+    """Remove bench vehicles and their readings. Returns readings deleted."""
+    deleted = VehicleSensorData.objects.filter(vehicle__external_id__startswith=BENCH_PREFIX).bulk_delete()
+    Vehicle.objects.filter(external_id__startswith=BENCH_PREFIX).delete()
+    return deleted
+
+
+def refresh_statistics():
+    """Update planner statistics (and, on PostgreSQL, the visibility map index-only scans rely on)."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'VACUUM ANALYZE {connection.ops.quote_name(TABLE)}')
+        else:
+            cursor.execute('ANALYZE')
+
+
+def explain(queryset):
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def scan_nodes(plan):
+    """
+    Summarize an EXPLAIN plan as scan node kinds with counts (a partitioned table
+    has one node per partition scanned), plus heap fetches and pages touched on
+    PostgreSQL.
+    """
+    counts = {}
+    for line in plan.splitlines():
+        for kind in SCAN_KINDS:
+            if kind in line:
+                counts[kind] = counts.get(kind, 0) + 1
+                break
+    summary = [f'{kind} x{count}' for kind, count in counts.items()]
+    fetches = [int(n) for n in re.findall(r'Heap Fetches: (\d+)', plan)]
+    if fetches:
+        summary.append(f'heap fetches {sum(fetches)}')
+    # The first Buffers line belongs to the top plan node: pages touched by the whole query
+    buffers = re.search(r'Buffers: shared(?: hit=(\d+))?(?: read=(\d+))?', plan)
+    if buffers:
+        summary.append(f'pages {sum(int(n or 0) for n in buffers.groups())}')
+    return summary
+
+
+def time_queryset(build, repeat):
+    timings = []
+    for _ in range(repeat):
+        queryset = build()
+        start = time.perf_counter()
+        list(queryset)
+        timings.append(time.perf_counter() - start)
+    return round(statistics.median(timings) * 1e3, 3)
+
+
+def _measure(build, repeat):
+    list(build())  # warm the cache so both phases start equal
+    plan = explain(build())
+    return {'plan': plan, 'scans': scan_nodes(plan), 'median_ms': time_queryset(build, repeat)}
+
+
+def run_index_benchmarks(repeat=5, min_score=0.9, patterns=None):
+    """
+    Measure each pattern with and without its index. Returns
+    {pattern: {'with_index': {...}, 'without_index': {...}}}.
+    """
+    vehicle = (
+        Vehicle.objects.filter(external_id__startswith=BENCH_PREFIX).order_by('external_id').first()
+    )
+    ctx = {'vehicle': vehicle, 'min_score': min_score}
+    qn = connection.ops.quote_name
+    results = {}
+
+    for name in patterns or PATTERNS:
+        pattern = PATTERNS[name]
+        build = lambda: pattern['queryset'](ctx)  # noqa: E731
+        result = {'index': pattern['index'], 'with_index': _measure(build, repeat)}
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP INDEX {qn(pattern["index"])}')
+                if pattern['previous']:
+                    cursor.execute(pattern['previous'].format(table=qn(TABLE)))
+                if connection.vendor == 'postgresql':
+                    cursor.execute(f'ANALYZE {qn(TABLE)}')
+            result['without_index'] = _measure(build, repeat)
+            transaction.set_rollback(True)
+
+        results[name] = result
+    return results
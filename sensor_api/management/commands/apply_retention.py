@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sensor_api.retention import apply_retention, get_policy
+
+
+class Command(BaseCommand):
+    help = (
+        'Apply SENSOR_RETENTION: downsample and archive raw readings past RAW_DAYS, '
+        'then archive rollups past ROLLUP_DAYS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be processed')
+
+    def handle(self, *args, **options):
+        policy = get_policy()
+        if policy['RAW_DAYS'] is None and policy['ROLLUP_DAYS'] is None:
+            self.stdout.write('No retention policy configured (SENSOR_RETENTION)')
+            return
+
+        summary = apply_retention(timezone.now(), dry_run=options['dry_run'])
+        prefix = 'Would process' if options['dry_run'] else 'Processed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {summary['raw_compacted']} raw reading(s) and "
+            f"{summary['rollups_archived']} rollup(s)"
+        ))
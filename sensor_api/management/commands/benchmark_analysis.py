@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sensor_api.benchmarks import (
+    BENCHMARK_TARGETS,
+    find_regressions,
+    load_baseline,
+    load_dataset_rows,
+    run_benchmarks,
+    save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmark the engine analysis functions over a seeded sample of '
+        'engine_dataset.csv and fail when a baseline regression threshold is exceeded.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', help='CSV file to sample rows from (defaults to engine_dataset.csv)')
+        parser.add_argument('--rows', type=int, default=1000, help='Number of rows to sample')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for row sampling')
+        parser.add_argument('--batch-size', type=int, default=100, help='Rows per timed batch')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed rounds over the whole sample')
+        parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARK_TARGETS), help='Benchmark only these functions')
+        parser.add_argument('--baseline', help='JSON baseline to compare against')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Allowed slowdown/allocation growth as a fraction of the baseline (default 0.2 = 20%%)'
+        )
+        parser.add_argument('--save-baseline', help='Write the results as a new baseline to this path')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['repeat'] < 1:
+            raise CommandError('--batch-size and --repeat must be positive')
+
+        try:
+            rows = load_dataset_rows(options['dataset'], options['rows'], options['seed'])
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(f'Could not load benchmark dataset: {e}')
+
+        targets = BENCHMARK_TARGETS
+        if options['only']:
+            targets = {name: BENCHMARK_TARGETS[name] for name in options['only']}
+
+        results = run_benchmarks(rows, options['batch_size'], options['repeat'], targets)
+
+        self.stdout.write(
+            f"{'function':<34}{'per call (us)':>15}{'p95 (us)':>12}{'per batch (ms)':>16}"
+            f"{'alloc/call (B)':>16}{'peak/batch (B)':>16}"
+        )
+        for name, metrics in results.items():
+            self.stdout.write(
+                f"{name:<34}{metrics['per_call_us']:>15}{metrics['per_call_p95_us']:>12}"
+                f"{metrics['per_batch_ms']:>16}{metrics['alloc_bytes_per_call']:>16}"
+                f"{metrics['peak_alloc_bytes_per_batch']:>16}"
+            )
+
+        if options['save_baseline']:
+            save_baseline(
+                options['save_baseline'], results,
+                rows=len(rows), seed=options['seed'],
+                batch_size=options['batch_size'], repeat=options['repeat'],
+            )
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['save_baseline']}"))
+
+        if options['baseline']:
+            try:
+                baseline = load_baseline(options['baseline'])
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read baseline: {e}')
+
+            regressions = find_regressions(results, baseline, options['threshold'])
+            if regressions:
+                for r in regressions:
+                    self.stderr.write(
+                        f"{r['function']}.{r['metric']}: {r['baseline']} -> {r['current']} "
+                        f"(+{r['change'] * 100:.1f}%)"
+                    )
+                raise CommandError(
+                    f"{len(regressions)} benchmark regression(s) above {options['threshold'] * 100:.0f}%"
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sensor_api import sharding
+from sensor_api.index_benchmarks import (
+    PATTERNS,
+    bench_row_count,
+    delete_seeded,
+    refresh_statistics,
+    run_index_benchmarks,
+    seed_readings,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic fleet and compare query plans and latency of the history and '
+        'fleet queries with and without their indexes. Drops indexes inside rolled-back '
+        'transactions, which locks the readings table: use a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Readings to seed (default 1,000,000)')
+        parser.add_argument('--vehicles', type=int, default=200, help='Bench vehicles to spread readings over')
+        parser.add_argument('--days', type=int, default=90, help='Spread readings over this many past days')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--skip-seed', action='store_true', help='Reuse previously seeded bench rows')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query and phase')
+        parser.add_argument('--min-score', type=float, default=0.9, help='Threshold for the high-score query')
+        parser.add_argument('--only', nargs='+', choices=sorted(PATTERNS), help='Benchmark only these patterns')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the bench vehicles and readings afterwards')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive')
+        if sharding.is_enabled():
+            raise CommandError('Index benchmarks run on a single database; disable SENSOR_SHARDING')
+
+        if not options['skip_seed']:
+            inserted = seed_readings(options['rows'], options['vehicles'], options['days'], options['seed'])
+            self.stdout.write(f'Seeded {inserted} readings over {options["vehicles"]} vehicles')
+        if not bench_row_count():
+            raise CommandError('No bench readings found; run without --skip-seed first')
+
+        refresh_statistics()
+        results = run_index_benchmarks(options['repeat'], options['min_score'], options['only'])
+
+        self.stdout.write(f"{'pattern':<20}{'phase':<16}{'median (ms)':>12}  plan")
+        for name, result in results.items():
+            for phase in ('with_index', 'without_index'):
+                measured = result[phase]
+                self.stdout.write(
+                    f"{name:<20}{phase:<16}{measured['median_ms']:>12}  {', '.join(measured['scans'])}"
+                )
+                if options['verbosity'] >= 2:
+                    self.stdout.write(measured['plan'])
+            speedup = result['without_index']['median_ms'] / max(result['with_index']['median_ms'], 1e-6)
+            self.stdout.write(f"{'':<20}{result['index']} is {speedup:.1f}x faster")
+
+        if options['cleanup']:
+            self.stdout.write(f'Deleted {delete_seeded()} bench readings')
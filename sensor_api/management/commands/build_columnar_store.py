@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sensor_api import columnar
+from sensor_api.archive import columns_to_instances, load_index, read_segment
+from sensor_api.models import Vehicle
+from sensor_api.vehicles import get_vehicle
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the columnar store from archived segments and the database, oldest '
+        'reading first. Readings saved while a vehicle is being rebuilt may be appended twice.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicle', action='append', help='Only rebuild these vehicle ids (repeatable)')
+        parser.add_argument(
+            '--stale', action='store_true', help='Only rebuild vehicles whose readings changed since they were stored'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not columnar.is_enabled():
+            raise CommandError('SENSOR_COLUMNAR_STORE is not enabled')
+
+        if options['stale']:
+            vehicle_ids = columnar.stored_vehicles(stale_only=True)
+        else:
+            vehicle_ids = options['vehicle'] or list(
+                Vehicle.objects.order_by('external_id').values_list('external_id', flat=True)
+            )
+        for vehicle_id in vehicle_ids:
+            columnar.reset_vehicle(vehicle_id)
+            archived = self._copy_archived(vehicle_id, options['batch_size'])
+            hot = self._copy_database(vehicle_id, options['batch_size'])
+            self.stdout.write(f'{vehicle_id}: {archived} archived + {hot} database reading(s)')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(vehicle_ids)} vehicle(s)'))
+
+    def _copy_archived(self, vehicle_id, batch_size):
+        total = 0
+        for month in sorted(load_index('raw', vehicle_id)):
+            columns = read_segment('raw', vehicle_id, month)
+            if not columns:
+                continue
+            rows = sorted(columns_to_instances('raw', vehicle_id, columns), key=lambda row: row.timestamp)
+            for start in range(0, len(rows), batch_size):
+                columnar.append_readings(vehicle_id, rows[start:start + batch_size])
+            total += len(rows)
+        return total
+
+    def _copy_database(self, vehicle_id, batch_size):
+        vehicle = get_vehicle(vehicle_id)
+        if vehicle is None:
+            return 0
+        total = 0
+        batch = []
+        queryset = vehicle.readings.order_by('timestamp')
+        for row in queryset.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                columnar.append_readings(vehicle_id, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            columnar.append_readings(vehicle_id, batch)
+            total += len(batch)
+        return total
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from sensor_api import partitioning, sharding
+from sensor_api.vehicles import recount_readings
+
+
+class Command(BaseCommand):
+    help = (
+        'Create upcoming monthly partitions of the sensor readings table and drop or archive '
+        'expired ones. On databases without partitioning, expiry deletes rows instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=getattr(settings, 'SENSOR_PARTITION_MONTHS_AHEAD', 3),
+            help='Partitions to keep ready beyond the current month'
+        )
+        parser.add_argument(
+            '--retain-months', type=int, default=getattr(settings, 'SENSOR_PARTITION_RETAIN_MONTHS', None),
+            help='Months of readings to keep; older partitions expire (default: keep everything)'
+        )
+        parser.add_argument(
+            '--expire', choices=['drop', 'archive'], default='archive',
+            help="'drop' deletes expired partitions; 'archive' detaches them into the "
+                 f"{partitioning.ARCHIVE_SCHEMA} schema"
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        retain_months = options['retain_months']
+        if retain_months is not None and retain_months < 1:
+            raise CommandError('--retain-months must be at least 1')
+
+        expired = False
+        for alias in sharding.reading_databases():
+            if sharding.is_enabled():
+                self.stdout.write(f'{alias}:')
+            expired |= self._manage(connections[alias], now, options)
+
+        if expired and not options['dry_run']:
+            # Deleted, dropped or detached rows bypass the per-row counters
+            recount_readings()
+
+    def _manage(self, connection, now, options):
+        """Maintain one database's readings table. Returns whether any readings expired."""
+        retain_months = options['retain_months']
+        if not partitioning.is_partitioned(connection):
+            self.stdout.write(f'{connection.vendor}: table is not partitioned, using row-based expiry')
+            if retain_months is None:
+                return False
+            if options['expire'] == 'archive':
+                raise CommandError('Archiving expired readings requires a partitioned PostgreSQL table')
+            if options['dry_run']:
+                self.stdout.write(f'Would delete readings older than {retain_months} month(s)')
+                return False
+            deleted = partitioning.delete_expired_rows(now, retain_months, using=connection.alias)
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired reading(s)'))
+            return bool(deleted)
+
+        existing = set(partitioning.list_partitions(connection))
+        with transaction.atomic(using=connection.alias):
+            current = partitioning.month_start(now)
+            for i in range(options['months_ahead'] + 1):
+                month = partitioning.add_months(current, i)
+                name = partitioning.partition_name(month)
+                if name in existing:
+                    continue
+                if not options['dry_run']:
+                    partitioning.create_partition(connection, month)
+                self.stdout.write(f"{'Would create' if options['dry_run'] else 'Created'} partition {name}")
+
+            if retain_months is None:
+                return False
+
+            expired = partitioning.expired_partitions(connection, now, retain_months)
+            for name in expired:
+                if not options['dry_run']:
+                    if options['expire'] == 'drop':
+                        partitioning.drop_partition(connection, name)
+                    else:
+                        partitioning.archive_partition(connection, name)
+                verb = 'drop' if options['expire'] == 'drop' else 'archive'
+                if options['dry_run']:
+                    self.stdout.write(f'Would {verb} partition {name}')
+                else:
+                    self.stdout.write(f'{verb.capitalize()}d partition {name}')
+            return bool(expired)
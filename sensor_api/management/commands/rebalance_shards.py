@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sensor_api import sharding
+from sensor_api.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = (
+        'Move readings to the shard their vehicle hashes to, after SENSOR_SHARDING["SHARDS"] '
+        'changed. Drains RETIRED shards (into "default" once no SHARDS are left) and readings '
+        'left on "default" from before sharding. Safe to interrupt and re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would move')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not sharding.shard_databases():
+            raise CommandError('No shards configured (SENSOR_SHARDING["SHARDS"] and ["RETIRED"])')
+
+        misplaced = sorted(sharding.misplaced_readings())
+        names = dict(
+            Vehicle.objects.filter(pk__in={entry[0] for entry in misplaced}).values_list('pk', 'external_id')
+        )
+        moved = 0
+        for vehicle_pk, source, target, count in misplaced:
+            name = names.get(vehicle_pk, f'#{vehicle_pk}')
+            if options['dry_run']:
+                self.stdout.write(f'{name}: would move {count} reading(s) {source} -> {target}')
+                moved += count
+                continue
+            n = sharding.move_readings(vehicle_pk, source, target, batch_size=options['batch_size'])
+            self.stdout.write(f'{name}: moved {n} reading(s) {source} -> {target}')
+            moved += n
+
+        prefix = 'Would move' if options['dry_run'] else 'Moved'
+        vehicles = len({entry[0] for entry in misplaced})
+        self.stdout.write(self.style.SUCCESS(f'{prefix} {moved} reading(s) of {vehicles} vehicle(s)'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from sensor_api.fleet_summary import rebuild_windows
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute fleet summary windows from the readings table, replacing the stored '
+        'windows in the range. Needed after bulk loads (generate_telemetry --format db, '
+        'benchmark seeding) or rescoring. The range defaults to the stored readings, so '
+        'windows whose readings retention has removed are kept. Readings ingested by other '
+        'processes in the last FLUSH_SECONDS can be counted twice; run it with ingestion '
+        'stopped or end the range before the newest readings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='ISO-8601 start (default: the oldest reading)')
+        parser.add_argument('--until', help='ISO-8601 end (default: the newest reading)')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        bounds = []
+        for name in ('since', 'until'):
+            value = options[name]
+            parsed = parse_datetime(value) if value else None
+            if value and (parsed is None or parsed.tzinfo is None):
+                raise CommandError(f'--{name} must be an ISO-8601 datetime with a timezone')
+            bounds.append(parsed)
+
+        written = rebuild_windows(*bounds, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} window(s)'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sensor_api.models import Vehicle
+from sensor_api.trends import fit, rebuild_trend
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute per-vehicle health trends from stored readings. Needed after bulk '
+        'loads that bypass the post-save handler (generate_telemetry --format db, '
+        'benchmark seeding) or after changing SENSOR_HEALTH_TREND["HALF_LIFE_DAYS"].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicle', action='append', help='Only rebuild these vehicle ids (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        vehicles = Vehicle.objects.order_by('external_id').only('id', 'external_id')
+        if options['vehicle']:
+            vehicles = vehicles.filter(external_id__in=options['vehicle'])
+            missing = set(options['vehicle']) - {vehicle.external_id for vehicle in vehicles}
+            if missing:
+                raise CommandError(f"Unknown vehicle(s): {', '.join(sorted(missing))}")
+
+        rebuilt = 0
+        for vehicle in vehicles.iterator():
+            trend = rebuild_trend(vehicle, batch_size=options['batch_size'])
+            if trend is None:
+                continue
+            rebuilt += 1
+            model = fit(trend)
+            slope = f"{model['slope']:+.5f}/day" if model else 'not enough history'
+            self.stdout.write(f'{vehicle.external_id}: {trend.readings} reading(s), health slope {slope}')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} trend(s)'))
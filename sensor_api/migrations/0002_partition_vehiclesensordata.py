@@ -0,0 +1,87 @@
+"""
+Convert sensor_api_vehiclesensordata into a table partitioned by month on
+"timestamp" (PostgreSQL only; a no-op elsewhere).
+
+PostgreSQL requires the partition key in the primary key, so the table's primary
+key becomes (id, timestamp). The model keeps `id` as its primary key and ids still
+come from a single sequence, so nothing changes for the ORM.
+"""
+from django.db import migrations
+from django.utils import timezone
+
+from sensor_api import partitioning
+
+TABLE = partitioning.TABLE
+INDEX = 'sensor_api_vehicle_ts_idx'
+SEQUENCE = f'{TABLE}_part_id_seq'
+MONTHS_AHEAD = 3
+
+
+def partition_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if not partitioning.supports_partitioning(connection):
+        return
+
+    qn = schema_editor.quote_name
+    old = f'{TABLE}_unpartitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} RENAME TO {qn(old)}')
+        cursor.execute(f'ALTER TABLE {qn(old)} RENAME CONSTRAINT {qn(TABLE + "_pkey")} TO {qn(old + "_pkey")}')
+        cursor.execute(f'ALTER INDEX {qn(INDEX)} RENAME TO {qn(INDEX + "_unpartitioned")}')
+
+        cursor.execute(f'CREATE TABLE {qn(TABLE)} (LIKE {qn(old)}) PARTITION BY RANGE ("timestamp")')
+        # The sequence survives from a previous reverse migration if there was one
+        cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {qn(SEQUENCE)}')
+        cursor.execute(f'ALTER SEQUENCE {qn(SEQUENCE)} OWNED BY {qn(TABLE)}."id"')
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} ALTER COLUMN "id" SET DEFAULT nextval(%s)', [SEQUENCE])
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} ADD PRIMARY KEY ("id", "timestamp")')
+        cursor.execute(f'CREATE INDEX {qn(INDEX)} ON {qn(TABLE)} ("vehicle_id", "timestamp" DESC)')
+
+        cursor.execute(f'SELECT min("timestamp") FROM {qn(old)}')
+        first = cursor.fetchone()[0]
+
+    now = timezone.now()
+    month = partitioning.month_start(first or now)
+    last = partitioning.add_months(partitioning.month_start(now), MONTHS_AHEAD)
+    while month <= last:
+        partitioning.create_partition(connection, month)
+        month = partitioning.add_months(month, 1)
+    partitioning.create_default_partition(connection)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {qn(TABLE)} SELECT * FROM {qn(old)}')
+        cursor.execute(
+            f'SELECT setval(%s, COALESCE((SELECT max("id") FROM {qn(TABLE)}), 0) + 1, false)', [SEQUENCE]
+        )
+        cursor.execute(f'DROP TABLE {qn(old)}')
+
+
+def unpartition_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if not partitioning.is_partitioned(connection):
+        return
+
+    qn = schema_editor.quote_name
+    old = f'{TABLE}_partitioned'
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} RENAME TO {qn(old)}')
+        cursor.execute(f'ALTER TABLE {qn(old)} RENAME CONSTRAINT {qn(TABLE + "_pkey")} TO {qn(old + "_pkey")}')
+        cursor.execute(f'ALTER INDEX {qn(INDEX)} RENAME TO {qn(INDEX + "_partitioned")}')
+
+        cursor.execute(f'CREATE TABLE {qn(TABLE)} (LIKE {qn(old)} INCLUDING DEFAULTS)')
+        cursor.execute(f'ALTER SEQUENCE {qn(SEQUENCE)} OWNED BY {qn(TABLE)}."id"')
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} ADD PRIMARY KEY ("id")')
+        cursor.execute(f'CREATE INDEX {qn(INDEX)} ON {qn(TABLE)} ("vehicle_id", "timestamp" DESC)')
+        cursor.execute(f'INSERT INTO {qn(TABLE)} SELECT * FROM {qn(old)}')
+        cursor.execute(f'DROP TABLE {qn(old)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, unpartition_table),
+    ]
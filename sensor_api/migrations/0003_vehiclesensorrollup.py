@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0002_partition_vehiclesensordata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleSensorRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_id', models.CharField(max_length=50)),
+                ('bucket_start', models.DateTimeField()),
+                ('reading_count', models.PositiveIntegerField()),
+                ('faulty_count', models.PositiveIntegerField(default=0)),
+                ('avg_engine_rpm', models.FloatField()),
+                ('avg_lub_oil_pressure', models.FloatField()),
+                ('avg_fuel_pressure', models.FloatField()),
+                ('avg_coolant_pressure', models.FloatField()),
+                ('avg_lub_oil_temp', models.FloatField()),
+                ('avg_coolant_temp', models.FloatField()),
+                ('avg_prediction_score', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Vehicle Sensor Rollup',
+                'verbose_name_plural': 'Vehicle Sensor Rollups',
+                'ordering': ['-bucket_start'],
+                'indexes': [models.Index(fields=['vehicle_id', '-bucket_start'], name='sensor_api_rollup_vehicle_idx')],
+                'constraints': [models.UniqueConstraint(fields=('vehicle_id', 'bucket_start'), name='sensor_api_rollup_bucket_uniq')],
+            },
+        ),
+    ]
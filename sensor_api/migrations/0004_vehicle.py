@@ -0,0 +1,79 @@
+"""
+Introduce the Vehicle table and a nullable `vehicle` foreign key on readings and
+rollups. The old string column is kept as `vehicle_ref` until 0005 has filled in
+the foreign key, and 0006 drops it.
+"""
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sensor_api', '0003_vehiclesensorrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vehicle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('external_id', models.CharField(max_length=50, unique=True)),
+                ('model_year', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField(blank=True, null=True)),
+                ('latest_prediction_result', models.CharField(blank=True, max_length=1, null=True)),
+                ('latest_prediction_score', models.FloatField(blank=True, null=True)),
+                ('latest_reading', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='sensor_api.vehiclesensordata')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vehicles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['external_id'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='vehiclesensordata',
+            name='sensor_api_vehicle_ts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='vehiclesensorrollup',
+            name='sensor_api_rollup_vehicle_idx',
+        ),
+        migrations.RemoveConstraint(
+            model_name='vehiclesensorrollup',
+            name='sensor_api_rollup_bucket_uniq',
+        ),
+        migrations.RenameField(
+            model_name='vehiclesensordata',
+            old_name='vehicle_id',
+            new_name='vehicle_ref',
+        ),
+        migrations.RenameField(
+            model_name='vehiclesensorrollup',
+            old_name='vehicle_id',
+            new_name='vehicle_ref',
+        ),
+        # Nullable so that reversing 0006 can re-add the column to populated tables
+        migrations.AlterField(
+            model_name='vehiclesensordata',
+            name='vehicle_ref',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='vehiclesensorrollup',
+            name='vehicle_ref',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclesensordata',
+            name='vehicle',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='readings', to='sensor_api.vehicle'),
+        ),
+        migrations.AddField(
+            model_name='vehiclesensorrollup',
+            name='vehicle',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='rollups', to='sensor_api.vehicle'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+"""
+Create a Vehicle for every distinct vehicle_ref and point readings and rollups at
+it. Runs outside a single transaction: rows are updated in primary-key ranges of
+BATCH_SIZE, each committed on its own, so large tables are not locked (or held in
+one huge transaction) for the whole backfill. Safe to re-run after an interruption.
+Works on the database being migrated, so it is a no-op on an empty reading shard.
+"""
+from django.db import migrations, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+
+BATCH_SIZE = 10000
+
+
+def backfill(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Vehicle = apps.get_model('sensor_api', 'Vehicle')
+    for model_name in ('VehicleSensorData', 'VehicleSensorRollup'):
+        model = apps.get_model('sensor_api', model_name)
+        refs = model.objects.using(db).filter(vehicle__isnull=True).order_by().values_list('vehicle_ref', flat=True).distinct()
+        Vehicle.objects.using(db).bulk_create(
+            [Vehicle(external_id=ref) for ref in refs],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+
+        vehicle_pk = Subquery(Vehicle.objects.using(db).filter(external_id=OuterRef('vehicle_ref')).values('pk')[:1])
+        bounds = model.objects.using(db).filter(vehicle__isnull=True).aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            continue
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            with transaction.atomic(using=db):
+                model.objects.using(db).filter(
+                    pk__gte=start, pk__lt=start + BATCH_SIZE, vehicle__isnull=True
+                ).update(vehicle=vehicle_pk)
+
+
+def restore_refs(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Vehicle = apps.get_model('sensor_api', 'Vehicle')
+    external_id = Subquery(Vehicle.objects.using(db).filter(pk=OuterRef('vehicle_id')).values('external_id')[:1])
+    for model_name in ('VehicleSensorData', 'VehicleSensorRollup'):
+        model = apps.get_model('sensor_api', model_name)
+        bounds = model.objects.using(db).aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            continue
+        for start in range(bounds['low'], bounds['high'] + 1, BATCH_SIZE):
+            with transaction.atomic(using=db):
+                model.objects.using(db).filter(pk__gte=start, pk__lt=start + BATCH_SIZE).update(vehicle_ref=external_id)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('sensor_api', '0004_vehicle'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, restore_refs),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0005_backfill_vehicles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehiclesensordata',
+            name='vehicle',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='readings', to='sensor_api.vehicle'),
+        ),
+        migrations.AlterField(
+            model_name='vehiclesensorrollup',
+            name='vehicle',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='rollups', to='sensor_api.vehicle'),
+        ),
+        migrations.RemoveField(
+            model_name='vehiclesensordata',
+            name='vehicle_ref',
+        ),
+        migrations.RemoveField(
+            model_name='vehiclesensorrollup',
+            name='vehicle_ref',
+        ),
+        migrations.AddIndex(
+            model_name='vehiclesensordata',
+            index=models.Index(fields=['vehicle', '-timestamp'], name='sensor_api_vehicle_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclesensorrollup',
+            index=models.Index(fields=['vehicle', '-bucket_start'], name='sensor_api_rollup_vehicle_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='vehiclesensorrollup',
+            constraint=models.UniqueConstraint(fields=('vehicle', 'bucket_start'), name='sensor_api_rollup_bucket_uniq'),
+        ),
+    ]
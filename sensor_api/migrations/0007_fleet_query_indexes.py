@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0006_remove_vehicle_ref'),
+    ]
+
+    # The covering index is built before the plain one is dropped, so history reads
+    # always have an index to use
+    operations = [
+        migrations.AddIndex(
+            model_name='vehiclesensordata',
+            index=models.Index(fields=['vehicle', '-timestamp'], include=('id', 'engine_rpm', 'lub_oil_pressure', 'fuel_pressure', 'coolant_pressure', 'lub_oil_temp', 'coolant_temp', 'prediction_result', 'prediction_score'), name='sensor_api_vehicle_ts_cov_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclesensordata',
+            index=models.Index(condition=models.Q(('prediction_result', 'F')), fields=['-timestamp'], include=('vehicle', 'prediction_result', 'prediction_score'), name='sensor_api_faulty_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiclesensordata',
+            index=models.Index(condition=models.Q(('prediction_score__isnull', False)), fields=['-prediction_score', '-timestamp'], include=('vehicle', 'prediction_result'), name='sensor_api_score_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='vehiclesensordata',
+            name='sensor_api_vehicle_ts_idx',
+        ),
+    ]
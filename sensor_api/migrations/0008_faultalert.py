@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0007_fleet_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaultAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('threshold', 'Parameter outside its operating range'), ('anomaly', "Reading far from the vehicle's rolling average"), ('prediction', 'Model predicted a fault')], max_length=10)),
+                ('parameter', models.CharField(blank=True, max_length=32)),
+                ('severity', models.CharField(choices=[('warning', 'Warning'), ('critical', 'Critical')], max_length=8)),
+                ('message', models.CharField(max_length=255)),
+                ('value', models.FloatField(blank=True, null=True)),
+                ('occurrences', models.PositiveIntegerField(default=1)),
+                ('first_seen_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField()),
+                ('acknowledged_at', models.DateTimeField(blank=True, null=True)),
+                ('acknowledged_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='sensor_api.vehicle')),
+            ],
+            options={
+                'ordering': ['-last_seen_at'],
+                'indexes': [models.Index(condition=models.Q(('acknowledged_at__isnull', True)), fields=['-last_seen_at'], name='sensor_api_alert_open_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('acknowledged_at__isnull', True)), fields=('vehicle', 'kind', 'parameter'), name='sensor_api_alert_open_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:12
+
+from django.db import migrations, models
+from django.db.models import Count, DateTimeField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Now
+
+BATCH_SIZE = 1000
+
+
+def count_readings(apps, schema_editor):
+    """Fill the new counters from the readings table, BATCH_SIZE vehicles per UPDATE."""
+    db = schema_editor.connection.alias
+    Vehicle = apps.get_model('sensor_api', 'Vehicle')
+    VehicleSensorData = apps.get_model('sensor_api', 'VehicleSensorData')
+    counts = (
+        VehicleSensorData.objects.using(db).filter(vehicle=OuterRef('pk'))
+        .order_by().values('vehicle').annotate(n=Count('id')).values('n')
+    )
+    pks = list(Vehicle.objects.using(db).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pks), BATCH_SIZE):
+        Vehicle.objects.using(db).filter(pk__in=pks[start:start + BATCH_SIZE]).update(
+            reading_count=Coalesce(Subquery(counts), Value(0)),
+            readings_modified_at=Now(output_field=DateTimeField()),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0008_faultalert'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='reading_count',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='readings_modified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(count_readings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0009_vehicle_reading_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleHealthTrend',
+            fields=[
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='health_trend', serialize=False, to='sensor_api.vehicle')),
+                ('readings', models.BigIntegerField(default=0)),
+                ('weight', models.FloatField(default=0.0)),
+                ('weight_sq', models.FloatField(default=0.0)),
+                ('sum_t', models.FloatField(default=0.0)),
+                ('sum_h', models.FloatField(default=0.0)),
+                ('sum_tt', models.FloatField(default=0.0)),
+                ('sum_th', models.FloatField(default=0.0)),
+                ('sum_hh', models.FloatField(default=0.0)),
+                ('last_reading_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
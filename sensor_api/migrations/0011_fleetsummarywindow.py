@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0010_vehiclehealthtrend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetSummaryWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField(unique=True)),
+                ('reading_count', models.BigIntegerField(default=0)),
+                ('scored_count', models.BigIntegerField(default=0)),
+                ('faulty_count', models.BigIntegerField(default=0)),
+                ('vehicles', models.BinaryField()),
+                ('sketches', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-window_start'],
+            },
+        ),
+    ]
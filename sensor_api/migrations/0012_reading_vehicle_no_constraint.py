@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0011_fleetsummarywindow'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehiclesensordata',
+            name='vehicle',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='readings', to='sensor_api.vehicle'),
+        ),
+    ]
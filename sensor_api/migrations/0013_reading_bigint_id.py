@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0012_reading_vehicle_no_constraint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehiclesensordata',
+            name='id',
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:58
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# trends.EPOCH
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 1000
+
+
+def fill_last_t(apps, schema_editor):
+    """Set last_t from last_reading_at. The sums keep their per-reading decay until rebuild_health_trends."""
+    db = schema_editor.connection.alias
+    VehicleHealthTrend = apps.get_model('sensor_api', 'VehicleHealthTrend')
+    trends = VehicleHealthTrend.objects.using(db).filter(last_reading_at__isnull=False).only('last_reading_at')
+    batch = []
+    for trend in trends.iterator(chunk_size=BATCH_SIZE):
+        trend.last_t = (trend.last_reading_at - EPOCH).total_seconds() / 86400
+        batch.append(trend)
+        if len(batch) == BATCH_SIZE:
+            VehicleHealthTrend.objects.using(db).bulk_update(batch, ['last_t'])
+            batch = []
+    VehicleHealthTrend.objects.using(db).bulk_update(batch, ['last_t'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sensor_api', '0013_reading_bigint_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehiclehealthtrend',
+            name='last_t',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_last_t, migrations.RunPython.noop),
+    ]
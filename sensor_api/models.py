@@ -1,7 +1,70 @@
+from django.conf import settings
 from django.db import models
 from django.utils import timezone # Keep timezone if you use default=timezone.now
                                   # Not strictly needed if using auto_now_add=True
 
+class Vehicle(models.Model):
+    """
+    One row per vehicle. Readings reference it by integer key; the free-form
+    `external_id` is what devices and the API use to name the vehicle.
+    """
+    external_id = models.CharField(max_length=50, unique=True)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='vehicles',
+    )
+    model_year = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # --- Denormalized latest reading, maintained on insert (see signals.py) ---
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    # No database constraint: on PostgreSQL the readings table is partitioned and its
+    # primary key is (id, timestamp). Retention may delete the row this points to for
+    # a vehicle that stopped reporting; the latest_prediction_* copies stay valid.
+    latest_reading = models.ForeignKey(
+        'VehicleSensorData',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    latest_prediction_result = models.CharField(max_length=1, null=True, blank=True)
+    latest_prediction_score = models.FloatField(null=True, blank=True)
+    # HTTP cache validators for the vehicle's readings (see conditional.py): rows in
+    # the readings table, and when any of them last changed. Bulk paths that bypass
+    # the signals call vehicles.recount_readings() or touch_vehicles().
+    reading_count = models.BigIntegerField(default=0)
+    readings_modified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['external_id']
+
+    def __str__(self):
+        return self.external_id
+
+class ReadingQuerySet(models.QuerySet):
+
+    def create(self, **kwargs):
+        # Unless pinned with .using(), let the router see the new row, so it can pick
+        # the vehicle's shard (see sharding.py)
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def bulk_delete(self):
+        """
+        Delete the matching rows in one statement, without the per-row post_delete
+        signals that keep Vehicle.reading_count (see signals.py). For bulk paths that
+        adjust the counters themselves. Returns the number of rows deleted.
+        """
+        return self._raw_delete(self.db)
+
 class VehicleSensorData(models.Model):
     # Choices for the prediction result field - good practice
     PREDICTION_CHOICES = [
@@ -9,14 +72,19 @@ class VehicleSensorData(models.Model):
         ('F', 'Faulty'),
     ]
 
-    # Primary Key
-    id = models.AutoField(primary_key=True)
+    # Primary Key. 64-bit: with sharding each shard hands out ids from its own block
+    # (sharding.reserve_id_block)
+    id = models.BigAutoField(primary_key=True)
 
     # --- Core Identifiers ---
     # Django automatically adds an 'id' AutoField as primary key if not specified otherwise.
     # This is standard and usually what you want.
 
-    vehicle_id = models.CharField(max_length=50)
+    # Indexed through the composite (vehicle, -timestamp) index below. No database
+    # constraint: with sharding (sharding.py) readings and vehicles are in different databases.
+    vehicle = models.ForeignKey(
+        Vehicle, on_delete=models.PROTECT, related_name='readings', db_index=False, db_constraint=False
+    )
     timestamp = models.DateTimeField(auto_now_add=True)
 
     # --- Sensor Readings ---
@@ -37,20 +105,181 @@ class VehicleSensorData(models.Model):
     )
     prediction_score = models.FloatField(null=True, blank=True)
 
+    objects = ReadingQuerySet.as_manager()
+
     # --- Model Metadata ---
     class Meta:
         ordering = ['-timestamp']  # Default query order: most recent first. Good for history.
         indexes = [
-            # Composite index: Speeds up filtering by vehicle_id AND ordering by timestamp.
-            # Excellent for fetching specific vehicle history efficiently.
-            models.Index(fields=['vehicle_id', '-timestamp'], name='sensor_api_vehicle_ts_idx'),
+            # Composite index: Speeds up filtering by vehicle AND ordering by timestamp.
+            # It carries every other column (PostgreSQL INCLUDE), so history pages are
+            # answered by index-only scans without visiting the table.
+            models.Index(
+                fields=['vehicle', '-timestamp'],
+                name='sensor_api_vehicle_ts_cov_idx',
+                include=[
+                    'id', 'engine_rpm', 'lub_oil_pressure', 'fuel_pressure', 'coolant_pressure',
+                    'lub_oil_temp', 'coolant_temp', 'prediction_result', 'prediction_score',
+                ],
+            ),
+            # Partial index: only faulty readings, for "recent faults across the fleet".
+            # A small fraction of rows, so it stays small and hot.
+            models.Index(
+                fields=['-timestamp'],
+                name='sensor_api_faulty_ts_idx',
+                include=['vehicle', 'prediction_result', 'prediction_score'],
+                condition=models.Q(prediction_result='F'),
+            ),
+            # Readings ranked by prediction score, for "score above X" fleet queries
+            models.Index(
+                fields=['-prediction_score', '-timestamp'],
+                name='sensor_api_score_idx',
+                include=['vehicle', 'prediction_result'],
+                condition=models.Q(prediction_score__isnull=False),
+            ),
         ]
         verbose_name = "Vehicle Sensor Reading"
         verbose_name_plural = "Vehicle Sensor Readings"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The vehicle the row had when loaded, so saving can tell it was reassigned
+        instance._loaded_vehicle_id = instance.__dict__.get('vehicle_id')
+        return instance
+
     # --- String Representation ---
     def __str__(self):
         # Provides a readable representation in admin or debugging.
-        # Including prediction result might be useful too, checking if it exists.
-        prediction_str = self.get_prediction_result_display() if self.prediction_result else 'N/A'
-        return f'Vehicle {self.vehicle_id} @ {self.timestamp}'
\ No newline at end of file
+        return f'Vehicle {self.vehicle_id} @ {self.timestamp}'
+
+class VehicleSensorRollup(models.Model):
+    """
+    Downsampled sensor readings: per-vehicle averages over a fixed time bucket.
+    Raw readings past their retention age are folded into these rows (see retention.py).
+    """
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.PROTECT, related_name='rollups', db_index=False)
+    bucket_start = models.DateTimeField()
+    reading_count = models.PositiveIntegerField()
+    faulty_count = models.PositiveIntegerField(default=0)
+
+    avg_engine_rpm = models.FloatField()
+    avg_lub_oil_pressure = models.FloatField()
+    avg_fuel_pressure = models.FloatField()
+    avg_coolant_pressure = models.FloatField()
+    avg_lub_oil_temp = models.FloatField()
+    avg_coolant_temp = models.FloatField()
+    avg_prediction_score = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'bucket_start'], name='sensor_api_rollup_bucket_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['vehicle', '-bucket_start'], name='sensor_api_rollup_vehicle_idx'),
+        ]
+        verbose_name = "Vehicle Sensor Rollup"
+        verbose_name_plural = "Vehicle Sensor Rollups"
+
+    def __str__(self):
+        return f'Vehicle {self.vehicle_id} rollup @ {self.bucket_start}'
+
+class VehicleHealthTrend(models.Model):
+    """
+    Exponentially weighted least-squares statistics of health score against time
+    for one vehicle (see trends.py). Every stored reading updates the sums in place,
+    so a forecast never has to read the vehicle's history.
+    """
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.CASCADE, primary_key=True, related_name='health_trend')
+    readings = models.BigIntegerField(default=0)
+    # Decayed sums over readings; t is days since trends.EPOCH, h the health score
+    weight = models.FloatField(default=0.0)
+    weight_sq = models.FloatField(default=0.0)
+    sum_t = models.FloatField(default=0.0)
+    sum_h = models.FloatField(default=0.0)
+    sum_tt = models.FloatField(default=0.0)
+    sum_th = models.FloatField(default=0.0)
+    sum_hh = models.FloatField(default=0.0)
+    # t of the newest reading; updates decay the sums by the time elapsed since it
+    last_t = models.FloatField(null=True, blank=True)
+    last_reading_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Health trend for vehicle {self.vehicle_id}'
+
+class FleetSummaryWindow(models.Model):
+    """
+    Approximate fleet aggregates for one time window, maintained at write time
+    (see fleet_summary.py): exact counts, a HyperLogLog of vehicle ids and a
+    quantile sketch per sensor.
+    """
+    window_start = models.DateTimeField(unique=True)
+    reading_count = models.BigIntegerField(default=0)
+    scored_count = models.BigIntegerField(default=0)
+    faulty_count = models.BigIntegerField(default=0)
+    vehicles = models.BinaryField()
+    sketches = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-window_start']
+
+    def __str__(self):
+        return f'Fleet summary @ {self.window_start} ({self.reading_count} readings)'
+
+class FaultAlert(models.Model):
+    """
+    An alert raised by the streaming checks in alerts.py. Repeats of the same
+    (vehicle, kind, parameter) while an alert is open are folded into it
+    (occurrences / last_seen_at) instead of creating new rows.
+    """
+    KIND_CHOICES = [
+        ('threshold', 'Parameter outside its operating range'),
+        ('anomaly', 'Reading far from the vehicle\'s rolling average'),
+        ('prediction', 'Model predicted a fault'),
+    ]
+    SEVERITY_CHOICES = [
+        ('warning', 'Warning'),
+        ('critical', 'Critical'),
+    ]
+
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='alerts')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    parameter = models.CharField(max_length=32, blank=True)
+    severity = models.CharField(max_length=8, choices=SEVERITY_CHOICES)
+    message = models.CharField(max_length=255)
+    value = models.FloatField(null=True, blank=True)
+    occurrences = models.PositiveIntegerField(default=1)
+    first_seen_at = models.DateTimeField()
+    last_seen_at = models.DateTimeField()
+    acknowledged_at = models.DateTimeField(null=True, blank=True)
+    acknowledged_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+
+    class Meta:
+        ordering = ['-last_seen_at']
+        constraints = [
+            # At most one open alert per key; this is what deduplication relies on
+            models.UniqueConstraint(
+                fields=['vehicle', 'kind', 'parameter'],
+                condition=models.Q(acknowledged_at__isnull=True),
+                name='sensor_api_alert_open_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['-last_seen_at'],
+                name='sensor_api_alert_open_idx',
+                condition=models.Q(acknowledged_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.get_severity_display()} {self.kind} alert for vehicle {self.vehicle_id}: {self.message}'
@@ -0,0 +1,172 @@
+"""
+Monthly range partitioning of the VehicleSensorData table.
+
+On PostgreSQL the table is declaratively partitioned by month on "timestamp"
+(see migration 0002). Creating the next months' partitions and dropping or
+archiving expired ones are metadata-only operations, so retention costs O(1)
+regardless of table size, and time-bounded queries only scan the partitions
+they overlap. Other databases (SQLite in development) keep a single table; there
+expiry falls back to deleting rows.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+
+TABLE = 'sensor_api_vehiclesensordata'
+DEFAULT_PARTITION = f'{TABLE}_pdefault'
+ARCHIVE_SCHEMA = 'sensor_archive'
+PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def supports_partitioning(connection):
+    return connection.vendor == 'postgresql'
+
+
+def month_start(value):
+    """First instant (UTC) of the month containing `value`."""
+    if value.tzinfo is not None:
+        value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + (month.month - 1) + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month.year:04d}{month.month:02d}'
+
+
+def partition_month(name):
+    """Month covered by a partition table name, or None for non-monthly partitions."""
+    match = PARTITION_RE.match(name)
+    if not match:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+
+
+def is_partitioned(connection, table=TABLE):
+    if not supports_partitioning(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT 1 FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+            """,
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(connection, table=TABLE):
+    """Names of the partitions currently attached to `table`."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)
+            ORDER BY child.relname
+            """,
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_partition(connection, month, table=TABLE):
+    """
+    Create the partition for `month` if it does not exist. Returns its name.
+    Rows of that month already in the default partition would make PostgreSQL
+    refuse to create it, so they are moved into the new partition before it is
+    attached.
+    """
+    qn = connection.ops.quote_name
+    name = partition_name(month)
+    bounds = [month, add_months(month, 1)]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s), to_regclass(%s)', [name, DEFAULT_PARTITION])
+        exists, default_exists = cursor.fetchone()
+        if exists:
+            return name
+        stranded = False
+        if default_exists:
+            cursor.execute(
+                f'SELECT 1 FROM {qn(DEFAULT_PARTITION)} WHERE "timestamp" >= %s AND "timestamp" < %s LIMIT 1',
+                bounds,
+            )
+            stranded = cursor.fetchone() is not None
+        if not stranded:
+            cursor.execute(
+                f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} FOR VALUES FROM (%s) TO (%s)", bounds
+            )
+            return name
+
+        cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {qn(DEFAULT_PARTITION)} WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO {qn(name)} SELECT * FROM moved',
+            bounds,
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)", bounds)
+    return name
+
+
+def create_default_partition(connection, table=TABLE):
+    """Catch-all partition so inserts outside the created months never fail."""
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {qn(DEFAULT_PARTITION)} PARTITION OF {qn(table)} DEFAULT")
+
+
+def ensure_partitions(connection, now, months_ahead=3, table=TABLE):
+    """Create partitions from the current month through `months_ahead` months ahead."""
+    current = month_start(now)
+    return [create_partition(connection, add_months(current, i), table) for i in range(months_ahead + 1)]
+
+
+def create_partitions_between(connection, start, end, table=TABLE):
+    """Create a partition for every month from `start` through `end`, e.g. before a bulk load."""
+    first, last = month_start(start), month_start(end)
+    count = (last.year - first.year) * 12 + last.month - first.month
+    return [create_partition(connection, add_months(first, i), table) for i in range(count + 1)]
+
+
+def expired_partitions(connection, now, retain_months, table=TABLE):
+    """Monthly partitions that end before the retention window starts."""
+    cutoff = add_months(month_start(now), -retain_months)
+    expired = []
+    for name in list_partitions(connection, table):
+        month = partition_month(name)
+        if month is not None and add_months(month, 1) <= cutoff:
+            expired.append(name)
+    return expired
+
+
+def drop_partition(connection, name, table=TABLE):
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+        cursor.execute(f"DROP TABLE {qn(name)}")
+
+
+def archive_partition(connection, name, table=TABLE, schema=ARCHIVE_SCHEMA):
+    """Detach a partition and move it to the archive schema, out of every hot-path query."""
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {qn(schema)}")
+        cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+        cursor.execute(f"ALTER TABLE {qn(name)} SET SCHEMA {qn(schema)}")
+
+
+def delete_expired_rows(now, retain_months, using=None):
+    """Fallback expiry for unpartitioned databases. Returns the number of rows deleted."""
+    from .models import VehicleSensorData
+
+    cutoff = add_months(month_start(now), -retain_months)
+    # The caller recounts the vehicles' readings afterwards
+    return VehicleSensorData.objects.using(using).filter(timestamp__lt=cutoff).bulk_delete()
@@ -0,0 +1,74 @@
+"""
+Reading queries used by the history and fleet endpoints. Each one is shaped to
+match an index on VehicleSensorData (see Meta.indexes) and selects only columns
+that index carries, so PostgreSQL can answer it with an index-only scan:
+
+    recent_faulty_readings   sensor_api_faulty_ts_idx (partial, faulty rows only)
+    high_score_readings      sensor_api_score_idx
+    vehicle_history          sensor_api_vehicle_ts_cov_idx (covering)
+
+benchmark_indexes runs these same querysets, so its plans match production.
+With sharding (sharding.py) the fleet queries run on every shard and are merged;
+shards have no vehicle rows to join, so vehicle ids are looked up once per page.
+"""
+from django.db.models import prefetch_related_objects
+
+from . import sharding
+from .models import Vehicle, VehicleSensorData
+
+FLEET_FIELDS = ['vehicle__external_id', 'timestamp', 'prediction_result', 'prediction_score']
+SHARDED_FLEET_FIELDS = ['vehicle_id', 'timestamp', 'prediction_result', 'prediction_score']
+
+
+def _bounded(queryset, since=None, until=None):
+    if since:
+        queryset = queryset.filter(timestamp__gte=since)
+    if until:
+        queryset = queryset.filter(timestamp__lt=until)
+    return queryset
+
+
+def with_vehicle_ids(rows):
+    """Fill in vehicle__external_id on fleet rows read from shards (one catalog query)."""
+    if rows:
+        external_ids = dict(
+            Vehicle.objects.filter(pk__in={row['vehicle_id'] for row in rows}).values_list('pk', 'external_id')
+        )
+        for row in rows:
+            row['vehicle__external_id'] = external_ids.get(row['vehicle_id'])
+    return rows
+
+
+def with_vehicles(readings):
+    """Attach their vehicles to readings read from shards (one catalog query)."""
+    prefetch_related_objects(readings, 'vehicle')
+    return readings
+
+
+def _fleet_rows(queryset):
+    if not sharding.is_enabled():
+        return queryset.values(*FLEET_FIELDS)
+    return sharding.MergedReadings(queryset.values(*SHARDED_FLEET_FIELDS), prepare=with_vehicle_ids)
+
+
+def recent_faulty_readings(since=None, until=None):
+    """Faulty readings across the fleet, newest first."""
+    queryset = VehicleSensorData.objects.filter(prediction_result='F').order_by('-timestamp')
+    return _fleet_rows(_bounded(queryset, since, until))
+
+
+def high_score_readings(min_score, since=None, until=None):
+    """Readings with prediction_score >= min_score, highest score (then newest) first."""
+    queryset = VehicleSensorData.objects.filter(
+        prediction_score__isnull=False, prediction_score__gte=min_score
+    ).order_by('-prediction_score', '-timestamp')
+    return _fleet_rows(_bounded(queryset, since, until))
+
+
+def vehicle_history(vehicle, since=None, until=None):
+    """
+    One vehicle's readings, newest first. Going through vehicle.readings routes the
+    query to the vehicle's shard and attaches `vehicle` to every row without a join.
+    """
+    queryset = vehicle.readings.order_by('-timestamp')
+    return _bounded(queryset, since, until)
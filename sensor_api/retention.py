@@ -0,0 +1,233 @@
+"""
+Age-based retention for sensor readings.
+
+Policy (SENSOR_RETENTION):
+    RAW_DAYS     raw readings older than this are downsampled into hourly
+                 VehicleSensorRollup rows, exported to the archive and deleted.
+    ROLLUP_DAYS  rollups older than this are exported to the archive and deleted.
+
+Work is done one vehicle and one month at a time, so memory stays bounded by the
+size of a single vehicle-month. With sharding, raw readings are compacted shard by
+shard; rollups live on 'default'. Readings that arrive late, for an hour that was
+compacted already, are merged into that hour's rollup (summed counts,
+count-weighted means), in the database or in the archive. Archived data stays
+readable through archive.with_archive(), which history and rollup endpoints use.
+"""
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.db.models.functions import TruncHour, TruncMonth
+
+from . import archive, sharding
+from .models import Vehicle, VehicleSensorData, VehicleSensorRollup
+from .vehicles import touch_vehicles
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FIELDS = [
+    'reading_count', 'faulty_count',
+    'avg_engine_rpm', 'avg_lub_oil_pressure', 'avg_fuel_pressure',
+    'avg_coolant_pressure', 'avg_lub_oil_temp', 'avg_coolant_temp',
+    'avg_prediction_score',
+]
+AVERAGE_FIELDS = [field for field in ROLLUP_FIELDS if field.startswith('avg_')]
+RAW_FIELDS = ['timestamp'] + archive.SENSOR_FIELDS + ['prediction_result', 'prediction_score']
+
+
+def get_policy():
+    policy = {'RAW_DAYS': None, 'ROLLUP_DAYS': None}
+    policy.update(getattr(settings, 'SENSOR_RETENTION', {}))
+    return policy
+
+
+def _hour_floor(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _vehicle_months(queryset, time_field):
+    """Distinct (vehicle pk, vehicle external id, month start) triples present in `queryset`."""
+    months = list(
+        queryset.annotate(month=TruncMonth(time_field))
+        .values_list('vehicle_id', 'month')
+        .distinct()
+        .order_by('vehicle_id', 'month')
+    )
+    # Looked up on the catalog: a reading shard has no vehicle rows to join
+    external_ids = dict(
+        Vehicle.objects.filter(pk__in={vehicle_pk for vehicle_pk, _ in months}).values_list('pk', 'external_id')
+    )
+    return [(vehicle_pk, external_ids.get(vehicle_pk), month) for vehicle_pk, month in months]
+
+
+def rollup_readings(readings):
+    """Aggregate a readings queryset into hourly VehicleSensorRollup rows (not saved)."""
+    buckets = (
+        readings.annotate(bucket=TruncHour('timestamp'))
+        .values('vehicle_id', 'bucket')
+        .order_by()
+        .annotate(
+            reading_count=Count('id'),
+            faulty_count=Count('id', filter=Q(prediction_result='F')),
+            avg_engine_rpm=Avg('engine_rpm'),
+            avg_lub_oil_pressure=Avg('lub_oil_pressure'),
+            avg_fuel_pressure=Avg('fuel_pressure'),
+            avg_coolant_pressure=Avg('coolant_pressure'),
+            avg_lub_oil_temp=Avg('lub_oil_temp'),
+            avg_coolant_temp=Avg('coolant_temp'),
+            avg_prediction_score=Avg('prediction_score'),
+        )
+    )
+    return [
+        VehicleSensorRollup(
+            vehicle_id=b['vehicle_id'],
+            bucket_start=b['bucket'],
+            **{field: b[field] for field in ROLLUP_FIELDS},
+        )
+        for b in buckets
+    ]
+
+
+def merge_rollup_values(current, late):
+    """
+    Values of one hourly bucket holding both `current` and `late` (dicts of
+    ROLLUP_FIELDS): summed counts and count-weighted means. A missing mean takes
+    the other side's.
+    """
+    total = current['reading_count'] + late['reading_count']
+    merged = {
+        'reading_count': total,
+        'faulty_count': current['faulty_count'] + late['faulty_count'],
+    }
+    for field in AVERAGE_FIELDS:
+        a, b = current[field], late[field]
+        if a is None or b is None:
+            merged[field] = a if b is None else b
+        else:
+            merged[field] = (a * current['reading_count'] + b * late['reading_count']) / total
+    return merged
+
+
+def save_rollups(rollups):
+    """Store new hourly rollups, merging them into the rows of buckets that exist already."""
+    if not rollups:
+        return
+    existing = {
+        (rollup.vehicle_id, rollup.bucket_start): rollup
+        for rollup in VehicleSensorRollup.objects.select_for_update().filter(
+            vehicle_id__in={rollup.vehicle_id for rollup in rollups},
+            bucket_start__in=[rollup.bucket_start for rollup in rollups],
+        )
+    }
+    created, merged = [], []
+    for rollup in rollups:
+        current = existing.get((rollup.vehicle_id, rollup.bucket_start))
+        if current is None:
+            created.append(rollup)
+            continue
+        values = merge_rollup_values(
+            {field: getattr(current, field) for field in ROLLUP_FIELDS},
+            {field: getattr(rollup, field) for field in ROLLUP_FIELDS},
+        )
+        for field, value in values.items():
+            setattr(current, field, value)
+        merged.append(current)
+    VehicleSensorRollup.objects.bulk_update(merged, ROLLUP_FIELDS)
+    VehicleSensorRollup.objects.bulk_create(created)
+
+
+def compact_raw_readings(cutoff, dry_run=False):
+    """Downsample, archive and delete raw readings older than `cutoff`. Returns rows processed."""
+    return sum(_compact_raw_readings(alias, cutoff, dry_run) for alias in sharding.reading_databases())
+
+
+def _compact_raw_readings(alias, cutoff, dry_run):
+    expired = VehicleSensorData.objects.using(alias).filter(timestamp__lt=cutoff)
+    processed = 0
+    for vehicle_pk, vehicle_id, month in _vehicle_months(expired, 'timestamp'):
+        month_end = archive_month_end(month)
+        readings = expired.filter(vehicle_id=vehicle_pk, timestamp__gte=month, timestamp__lt=month_end)
+        rows = list(readings.order_by('timestamp').values(*RAW_FIELDS))
+        if not rows:
+            continue
+        processed += len(rows)
+        if dry_run:
+            continue
+
+        rollups = rollup_readings(readings)
+        # Archive first: if anything below fails, rows are still in the DB and the
+        # next run re-archives them (segments de-duplicate on timestamp).
+        archive.write_segment('raw', vehicle_id, archive.month_key(month), archive.rows_to_columns('raw', rows))
+        with transaction.atomic(using=alias), transaction.atomic():
+            save_rollups(rollups)
+            readings.bulk_delete()
+            touch_vehicles([vehicle_pk], removed=len(rows))
+        logger.info(f"Compacted {len(rows)} readings for vehicle {vehicle_id} ({archive.month_key(month)})")
+    return processed
+
+
+def archive_rollups(cutoff, dry_run=False):
+    """Archive and delete rollups older than `cutoff`. Returns rows processed."""
+    expired = VehicleSensorRollup.objects.filter(bucket_start__lt=cutoff)
+    processed = 0
+    for vehicle_pk, vehicle_id, month in _vehicle_months(expired, 'bucket_start'):
+        rollups = expired.filter(
+            vehicle_id=vehicle_pk, bucket_start__gte=month, bucket_start__lt=archive_month_end(month)
+        )
+        rows = list(rollups.order_by('bucket_start').values('bucket_start', *ROLLUP_FIELDS))
+        if not rows:
+            continue
+        processed += len(rows)
+        if dry_run:
+            continue
+
+        key = archive.month_key(month)
+        rows = _merge_archived_rollups(vehicle_id, key, rows)
+        # Delete first and archive before committing: merged buckets are not
+        # idempotent, so a failed write must leave the rows in the database
+        with transaction.atomic():
+            rollups.delete()
+            archive.write_segment('rollup', vehicle_id, key, archive.rows_to_columns('rollup', rows))
+        logger.info(f"Archived {len(rows)} rollups for vehicle {vehicle_id} ({archive.month_key(month)})")
+    return processed
+
+
+def _merge_archived_rollups(vehicle_id, month, rows):
+    """Fold buckets that are archived already (late readings) into `rows`."""
+    segment = archive.read_segment('rollup', vehicle_id, month)
+    if not segment:
+        return rows
+    archived = {int(micros): i for i, micros in enumerate(segment['bucket_start'])}
+    for row in rows:
+        i = archived.get(archive.to_micros(row['bucket_start']))
+        if i is None:
+            continue
+        current = {}
+        for field in ROLLUP_FIELDS:
+            value = segment[field][i].item()
+            current[field] = None if isinstance(value, float) and np.isnan(value) else value
+        row.update(merge_rollup_values(current, row))
+    return rows
+
+
+def archive_month_end(month):
+    return (month.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def apply_retention(now, dry_run=False):
+    """Run every configured retention step. Returns a summary dict of rows processed."""
+    policy = get_policy()
+    summary = {'raw_compacted': 0, 'rollups_archived': 0}
+
+    if policy['RAW_DAYS'] is not None:
+        cutoff = _hour_floor(now - timedelta(days=policy['RAW_DAYS']))
+        summary['raw_compacted'] = compact_raw_readings(cutoff, dry_run)
+
+    if policy['ROLLUP_DAYS'] is not None:
+        cutoff = _hour_floor(now - timedelta(days=policy['ROLLUP_DAYS']))
+        summary['rollups_archived'] = archive_rollups(cutoff, dry_run)
+
+    return summary
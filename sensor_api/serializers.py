@@ -1,7 +1,31 @@
 from rest_framework import serializers
-from .models import VehicleSensorData
+from .models import FaultAlert, Vehicle, VehicleSensorData, VehicleSensorRollup
+from .vehicles import get_vehicle
+
+class VehicleIdField(serializers.Field):
+    """
+    Exposes a `vehicle` foreign key as the vehicle's string id. Writes register
+    vehicles on first sight, so devices keep posting the id they always used.
+    An existing row keeps its vehicle: updates may only repeat the current id.
+    """
+
+    def to_representation(self, vehicle):
+        return vehicle.external_id
+
+    def to_internal_value(self, data):
+        if not isinstance(data, (str, int)) or not str(data).strip():
+            raise serializers.ValidationError('A vehicle id is required.')
+        if len(str(data)) > Vehicle._meta.get_field('external_id').max_length:
+            raise serializers.ValidationError('Vehicle id is too long.')
+        instance = getattr(self.parent, 'instance', None)
+        if instance is not None:
+            if str(data) != instance.vehicle.external_id:
+                raise serializers.ValidationError('A reading cannot be moved to another vehicle.')
+            return instance.vehicle
+        return get_vehicle(data, create=True)
 
 class VehicleSensorDataSerializer(serializers.ModelSerializer):
+    vehicle_id = VehicleIdField(source='vehicle')
     prediction_result_display = serializers.CharField(source='get_prediction_result_display', read_only=True)
     
     class Meta:
@@ -19,4 +43,52 @@ class VehicleSensorDataSerializer(serializers.ModelSerializer):
             'prediction_result_display',
             'prediction_score',
         ]
-        read_only_fields = ['timestamp', 'prediction_result', 'prediction_result_display', 'prediction_score']
\ No newline at end of file
+        read_only_fields = ['timestamp', 'prediction_result', 'prediction_result_display', 'prediction_score']
+
+class VehicleSensorRollupSerializer(serializers.ModelSerializer):
+    vehicle_id = VehicleIdField(source='vehicle', read_only=True)
+
+    class Meta:
+        model = VehicleSensorRollup
+        fields = [
+            'vehicle_id',
+            'bucket_start',
+            'reading_count',
+            'faulty_count',
+            'avg_engine_rpm',
+            'avg_lub_oil_pressure',
+            'avg_fuel_pressure',
+            'avg_coolant_pressure',
+            'avg_lub_oil_temp',
+            'avg_coolant_temp',
+            'avg_prediction_score',
+        ]
+
+class FleetReadingSerializer(serializers.Serializer):
+    """Slim reading row for fleet-wide listings (rows are value dicts, see queries.py)."""
+    vehicle_id = serializers.CharField(source='vehicle__external_id')
+    timestamp = serializers.DateTimeField()
+    prediction_result = serializers.CharField(allow_null=True)
+    prediction_score = serializers.FloatField(allow_null=True)
+
+class FaultAlertSerializer(serializers.ModelSerializer):
+    vehicle_id = VehicleIdField(source='vehicle', read_only=True)
+    acknowledged_by = serializers.CharField(source='acknowledged_by.username', read_only=True, default=None)
+
+    class Meta:
+        model = FaultAlert
+        fields = [
+            'id',
+            'vehicle_id',
+            'kind',
+            'parameter',
+            'severity',
+            'message',
+            'value',
+            'occurrences',
+            'first_seen_at',
+            'last_seen_at',
+            'acknowledged_at',
+            'acknowledged_by',
+        ]
+        read_only_fields = fields
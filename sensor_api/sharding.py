@@ -0,0 +1,366 @@
+"""
+Hash sharding of sensor readings across several databases.
+
+SENSOR_SHARDING['SHARDS'] lists the database aliases that hold VehicleSensorData
+rows. All of a vehicle's readings live on one shard, chosen by rendezvous
+(highest random weight) hashing of the vehicle's primary key, the readings'
+vehicle_id: every shard scores blake2b(alias:vehicle_id) and the highest score
+wins. Adding a shard therefore only moves the vehicles that now score highest on
+it (about 1/N of them), and removing one only moves that shard's vehicles.
+`manage.py rebalance_shards` moves them; until it has, their older readings are
+missing from reads.
+
+Everything else (vehicles, rollups, alerts, trends, summaries, users) stays on
+'default'. Shards are migrated with the full schema (manage.py migrate
+--database=<alias>) so migrations apply unchanged, but only their readings
+tables are used. Readings reference their vehicle without a database constraint.
+Reading ids come from each shard's own sequence; migrate moves that sequence into
+a block of 2**40 ids picked by hashing the alias (reserve_id_block), so ids stay
+unique across shards. Ids below the first block are those of readings stored
+before sharding. Readings keep their ids when rebalance_shards moves them, so a
+shard may also hold ids from other blocks.
+
+ShardRouter sends reading inserts and saves to the vehicle's shard, so
+VehicleSensorData.objects.create() and serializers need no .using(), and
+vehicle.readings reads from the vehicle's shard. Fleet-wide reads go through
+scatter() (one task per shard on per-shard thread pools) or MergedReadings, a
+paginator-compatible merge of an ordered queryset across shards.
+
+With no SHARDS configured (the default) every reading stays on 'default' and the
+router steps aside. RETIRED aliases are still connected but no longer routed to,
+so rebalance_shards can drain them. Rescoring covers every database that may hold
+readings (ml_models/rescoring.py); the index benchmarks do not support sharding yet.
+"""
+import csv
+import hashlib
+import heapq
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Vehicle, VehicleSensorData
+
+ID_BLOCK_BITS = 40
+
+
+def get_sharding_settings():
+    options = {
+        'SHARDS': [],
+        'RETIRED': [],
+        'WORKERS_PER_SHARD': 4,
+    }
+    options.update(getattr(settings, 'SENSOR_SHARDING', {}))
+    return options
+
+
+def is_enabled():
+    return bool(get_sharding_settings()['SHARDS'])
+
+
+def reading_databases():
+    """Aliases that reads of the whole fleet have to cover."""
+    return list(get_sharding_settings()['SHARDS']) or [DEFAULT_DB_ALIAS]
+
+
+def source_databases():
+    """Every alias that may hold readings: shards, retired shards and 'default'."""
+    aliases = [*shard_databases(), DEFAULT_DB_ALIAS]
+    return [alias for i, alias in enumerate(aliases) if alias not in aliases[:i]]
+
+
+def shard_databases():
+    """Shards and retired shards: the aliases with their own block of reading ids."""
+    options = get_sharding_settings()
+    return [*options['SHARDS'], *options['RETIRED']]
+
+
+def _score(alias, key):
+    digest = hashlib.blake2b(f'{alias}:{key}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+@lru_cache(maxsize=65536)
+def _home(vehicle_pk, shards):
+    return max(shards, key=lambda alias: _score(alias, vehicle_pk))
+
+
+def shard_for(vehicle_pk):
+    """Alias of the database that holds the readings of vehicle `vehicle_pk`."""
+    shards = tuple(get_sharding_settings()['SHARDS'])
+    if not shards:
+        return DEFAULT_DB_ALIAS
+    return _home(int(vehicle_pk), shards)
+
+
+def id_block_start(alias):
+    """First reading id of `alias`'s block. Block 0 is left to pre-sharding readings."""
+    blocks = 2 ** (63 - ID_BLOCK_BITS)
+    return (1 + _score(alias, 'ids') % (blocks - 1)) << ID_BLOCK_BITS
+
+
+def reserve_id_block(alias):
+    """Move `alias`'s reading id sequence to the start of its block, if it is below it."""
+    connection = connections[alias]
+    table = VehicleSensorData._meta.db_table
+    start = id_block_start(alias)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+            sequence = cursor.fetchone()[0]
+            cursor.execute(f'SELECT last_value FROM {sequence}')
+            if cursor.fetchone()[0] < start:
+                cursor.execute('SELECT setval(%s, %s, false)', [sequence, start])
+        elif connection.vendor == 'sqlite':
+            # AUTOINCREMENT keeps the last id handed out in sqlite_sequence
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start - 1])
+            elif row[0] < start - 1:
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [start - 1, table])
+        else:
+            raise NotImplementedError(f'Reading id blocks are not supported on {connection.vendor}')
+
+
+class ShardRouter:
+    """Route readings by vehicle; keep every other model on the catalog ('default')."""
+
+    def _reading_db(self, hints):
+        instance = hints.get('instance')
+        if isinstance(instance, VehicleSensorData):
+            # A loaded row stays where it is, even if its vehicle has moved since
+            if instance._state.db:
+                return instance._state.db
+            return shard_for(instance.vehicle_id) if instance.vehicle_id is not None else None
+        if isinstance(instance, Vehicle) and instance.pk is not None:
+            return shard_for(instance.pk)
+        return None
+
+    def _catalog_db(self, hints):
+        # Related lookups from a reading (reading.vehicle) would default to its shard
+        instance = hints.get('instance')
+        if isinstance(instance, VehicleSensorData) and instance._state.db not in (None, DEFAULT_DB_ALIAS):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_read(self, model, **hints):
+        if not is_enabled():
+            return None
+        if model is VehicleSensorData:
+            return self._reading_db(hints)
+        return self._catalog_db(hints)
+
+    def db_for_write(self, model, **hints):
+        return self.db_for_read(model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Readings point at vehicles in the catalog database
+        if isinstance(obj1, VehicleSensorData) or isinstance(obj2, VehicleSensorData):
+            return True
+        return None
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(alias):
+    with _executors_lock:
+        executor = _executors.get(alias)
+        if executor is None:
+            executor = _executors[alias] = ThreadPoolExecutor(
+                max_workers=get_sharding_settings()['WORKERS_PER_SHARD'], thread_name_prefix=f'shard-{alias}'
+            )
+        return executor
+
+
+def _run_on(alias, fn, wrappers):
+    # Pool threads keep their own connections; expire them like a request would
+    close_old_connections()
+    connection = connections[alias]
+    with ExitStack() as stack:
+        for wrapper in wrappers:
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        return fn(alias)
+
+
+def scatter(fn, aliases=None):
+    """
+    Call fn(alias) for every reading database in parallel and return the results
+    in alias order. The caller's execute wrappers (query budgets, metrics) see the
+    queries run on the pool threads too.
+    """
+    aliases = list(aliases or reading_databases())
+    if len(aliases) == 1:
+        return [fn(aliases[0])]
+    futures = [
+        _executor(alias).submit(_run_on, alias, fn, list(connections[alias].execute_wrappers))
+        for alias in aliases
+    ]
+    return [future.result() for future in futures]
+
+
+def gather(queryset):
+    """All rows of `queryset` from every reading database."""
+    return [row for rows in scatter(lambda alias: list(queryset.using(alias))) for row in rows]
+
+
+def merged_iterator(queryset, key, chunk_size=2000):
+    """
+    Rows of `queryset`, which must be ordered by `key`, streamed from every
+    reading database and merged in that order.
+    """
+    if not is_enabled():
+        return queryset.iterator(chunk_size=chunk_size)
+    return heapq.merge(
+        *(queryset.using(alias).iterator(chunk_size=chunk_size) for alias in reading_databases()), key=key
+    )
+
+
+class MergedReadings:
+    """
+    Paginator-compatible sequence over an ordered readings queryset run on every
+    shard. count() adds up the shards' counts; a slice [start:stop] takes the
+    first `stop` rows of each shard and merges them, so deep pages cost `stop`
+    rows per shard. `prepare(rows)` runs on every slice, e.g. to attach vehicles.
+    The ordering must be all ascending or all descending.
+    """
+
+    def __init__(self, queryset, prepare=None):
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) != 1:
+            raise ValueError('MergedReadings needs an ordering in a single direction')
+        self.queryset = queryset
+        self.prepare = prepare
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.reverse = descending.pop()
+        self._counts = None
+
+    def _key(self, row):
+        if isinstance(row, dict):
+            return tuple(row[field] for field in self.fields)
+        return tuple(getattr(row, field) for field in self.fields)
+
+    def counts(self):
+        if self._counts is None:
+            aliases = reading_databases()
+            self._counts = dict(zip(aliases, scatter(lambda alias: self.queryset.using(alias).count(), aliases)))
+        return self._counts
+
+    def count(self):
+        return sum(self.counts().values())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            items = self[index:index + 1]
+            if not items:
+                raise IndexError(index)
+            return items[0]
+
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        if stop <= start:
+            return []
+        # Shards known to be empty are skipped
+        aliases = [alias for alias, n in self.counts().items() if n] if self._counts is not None else None
+        if aliases == []:
+            return []
+        pages = scatter(lambda alias: list(self.queryset.using(alias)[:stop]), aliases)
+        rows = list(islice(heapq.merge(*pages, key=self._key, reverse=self.reverse), start, stop))
+        return self.prepare(rows) if self.prepare else rows
+
+
+def insert_rows(alias, columns, rows):
+    """
+    Insert raw reading rows (tuples in `columns` order) into one database: COPY
+    on PostgreSQL, executemany elsewhere. Bypasses the ORM, so no signals run and
+    timestamps are stored as given.
+    """
+    connection = connections[alias]
+    table = connection.ops.quote_name(VehicleSensorData._meta.db_table)
+    column_list = ', '.join(connection.ops.quote_name(c) for c in columns)
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            sql = f'COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)'
+            if hasattr(cursor.cursor, 'copy_expert'):
+                # psycopg2
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+            else:
+                # psycopg 3 (DB_POOL)
+                with cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+        else:
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})', rows)
+
+
+def misplaced_readings():
+    """(vehicle pk, source alias, target alias, readings) for every vehicle on the wrong database."""
+    def collect(alias):
+        counts = VehicleSensorData.objects.using(alias).order_by().values_list('vehicle_id').annotate(n=Count('id'))
+        return [(vehicle_pk, alias, shard_for(vehicle_pk), n) for vehicle_pk, n in counts]
+
+    return [
+        entry
+        for entries in scatter(collect, source_databases())
+        for entry in entries
+        if entry[1] != entry[2]
+    ]
+
+
+def move_readings(vehicle_pk, source, target, batch_size=5000):
+    """
+    Move a vehicle's readings from `source` to `target` in batches, oldest first.
+    Readings keep their ids, which are unique across shards. Each batch commits on
+    `target` before it is deleted from `source`; a batch interrupted in between is
+    copied again by the next run, replacing the first copy (matched on id).
+    Returns the number of readings moved.
+
+    On SQLite, AUTOINCREMENT continues after the highest id in the table, so a
+    shard that receives readings from a higher id block hands out ids from that
+    block afterwards. PostgreSQL sequences are unaffected by explicit ids.
+    """
+    fields = VehicleSensorData._meta.concrete_fields
+    columns = [field.column for field in fields]
+    target_connection = connections[target]
+    moved = 0
+    while True:
+        batch = list(
+            VehicleSensorData.objects.using(source).filter(vehicle_id=vehicle_pk).order_by('timestamp', 'id')[:batch_size]
+        )
+        if not batch:
+            break
+        ids = [row.pk for row in batch]
+        with transaction.atomic(using=source), transaction.atomic(using=target):
+            VehicleSensorData.objects.using(target).filter(vehicle_id=vehicle_pk, pk__in=ids).bulk_delete()
+            insert_rows(target, columns, [
+                tuple(field.get_db_prep_save(getattr(row, field.attname), target_connection) for field in fields)
+                for row in batch
+            ])
+            VehicleSensorData.objects.using(source).filter(pk__in=ids).bulk_delete()
+        moved += len(batch)
+
+    if moved:
+        # Re-derive the latest pointer on the new shard; the new modification time
+        # invalidates cached pages
+        latest = (
+            VehicleSensorData.objects.using(target).filter(vehicle_id=vehicle_pk)
+            .order_by('-timestamp').values_list('pk', flat=True).first()
+        )
+        Vehicle.objects.filter(pk=vehicle_pk).update(latest_reading=latest, readings_modified_at=timezone.now())
+    return moved
@@ -0,0 +1,132 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import alerts, columnar, fleet_summary, sharding, trends
+from .models import Vehicle, VehicleHealthTrend, VehicleSensorData
+from .vehicles import vehicle_cache
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=VehicleSensorData)
+def update_latest_reading(sender, instance, created, **kwargs):
+    """
+    Keep the denormalized reading state on Vehicle current in a single UPDATE:
+    count and modification time always, the latest reading only if this one is newer.
+    """
+    vehicle = Vehicle.objects.filter(pk=instance.vehicle_id)
+    if not created:
+        previous = getattr(instance, '_loaded_vehicle_id', None)
+        if previous is not None and previous != instance.vehicle_id:
+            # Moved to another vehicle: it leaves the old one's count and joins the new one's
+            Vehicle.objects.filter(pk=previous).update(
+                reading_count=F('reading_count') - 1, readings_modified_at=timezone.now()
+            )
+            vehicle.update(reading_count=F('reading_count') + 1, readings_modified_at=timezone.now())
+            instance._loaded_vehicle_id = instance.vehicle_id
+        else:
+            vehicle.update(readings_modified_at=timezone.now())
+        return
+    instance._loaded_vehicle_id = instance.vehicle_id
+
+    newer = Q(last_seen_at__isnull=True) | Q(last_seen_at__lte=instance.timestamp)
+
+    def latest(field, value):
+        return Case(When(newer, then=Value(value)), default=F(field), output_field=Vehicle._meta.get_field(field))
+
+    vehicle.update(
+        reading_count=F('reading_count') + 1,
+        readings_modified_at=timezone.now(),
+        last_seen_at=latest('last_seen_at', instance.timestamp),
+        latest_reading=latest('latest_reading', instance.pk),
+        latest_prediction_result=latest('latest_prediction_result', instance.prediction_result),
+        latest_prediction_score=latest('latest_prediction_score', instance.prediction_score),
+    )
+
+
+@receiver(post_delete, sender=VehicleSensorData)
+def count_deleted_reading(sender, instance, **kwargs):
+    """
+    Take a deleted reading out of its vehicle's count. Bulk deletes use
+    ReadingQuerySet.bulk_delete() and adjust the counts themselves.
+    """
+    Vehicle.objects.filter(pk=instance.vehicle_id).update(
+        reading_count=F('reading_count') - 1, readings_modified_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=VehicleSensorData)
+def update_health_trend(sender, instance, created, **kwargs):
+    """Fold the new reading into the vehicle's degradation trend (one UPDATE)."""
+    if created:
+        trends.record_reading(instance)
+
+
+@receiver(post_save, sender=VehicleSensorData)
+def append_to_columnar_store(sender, instance, created, **kwargs):
+    """
+    Mirror new readings into the columnar store once the insert has committed.
+    The store is append-only, so an update marks the vehicle's columns stale instead.
+    """
+    if not columnar.is_enabled():
+        return
+
+    def append():
+        external_id = instance.vehicle.external_id
+        try:
+            if created:
+                columnar.append_readings(external_id, [instance])
+            else:
+                columnar.invalidate_vehicles([external_id])
+        except Exception as e:
+            # The database stays the source of truth; build_columnar_store repairs gaps
+            logger.error(f"Columnar store update failed for vehicle {external_id}: {str(e)}")
+
+    transaction.on_commit(append)
+
+
+@receiver(post_save, sender=VehicleSensorData)
+def check_for_alerts(sender, instance, created, **kwargs):
+    """Run the streaming fault checks once the reading is committed."""
+    if not created:
+        return
+
+    def check():
+        try:
+            alerts.check_reading(instance)
+        except Exception as e:
+            # Alerting must never fail ingestion
+            logger.error(f"Alert check failed for reading {instance.pk}: {str(e)}")
+
+    transaction.on_commit(check)
+
+
+@receiver(post_save, sender=VehicleSensorData)
+def add_to_fleet_summary(sender, instance, created, **kwargs):
+    """Count the reading in this process's fleet summary once it is committed (no query)."""
+    if created:
+        transaction.on_commit(lambda: fleet_summary.observe(instance))
+
+
+@receiver(post_save, sender=Vehicle)
+def create_health_trend(sender, instance, created, raw=False, **kwargs):
+    """Start an empty trend with the vehicle, so recording readings is always an UPDATE."""
+    if created and not raw:
+        VehicleHealthTrend.objects.create(vehicle=instance)
+
+
+@receiver(post_delete, sender=Vehicle)
+def forget_vehicle(sender, instance, **kwargs):
+    vehicle_cache.invalidate(instance.external_id)
+
+
+@receiver(post_migrate)
+def reserve_shard_reading_ids(sender, using, **kwargs):
+    """Keep reading ids unique across shards: each shard allocates from its own block."""
+    if sender.name == 'sensor_api' and using in sharding.shard_databases():
+        sharding.reserve_id_block(using)
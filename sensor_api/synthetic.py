@@ -0,0 +1,231 @@
+"""
+Deterministic synthetic fleet telemetry for load and soak tests.
+
+FleetGenerator simulates `vehicles` engines reporting every `interval` seconds.
+Each vehicle has its own operating point and a slow AR(1) drift. On top of that
+comes correlated sensor noise, calibrated on the healthy rows of
+engine_dataset.csv (per-sensor mean, standard deviation and correlation). Fault
+episodes start at random and ramp one of FAULT_PATTERNS up over their duration.
+Scores follow the engine model's convention (above HEALTHY_SCORE is healthy) and
+fall as the fault ramps up; readings are labelled 'F' from the same threshold.
+
+All randomness comes from one numpy Generator seeded by `seed`. Every step draws
+the same amount of it, so the output depends only on the seed and the parameters,
+not on how it is batched. Work is vectorized across vehicles, so a step costs a
+few numpy calls whatever the fleet size.
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+
+from . import partitioning, sharding
+from .archive import SENSOR_FIELDS
+from .models import Vehicle
+from .vehicles import recount_readings, refresh_last_seen
+
+DEFAULT_DATASET_PATH = Path(settings.BASE_DIR) / 'ml_models' / 'datasets' / 'engine_dataset.csv'
+DATASET_COLUMNS = 6          # the six sensors, in SENSOR_FIELDS order
+HEALTHY_CONDITION = 1        # 'Engine Condition' value the engine model reports as Healthy
+HEALTHY_SCORE = 0.5          # scores above this are Healthy, as in predict.engine_condition
+
+# Per pattern: offset per sensor at full severity, in healthy standard deviations
+FAULT_PATTERNS = {
+    'oil_pressure_loss': {'lub_oil_pressure': -2.5, 'lub_oil_temp': 3.0},
+    'overheating': {'coolant_temp': 4.0, 'coolant_pressure': 2.0},
+    'fuel_starvation': {'fuel_pressure': -2.0, 'engine_rpm': -2.0},
+}
+PATTERN_NAMES = list(FAULT_PATTERNS)
+PATTERN_OFFSETS = np.array([
+    [FAULT_PATTERNS[name].get(field, 0.0) for field in SENSOR_FIELDS] for name in PATTERN_NAMES
+])
+
+OUTPUT_FIELDS = ['vehicle_id', 'timestamp'] + SENSOR_FIELDS + ['prediction_result', 'prediction_score', 'fault_pattern']
+
+
+@lru_cache(maxsize=4)
+def calibrate(path=None):
+    """Per-sensor mean, std, correlation and plausible range from the healthy dataset rows."""
+    data = np.loadtxt(path or DEFAULT_DATASET_PATH, delimiter=',', skiprows=1)
+    healthy = data[data[:, DATASET_COLUMNS] == HEALTHY_CONDITION][:, :DATASET_COLUMNS]
+    return {
+        'mean': healthy.mean(axis=0),
+        'std': healthy.std(axis=0),
+        'corr': np.corrcoef(healthy, rowvar=False),
+        'low': np.percentile(healthy, 0.5, axis=0),
+        'high': np.percentile(healthy, 99.5, axis=0),
+    }
+
+
+class FleetGenerator:
+
+    def __init__(self, vehicles, start, interval=60, seed=42, fault_rate=0.0005,
+                 fault_duration=120, vehicle_prefix='sim-', calibration=None):
+        """
+        vehicles        number of simulated vehicles
+        start           aware datetime of the first step
+        interval        seconds between a vehicle's readings
+        fault_rate      chance per vehicle per step that a fault episode starts
+        fault_duration  mean episode length in steps
+        """
+        self.vehicles = vehicles
+        self.start = start
+        self.interval = interval
+        self.fault_rate = fault_rate
+        self.fault_duration = fault_duration
+        self.vehicle_ids = np.array([f'{vehicle_prefix}{i:05d}' for i in range(vehicles)], dtype=object)
+
+        cal = calibration or calibrate()
+        self.mean, self.std, self.low, self.high = cal['mean'], cal['std'], cal['low'], cal['high']
+        self.noise_factor = np.linalg.cholesky(cal['corr'] + 1e-9 * np.eye(DATASET_COLUMNS))
+
+        self.rng = np.random.default_rng(seed)
+        # Fixed per-vehicle traits: operating point (in std units) and report phase
+        self.offset = self.rng.normal(0, 0.4, (vehicles, DATASET_COLUMNS))
+        self.phase = self.rng.uniform(0, interval, vehicles)
+        self.drift = np.zeros((vehicles, DATASET_COLUMNS))
+        self.fault_pattern = np.full(vehicles, -1)
+        self.fault_length = np.zeros(vehicles, dtype=np.int64)
+        self.fault_elapsed = np.zeros(vehicles, dtype=np.int64)
+        self.step_index = 0
+
+    def step(self):
+        """Advance one interval; returns column arrays with one row per vehicle."""
+        rng, n = self.rng, self.vehicles
+
+        # Slow drift around the vehicle's operating point (AR(1), stationary std 0.3)
+        phi = 0.98
+        self.drift = phi * self.drift + np.sqrt(1 - phi ** 2) * 0.3 * rng.standard_normal((n, DATASET_COLUMNS))
+        noise = rng.standard_normal((n, DATASET_COLUMNS)) @ self.noise_factor.T * 0.5
+
+        # Fault episodes: start, ramp up, end
+        starts = (self.fault_pattern < 0) & (rng.random(n) < self.fault_rate)
+        new_patterns = rng.integers(0, len(PATTERN_NAMES), n)
+        new_lengths = rng.geometric(1 / self.fault_duration, n)
+        self.fault_pattern = np.where(starts, new_patterns, self.fault_pattern)
+        self.fault_length = np.where(starts, new_lengths, self.fault_length)
+        self.fault_elapsed = np.where(starts, 0, self.fault_elapsed + 1)
+
+        active = self.fault_pattern >= 0
+        severity = np.where(active, np.minimum(1.0, (self.fault_elapsed + 1) / np.maximum(self.fault_length, 1)), 0.0)
+        fault_offset = PATTERN_OFFSETS[np.maximum(self.fault_pattern, 0)] * severity[:, None]
+
+        standardized = np.clip(self.offset + self.drift + noise, -3, 3)
+        values = self.mean + self.std * standardized
+        values = np.clip(values, self.low, self.high) + self.std * fault_offset
+        values = np.maximum(values, 0.0)
+
+        score = np.clip(0.85 - 0.8 * severity + rng.normal(0, 0.05, n), 0.0, 1.0)
+        faulty = score <= HEALTHY_SCORE
+        pattern_names = np.array(PATTERN_NAMES + [''], dtype=object)[np.where(active, self.fault_pattern, -1)]
+
+        offsets = (self.step_index * self.interval + self.phase) * 1e6
+        timestamps = np.datetime64(self.start.replace(tzinfo=None), 'us') + offsets.astype('timedelta64[us]')
+
+        columns = {'vehicle_id': self.vehicle_ids, 'timestamp': timestamps}
+        for i, field in enumerate(SENSOR_FIELDS):
+            columns[field] = values[:, i]
+        columns['prediction_result'] = np.where(faulty, 'F', 'H').astype(object)
+        columns['prediction_score'] = score
+        columns['fault_pattern'] = pattern_names
+
+        # Episodes end after their length
+        ended = active & (self.fault_elapsed + 1 >= self.fault_length)
+        self.fault_pattern = np.where(ended, -1, self.fault_pattern)
+        self.step_index += 1
+        return columns
+
+    def batches(self, steps, batch_steps=100):
+        """Yield `steps` steps as column batches of up to `batch_steps` steps each, in time order."""
+        done = 0
+        while done < steps:
+            count = min(batch_steps, steps - done)
+            parts = [self.step() for _ in range(count)]
+            batch = {name: np.concatenate([part[name] for part in parts]) for name in OUTPUT_FIELDS}
+            # Within a step vehicles report at their own phase; keep rows in time order
+            order = np.argsort(batch['timestamp'], kind='stable')
+            yield {name: values[order] for name, values in batch.items()}
+            done += count
+
+    def end_time(self, steps):
+        return self.start + timedelta(seconds=steps * self.interval)
+
+
+def _rows(batch):
+    timestamps = np.datetime_as_string(batch['timestamp'], unit='us')
+    for i in range(len(timestamps)):
+        row = {name: batch[name][i] for name in OUTPUT_FIELDS}
+        row['timestamp'] = timestamps[i] + 'Z'
+        for field in SENSOR_FIELDS + ['prediction_score']:
+            row[field] = round(float(row[field]), 4)
+        yield row
+
+
+def write_ndjson(batches, stream):
+    """Write one JSON object per reading. Returns rows written."""
+    written = 0
+    for batch in batches:
+        stream.write(''.join(json.dumps(row) + '\n' for row in _rows(batch)))
+        written += len(batch['timestamp'])
+    return written
+
+
+def write_csv(batches, stream):
+    """Write readings as CSV with a header row. Returns rows written."""
+    writer = csv.DictWriter(stream, fieldnames=OUTPUT_FIELDS)
+    writer.writeheader()
+    written = 0
+    for batch in batches:
+        writer.writerows(_rows(batch))
+        written += len(batch['timestamp'])
+    return written
+
+
+DB_COLUMNS = ['vehicle_id', 'timestamp'] + SENSOR_FIELDS + ['prediction_result', 'prediction_score']
+
+
+def insert_readings(batches, start=None, end=None):
+    """
+    Bulk-load readings into VehicleSensorData, registering vehicles as needed.
+    Uses COPY on PostgreSQL and executemany elsewhere, writing each vehicle's rows
+    to its shard. Post-save handlers (alerts, columnar mirror, latest reading) are
+    bypassed; Vehicle.last_seen_at and reading_count are set once at the end.
+    `start`/`end` bound the data so monthly partitions can be created up front.
+    Returns rows inserted.
+    """
+    if start is not None and end is not None:
+        for alias in sharding.reading_databases():
+            if partitioning.is_partitioned(connections[alias]):
+                partitioning.create_partitions_between(connections[alias], start, end)
+
+    vehicle_pks = {}
+    inserted = 0
+
+    for batch in batches:
+        missing = [vid for vid in np.unique(batch['vehicle_id']) if vid not in vehicle_pks]
+        if missing:
+            Vehicle.objects.bulk_create([Vehicle(external_id=vid) for vid in missing], ignore_conflicts=True)
+            vehicle_pks.update(Vehicle.objects.filter(external_id__in=missing).values_list('external_id', 'pk'))
+
+        pks = np.array([vehicle_pks[vid] for vid in batch['vehicle_id']])
+        timestamps = np.datetime_as_string(batch['timestamp'], unit='us')
+        rows_by_shard = defaultdict(list)
+        for i in range(len(pks)):
+            rows_by_shard[sharding.shard_for(pks[i])].append(
+                (int(pks[i]), timestamps[i] + '+00:00', *(float(batch[field][i]) for field in SENSOR_FIELDS),
+                 batch['prediction_result'][i], float(batch['prediction_score'][i]))
+            )
+        for alias, rows in rows_by_shard.items():
+            sharding.insert_rows(alias, DB_COLUMNS, rows)
+            inserted += len(rows)
+
+    if vehicle_pks:
+        refresh_last_seen(vehicle_pks.values())
+        recount_readings(vehicle_pks.values())
+    return inserted
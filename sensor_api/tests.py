@@ -1,3 +1,635 @@
-from django.test import TestCase
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.backends import device_key_cache, user_status_cache
+from monitoring.query_budget import record_queries
+from monitoring.testing import QueryBudgetTestMixin
+from sensor_api import archive, columnar, fleet_summary, partitioning, retention, sharding, synthetic, trends
+from sensor_api.analysis import calculate_remaining_kilometers
+from sensor_api.models import (
+    FaultAlert, FleetSummaryWindow, Vehicle, VehicleHealthTrend, VehicleSensorData, VehicleSensorRollup,
+)
+from sensor_api.vehicles import vehicle_cache
+
+READING = {
+    'engine_rpm': 800.0,
+    'lub_oil_pressure': 3.5,
+    'fuel_pressure': 6.0,
+    'coolant_pressure': 2.5,
+    'lub_oil_temp': 78.0,
+    'coolant_temp': 75.0,
+}
+
+
+def create_readings(vehicle, count, faulty_every=3):
+    """`count` readings for `vehicle` through the ORM (so the signals keep its counters)."""
+    readings = []
+    for i in range(count):
+        faulty = i % faulty_every == 0
+        readings.append(VehicleSensorData.objects.create(
+            vehicle=vehicle,
+            prediction_result='F' if faulty else 'H',
+            prediction_score=0.2 if faulty else 0.8,
+            **READING,
+        ))
+    return readings
+
+
+class SensorApiTestCase(QueryBudgetTestMixin, APITestCase):
+    """Two vehicles with readings, and a client authenticated as a regular user."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('fleet', password='unused-password')
+        cls.vehicle = Vehicle.objects.create(external_id='veh-1', owner=cls.user)
+        cls.other_vehicle = Vehicle.objects.create(external_id='veh-2')
+        cls.readings = create_readings(cls.vehicle, 15)
+        cls.other_readings = create_readings(cls.other_vehicle, 5)
+
+    def setUp(self):
+        # Start every test cold, so the budgets cover cache misses too
+        vehicle_cache.clear()
+        user_status_cache.clear()
+        device_key_cache.clear()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+class ReadingQueryBudgetTests(SensorApiTestCase):
+
+    def test_list_within_budget(self):
+        with self.assertWithinQueryBudget('vehicle-sensor-list'):
+            response = self.client.get(reverse('vehicle-sensor-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 20)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_create_within_budget(self):
+        with self.assertWithinQueryBudget('vehicle-sensor-list'):
+            response = self.client.post(
+                reverse('vehicle-sensor-list'), {'vehicle_id': 'veh-1', **READING}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.reading_count, 16)
+
+    def test_detail_within_budget(self):
+        reading = self.readings[0]
+        with self.assertWithinQueryBudget('vehicle-sensor-detail'):
+            response = self.client.get(reverse('vehicle-sensor-detail', args=[reading.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['vehicle_id'], 'veh-1')
+
+    def test_history_within_budget(self):
+        url = reverse('prediction-history', args=['veh-1'])
+        with self.assertWithinQueryBudget('prediction-history'):
+            response = self.client.get(url, {'page_size': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 15)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_history_not_modified_within_budget(self):
+        url = reverse('prediction-history', args=['veh-1'])
+        etag = self.client.get(url)['ETag']
+        vehicle_cache.clear()
+        user_status_cache.clear()
+        with self.assertWithinQueryBudget('prediction-history'):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_history_of_unknown_vehicle_is_empty(self):
+        with self.assertWithinQueryBudget('prediction-history'):
+            response = self.client.get(reverse('prediction-history', args=['no-such-vehicle']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 0)
+
+    def test_rollup_history_within_budget(self):
+        with self.assertWithinQueryBudget('rollup-history'):
+            response = self.client.get(reverse('rollup-history', args=['veh-1']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_latest_within_budget(self):
+        with self.assertWithinQueryBudget('latest-sensor-data'):
+            response = self.client.get(reverse('latest-sensor-data', args=['veh-1']))
+        self.assertEqual(response.status_code, 200)
+
+
+class ReadingValidatorTests(SensorApiTestCase):
+
+    def counts(self):
+        return dict(Vehicle.objects.values_list('external_id', 'reading_count'))
+
+    def test_counts_follow_deletes(self):
+        with self.assertWithinQueryBudget('vehicle-sensor-detail'):
+            response = self.client.delete(reverse('vehicle-sensor-detail', args=[self.readings[0].pk]))
+        self.assertEqual(response.status_code, 204)
+        VehicleSensorData.objects.get(pk=self.readings[1].pk).delete()
+        self.assertEqual(self.counts(), {'veh-1': 13, 'veh-2': 5})
+
+    def test_counts_follow_reassignment(self):
+        reading = VehicleSensorData.objects.get(pk=self.readings[0].pk)
+        reading.vehicle = self.other_vehicle
+        reading.save()
+        self.assertEqual(self.counts(), {'veh-1': 14, 'veh-2': 6})
+        reading.delete()
+        self.assertEqual(self.counts(), {'veh-1': 14, 'veh-2': 5})
+
+    def test_bulk_delete_leaves_counts_to_the_caller(self):
+        deleted = VehicleSensorData.objects.filter(vehicle=self.other_vehicle).bulk_delete()
+        self.assertEqual(deleted, 5)
+        self.assertEqual(self.counts()['veh-2'], 5)
+
+    def test_etag_differs_per_page(self):
+        url = reverse('prediction-history', args=['veh-1'])
+        first = self.client.get(url, {'page_size': 5})
+        second = self.client.get(url, {'page_size': 5, 'page': 2}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        again = self.client.get(url, {'page_size': 5}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_etag_changes_after_delete(self):
+        url = reverse('prediction-history', args=['veh-1'])
+        etag = self.client.get(url)['ETag']
+        self.client.delete(reverse('vehicle-sensor-detail', args=[self.readings[0].pk]))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 14)
+
+
+class FleetQueryBudgetTests(SensorApiTestCase):
+
+    def test_faulty_readings_within_budget(self):
+        with self.assertWithinQueryBudget('fleet-faulty-readings'):
+            response = self.client.get(reverse('fleet-faulty-readings'))
+        self.assertEqual(response.status_code, 200)
+        # Every third reading of each vehicle: 5 of 15 and 2 of 5
+        self.assertEqual(response.data['count'], 7)
+
+    def test_high_score_readings_within_budget(self):
+        with self.assertWithinQueryBudget('fleet-high-score-readings'):
+            response = self.client.get(reverse('fleet-high-score-readings'), {'min_score': 0.5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 13)
+
+    def test_high_score_requires_min_score(self):
+        response = self.client.get(reverse('fleet-high-score-readings'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_summary_within_budget(self):
+        with self.assertWithinQueryBudget('fleet-summary'):
+            response = self.client.get(reverse('fleet-summary'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_exact_summary_within_budget(self):
+        with self.assertWithinQueryBudget('fleet-summary'):
+            response = self.client.get(reverse('fleet-summary'), {'exact': 'true'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_alerts_within_budget(self):
+        with self.assertWithinQueryBudget('fault-alerts'):
+            response = self.client.get(reverse('fault-alerts'))
+        self.assertEqual(response.status_code, 200)
+
+
+
+class FleetSummaryTests(TestCase):
+    hour = datetime(2025, 1, 15, 10, tzinfo=dt_timezone.utc)
+    quantiles = [0.0, 0.5, 1.0]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(external_id='veh-1')
+        cls.other_vehicle = Vehicle.objects.create(external_id='veh-2')
+
+    def add_reading(self, vehicle, timestamp, engine_rpm, result='H'):
+        reading = VehicleSensorData.objects.create(
+            vehicle=vehicle, prediction_result=result, prediction_score=0.2 if result == 'F' else 0.8,
+            **{**READING, 'engine_rpm': engine_rpm},
+        )
+        VehicleSensorData.objects.filter(pk=reading.pk).update(timestamp=timestamp)
+
+    def add_two_hours(self):
+        self.add_reading(self.vehicle, self.hour + timedelta(minutes=5), 100.0)
+        self.add_reading(self.vehicle, self.hour + timedelta(minutes=20), 300.0, 'F')
+        self.add_reading(self.other_vehicle, self.hour + timedelta(minutes=40), 500.0)
+        # The newest reading starts its window
+        self.add_reading(self.vehicle, self.hour + timedelta(minutes=30, hours=1), 200.0)
+        self.add_reading(self.other_vehicle, self.hour + timedelta(hours=2), 400.0)
+
+    def aggregate(self, *readings):
+        aggregate = fleet_summary.WindowAggregate(fleet_summary.get_fleet_summary_settings())
+        for vehicle_id, engine_rpm, result in readings:
+            aggregate.add(vehicle_id, [engine_rpm, *list(READING.values())[1:]], result)
+        return aggregate
+
+    def test_rebuilt_windows_summarize_like_a_scan(self):
+        self.add_two_hours()
+        self.assertEqual(fleet_summary.rebuild_windows(), 3)
+
+        since, until = self.hour + timedelta(minutes=10), self.hour + timedelta(hours=2, minutes=1)
+        approximate = fleet_summary.summarize(since, until, self.quantiles)
+        exact = fleet_summary.summarize_exact(since, until, self.quantiles)
+        self.assertEqual((approximate['since'], approximate['until']), (self.hour, self.hour + timedelta(hours=3)))
+        self.assertEqual(approximate['windows'], 3)
+        for name in ('since', 'until', 'readings', 'distinct_vehicles', 'scored_readings', 'faulty_readings',
+                     'faulty_share', 'sensors'):
+            self.assertEqual(approximate[name], exact[name], name)
+        self.assertEqual(exact['readings'], 5)
+        self.assertEqual(exact['sensors']['engine_rpm'], {'p0': 100.0, 'p50': 300.0, 'p100': 500.0})
+
+    def test_merge_into_window_adds_to_the_stored_window(self):
+        options = fleet_summary.get_fleet_summary_settings()
+        fleet_summary.merge_into_window(self.hour, self.aggregate((1, 100.0, 'H'), (1, 300.0, 'F')), options)
+        fleet_summary.merge_into_window(self.hour, self.aggregate((2, 200.0, None)), options)
+
+        row = FleetSummaryWindow.objects.get()
+        self.assertEqual((row.reading_count, row.scored_count, row.faulty_count), (3, 2, 1))
+        summary = fleet_summary.summarize(self.hour, self.hour + timedelta(hours=1), self.quantiles)
+        self.assertEqual(summary['distinct_vehicles'], 2)
+        self.assertEqual(summary['faulty_share'], 0.5)
+        self.assertEqual(summary['sensors']['engine_rpm'], {'p0': 100.0, 'p50': 200.0, 'p100': 300.0})
+
+    def test_rebuild_replaces_only_the_windows_of_the_readings(self):
+        options = fleet_summary.get_fleet_summary_settings()
+        retained = self.hour - timedelta(days=60)
+        fleet_summary.merge_into_window(retained, self.aggregate((1, 100.0, 'H')), options)
+        # Counted once at write time already, then bulk loaded on top
+        fleet_summary.merge_into_window(self.hour, self.aggregate((1, 100.0, 'H')), options)
+        self.add_two_hours()
+
+        out = StringIO()
+        call_command('rebuild_fleet_summary', stdout=out)
+        self.assertIn('Rebuilt 3 window(s)', out.getvalue())
+        counts = dict(FleetSummaryWindow.objects.values_list('window_start', 'reading_count'))
+        self.assertEqual(counts, {
+            retained: 1,
+            self.hour: 3,
+            self.hour + timedelta(hours=1): 1,
+            self.hour + timedelta(hours=2): 1,
+        })
+
+        fleet_summary.rebuild_windows(since=self.hour + timedelta(hours=1), until=self.hour + timedelta(hours=1))
+        self.assertEqual(FleetSummaryWindow.objects.count(), 4)
+
+    def test_rebuild_without_readings_keeps_the_windows(self):
+        options = fleet_summary.get_fleet_summary_settings()
+        fleet_summary.merge_into_window(self.hour, self.aggregate((1, 100.0, 'H')), options)
+        self.assertEqual(fleet_summary.rebuild_windows(), 0)
+        self.assertEqual(FleetSummaryWindow.objects.get().reading_count, 1)
+
+
+
+class HealthTrendTests(TestCase):
+    start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+    sums = ['weight', 'weight_sq', 'sum_t', 'sum_h', 'sum_tt', 'sum_th', 'sum_hh', 'last_t']
+
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(external_id='veh-1')
+
+    def reading(self, days, engine_rpm=800.0):
+        return VehicleSensorData(
+            vehicle=self.vehicle, timestamp=self.start + timedelta(days=days), **{**READING, 'engine_rpm': engine_rpm}
+        )
+
+    def record(self, *readings):
+        for reading in readings:
+            trends.record_reading(reading)
+        return VehicleHealthTrend.objects.get(vehicle=self.vehicle)
+
+    def assertSameSums(self, trend, other):
+        for name in self.sums:
+            self.assertAlmostEqual(getattr(trend, name), getattr(other, name), places=6, msg=name)
+        self.assertEqual(trend.last_reading_at, other.last_reading_at)
+
+    def declining(self, count=40):
+        # Two readings a day with the rpm falling out of range: health drops linearly
+        return [self.reading(i / 2, 550.0 - 12.5 * i) for i in range(count)]
+
+    def test_sums_decay_with_elapsed_time_not_reading_count(self):
+        trend = self.record(self.reading(0), *[self.reading(30) for _ in range(10)])
+        self.assertEqual(trend.readings, 11)
+        self.assertAlmostEqual(trend.weight, 10.5)
+        self.assertAlmostEqual(trend.weight_sq, 10.25)
+        self.assertEqual(trend.last_reading_at, self.start + timedelta(days=30))
+
+    def test_late_readings_count_by_their_own_timestamp(self):
+        readings = self.declining()
+        in_order = self.record(*readings)
+        VehicleHealthTrend.objects.filter(vehicle=self.vehicle).delete()
+        shuffled = self.record(*readings[1::2], *readings[::2])
+        self.assertSameSums(shuffled, in_order)
+
+    def test_rebuild_matches_the_recorded_sums(self):
+        readings = self.declining()
+        recorded = self.record(*readings)
+        for reading in readings:
+            timestamp = reading.timestamp
+            reading.save()
+            VehicleSensorData.objects.filter(pk=reading.pk).update(timestamp=timestamp)
+        self.assertSameSums(trends.rebuild_trend(self.vehicle), recorded)
+
+    def test_declining_health_is_extrapolated(self):
+        trend = self.record(*self.declining())
+        model = trends.fit(trend)
+        self.assertAlmostEqual(model['slope'], -0.006, delta=0.001)
+        self.assertAlmostEqual(model['health_now'], 0.81, delta=0.01)
+
+        forecast = trends.forecast(trend, calculate_remaining_kilometers)
+        self.assertEqual(forecast['method'], 'trend')
+        days = (model['health_now'] - 0.4) / -model['slope']
+        self.assertAlmostEqual(forecast['remaining_kilometers'], days * 150, delta=1)
+        self.assertLess(forecast['lower_km'], forecast['remaining_kilometers'])
+        self.assertGreater(forecast['upper_km'], forecast['remaining_kilometers'])
+
+    def test_stable_health_falls_back_to_the_snapshot(self):
+        trend = self.record(*[self.reading(i / 2) for i in range(40)])
+        forecast = trends.forecast(trend, calculate_remaining_kilometers)
+        self.assertEqual(forecast['method'], 'stable')
+        self.assertEqual(forecast['health_slope_per_day'], 0)
+        self.assertEqual(forecast['remaining_kilometers'], calculate_remaining_kilometers(1.0))
+
+    def test_short_history_has_no_forecast(self):
+        self.assertIsNone(trends.forecast(self.record(*self.declining(10)), calculate_remaining_kilometers))
+        # Enough readings, but all within an hour
+        VehicleHealthTrend.objects.filter(vehicle=self.vehicle).delete()
+        trend = self.record(*[self.reading(i / 2000) for i in range(40)])
+        self.assertIsNone(trends.forecast(trend, calculate_remaining_kilometers))
+
+
+class PartitioningTests(TestCase):
+
+    def setUp(self):
+        if not partitioning.is_partitioned(connection):
+            self.skipTest('Readings table is not partitioned on this database')
+
+    def test_create_partition_moves_rows_out_of_default(self):
+        month = datetime(2090, 5, 1, tzinfo=dt_timezone.utc)
+        vehicle = Vehicle.objects.create(external_id='veh-1')
+        reading = create_readings(vehicle, 1)[0]
+        VehicleSensorData.objects.filter(pk=reading.pk).update(timestamp=month.replace(day=12))
+
+        name = partitioning.create_partition(connection, month)
+
+        self.assertIn(name, partitioning.list_partitions(connection))
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {connection.ops.quote_name(name)}')
+            self.assertEqual(cursor.fetchall(), [(reading.pk,)])
+        self.assertEqual(VehicleSensorData.objects.get(pk=reading.pk).vehicle_id, vehicle.pk)
+        # Idempotent once the partition exists
+        self.assertEqual(partitioning.create_partition(connection, month), name)
+
+
+class ColumnarStoreTests(SensorApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SENSOR_COLUMNAR_STORE={'ENABLED': True, 'PATH': directory.name})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def row(self, timestamp, rpm):
+        return {**READING, 'engine_rpm': rpm, 'timestamp': timestamp,
+                'prediction_result': 'H', 'prediction_score': 0.8}
+
+    def test_late_readings_are_merged_in_order(self):
+        base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        columnar.append_readings('veh-9', [self.row(base + timedelta(seconds=10), 10.0)])
+        columnar.append_readings('veh-9', [self.row(base + timedelta(seconds=30), 30.0)])
+        # Out of order, and one row more than 24 days (an int32 of milliseconds) earlier
+        columnar.append_readings('veh-9', [
+            self.row(base + timedelta(seconds=20), 20.0),
+            self.row(base - timedelta(days=40), -1.0),
+        ])
+
+        columns = columnar.VehicleColumns('veh-9')
+        self.assertTrue(columns.index['sorted'])
+        self.assertEqual(list(columns.column('engine_rpm')), [-1.0, 10.0, 20.0, 30.0])
+        self.assertEqual(
+            [columnar._from_millis(ts) for ts in columns.timestamps()],
+            [base - timedelta(days=40)] + [base + timedelta(seconds=n) for n in (10, 20, 30)],
+        )
+        self.assertEqual(columns.row_range(base, base + timedelta(seconds=25)), (1, 3))
+
+    def test_history_served_after_out_of_order_commits(self):
+        readings = VehicleSensorData.objects.filter(vehicle=self.vehicle).order_by('timestamp')
+        columnar.append_readings('veh-1', list(readings[5:]))
+        columnar.append_readings('veh-1', list(readings[:5]))
+        response = self.client.get(reverse('prediction-history', args=['veh-1']), {'source': 'columnar'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 15)
+
+    def test_update_falls_back_to_database(self):
+        readings = VehicleSensorData.objects.filter(vehicle=self.vehicle).order_by('timestamp')
+        columnar.append_readings('veh-1', list(readings))
+        latest = self.readings[-1]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('vehicle-sensor-detail', args=[latest.pk]), {'engine_rpm': 1234.0}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(columnar.stored_vehicles(stale_only=True), ['veh-1'])
+
+        response = self.client.get(reverse('prediction-history', args=['veh-1']), {'source': 'columnar'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(1234.0, [row['engine_rpm'] for row in response.data['results']])
+
+    def test_delete_marks_vehicle_stale(self):
+        columnar.append_readings('veh-1', list(VehicleSensorData.objects.filter(vehicle=self.vehicle)))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('vehicle-sensor-detail', args=[self.readings[0].pk]))
+        self.assertEqual(response.status_code, 204)
+        with self.assertRaises(columnar.StoreUnavailable):
+            columnar.VehicleColumns('veh-1').row_range()
+        response = self.client.get(reverse('prediction-history', args=['veh-1']), {'source': 'columnar'})
+        self.assertEqual(response.data['count'], 14)
+
+
+class RetentionTests(TestCase):
+    hour = datetime(2025, 1, 15, 10, tzinfo=dt_timezone.utc)
+    cutoff = datetime(2025, 2, 1, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SENSOR_ARCHIVE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.vehicle = Vehicle.objects.create(external_id='veh-1')
+
+    def add_reading(self, timestamp, engine_rpm, result='H'):
+        reading = VehicleSensorData.objects.create(
+            vehicle=self.vehicle, prediction_result=result, prediction_score=0.2 if result == 'F' else 0.8,
+            **{**READING, 'engine_rpm': engine_rpm},
+        )
+        VehicleSensorData.objects.filter(pk=reading.pk).update(timestamp=timestamp)
+        return timestamp
+
+    def history(self):
+        return archive.with_archive(self.vehicle.readings.order_by('-timestamp'), 'raw', 'veh-1')
+
+    def test_compacting_an_hour_twice_merges_the_rollup(self):
+        self.add_reading(self.hour + timedelta(minutes=5), 100.0)
+        self.add_reading(self.hour + timedelta(minutes=10), 200.0, 'F')
+        self.assertEqual(retention.compact_raw_readings(self.cutoff), 2)
+        # A gateway uploads a backlog into the compacted hour
+        self.add_reading(self.hour + timedelta(minutes=20), 600.0)
+        self.assertEqual(retention.compact_raw_readings(self.cutoff), 1)
+
+        rollup = VehicleSensorRollup.objects.get(vehicle=self.vehicle)
+        self.assertEqual(rollup.bucket_start, self.hour)
+        self.assertEqual(rollup.reading_count, 3)
+        self.assertEqual(rollup.faulty_count, 1)
+        self.assertAlmostEqual(rollup.avg_engine_rpm, 300.0)
+        self.assertAlmostEqual(rollup.avg_prediction_score, 0.6)
+        self.assertFalse(VehicleSensorData.objects.exists())
+        self.assertEqual(archive.ArchivedSegments('raw', 'veh-1').count(), 3)
+
+    def test_compacted_readings_round_trip_through_the_archive(self):
+        times = [self.add_reading(self.hour + timedelta(hours=i), 100.0 * i, 'F' if i == 2 else 'H') for i in range(4)]
+        retention.compact_raw_readings(self.cutoff)
+
+        history = self.history()
+        self.assertEqual(history.count(), 4)
+        rows = history[0:10]
+        self.assertEqual([row.timestamp for row in rows], times[::-1])
+        self.assertEqual([row.engine_rpm for row in rows], [300.0, 200.0, 100.0, 0.0])
+        self.assertEqual([row.prediction_result for row in rows], ['H', 'F', 'H', 'H'])
+        self.assertEqual(rows[0].coolant_temp, READING['coolant_temp'])
+
+    def test_late_readings_are_merged_into_archived_history(self):
+        early = self.add_reading(self.hour + timedelta(minutes=5), 100.0)
+        later = self.add_reading(self.hour + timedelta(minutes=10), 200.0)
+        retention.compact_raw_readings(self.cutoff)
+        recent = self.add_reading(timezone.now(), 300.0)
+        late = self.add_reading(self.hour + timedelta(minutes=7), 150.0)
+
+        history = self.history()
+        self.assertEqual(history.count(), 4)
+        self.assertEqual([row.timestamp for row in history[0:10]], [recent, later, late, early])
+        self.assertEqual([row.timestamp for row in history[2:4]], [late, early])
+
+    def test_archiving_an_hour_twice_merges_the_archived_rollup(self):
+        self.add_reading(self.hour + timedelta(minutes=5), 100.0)
+        self.add_reading(self.hour + timedelta(minutes=10), 200.0)
+        retention.compact_raw_readings(self.cutoff)
+        self.assertEqual(retention.archive_rollups(self.cutoff), 1)
+        self.add_reading(self.hour + timedelta(minutes=20), 600.0, 'F')
+        retention.compact_raw_readings(self.cutoff)
+        self.assertEqual(retention.archive_rollups(self.cutoff), 1)
+
+        self.assertFalse(VehicleSensorRollup.objects.exists())
+        segment = archive.read_segment('rollup', 'veh-1', '2025-01')
+        self.assertEqual(list(segment['reading_count']), [3])
+        self.assertEqual(list(segment['faulty_count']), [1])
+        self.assertAlmostEqual(segment['avg_engine_rpm'][0], 300.0)
+
+
+class AdminTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'unused-password'))
+
+    def changelist_queries(self, url):
+        with record_queries() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return recorder.count
+
+    def add_vehicle_with_alert(self, external_id):
+        vehicle = Vehicle.objects.create(external_id=external_id)
+        now = timezone.now()
+        FaultAlert.objects.create(
+            vehicle=vehicle, kind='threshold', severity='warning', message='Coolant temp high',
+            first_seen_at=now, last_seen_at=now,
+        )
+
+    def test_changelists_do_not_query_per_row(self):
+        urls = [
+            reverse('admin:sensor_api_vehiclehealthtrend_changelist'),
+            reverse('admin:sensor_api_faultalert_changelist'),
+        ]
+        self.add_vehicle_with_alert('veh-1')
+        baseline = [self.changelist_queries(url) for url in urls]
+        for i in range(2, 6):
+            self.add_vehicle_with_alert(f'veh-{i}')
+        self.assertEqual([self.changelist_queries(url) for url in urls], baseline)
+
+    def test_str_does_not_load_the_vehicle(self):
+        vehicle = Vehicle.objects.create(external_id='veh-1')
+        VehicleSensorRollup.objects.create(
+            vehicle=vehicle, bucket_start=timezone.now(), reading_count=1,
+            **{f'avg_{field}': value for field, value in READING.items()},
+        )
+        create_readings(vehicle, 1)
+        rows = [
+            VehicleHealthTrend.objects.get(pk=vehicle.pk),
+            VehicleSensorRollup.objects.get(),
+            VehicleSensorData.objects.get(),
+        ]
+        with self.assertNumQueries(0):
+            for row in rows:
+                self.assertIn(str(vehicle.pk), str(row))
+
+
+class SyntheticTelemetryTests(TestCase):
+
+    def test_labels_follow_the_score_convention(self):
+        generator = synthetic.FleetGenerator(
+            50, datetime(2026, 1, 1, tzinfo=dt_timezone.utc), fault_rate=0.02, fault_duration=20, seed=7
+        )
+        steps = [generator.step() for _ in range(100)]
+        results = [result for step in steps for result in step['prediction_result']]
+        scores = [score for step in steps for score in step['prediction_score']]
+        self.assertIn('F', results)
+        for result, score in zip(results, scores):
+            self.assertEqual(result, 'H' if score > 0.5 else 'F')
+
+
+@skipUnless(sharding.is_enabled(), 'Readings are not sharded (see AutoIntell.sharded_test_settings)')
+class ShardingTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(external_id='veh-1')
+        cls.readings = create_readings(cls.vehicle, 6)
+
+    def test_readings_are_stored_on_the_vehicles_shard(self):
+        home = sharding.shard_for(self.vehicle.pk)
+        for alias in sharding.source_databases():
+            count = VehicleSensorData.objects.using(alias).filter(vehicle=self.vehicle).count()
+            self.assertEqual(count, 6 if alias == home else 0)
+        self.assertGreaterEqual(self.readings[0].pk, sharding.id_block_start(home))
+
+    def test_rerun_move_replaces_copies_but_keeps_other_readings(self):
+        source = sharding.shard_for(self.vehicle.pk)
+        target = next(alias for alias in sharding.shard_databases() if alias != source)
+        # A batch interrupted after it committed on the target is on both shards
+        VehicleSensorData.objects.using(target).bulk_create(
+            list(VehicleSensorData.objects.using(source).filter(pk__in=[r.pk for r in self.readings[:2]]))
+        )
+        # A reading of its own on the target, taken at the same time as a moved one
+        own = VehicleSensorData.objects.using(target).bulk_create([VehicleSensorData(vehicle=self.vehicle, **READING)])[0]
+        VehicleSensorData.objects.using(target).filter(pk=own.pk).update(timestamp=self.readings[0].timestamp)
+
+        self.assertEqual(sharding.move_readings(self.vehicle.pk, source, target, batch_size=4), 6)
+
+        self.assertFalse(VehicleSensorData.objects.using(source).filter(vehicle=self.vehicle).exists())
+        self.assertEqual(
+            sorted(VehicleSensorData.objects.using(target).filter(vehicle=self.vehicle).values_list('pk', flat=True)),
+            sorted([reading.pk for reading in self.readings] + [own.pk]),
+        )
@@ -0,0 +1,215 @@
+"""
+Per-vehicle degradation trend and remaining-kilometre forecast.
+
+Each stored reading contributes a point (t, h): t is days since EPOCH, h the
+engine health score of that reading (calculate_engine_health). VehicleHealthTrend
+keeps exponentially weighted sums of 1, t, h, t², t·h and h². A reading's weight
+halves every HALF_LIFE_DAYS it lies behind the newest reading (last_t), so older
+behaviour fades out at the same rate however often a vehicle reports. A newer
+reading ages the stored sums by the time elapsed since last_t; a reading that
+arrives late is added with the weight of its own timestamp. Recording a reading is
+a single UPDATE of those sums; the weighted least-squares line, its residual spread
+and therefore the forecast follow from the sums alone.
+
+The forecast extrapolates the smoothed health to FAILURE_SCORE along the fitted
+slope and converts days to kilometres with KM_PER_DAY (readings carry no odometer).
+Bounds use the slope's standard error. A vehicle whose health is not falling, or
+without enough history, gets the snapshot estimate for its smoothed health score.
+
+Readings loaded in bulk (synthetic loader, benchmark seeding) bypass the post-save
+handler; `manage.py rebuild_health_trends` recomputes trends from history.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest, Power
+from django.utils import timezone
+
+from .analysis import PARAMETER_NAMES, calculate_engine_health
+from .archive import SENSOR_FIELDS
+from .models import VehicleHealthTrend
+
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_trend_settings():
+    options = {
+        'HALF_LIFE_DAYS': 30.0,
+        'FAILURE_SCORE': 0.4,
+        'KM_PER_DAY': 150,
+        'MIN_READINGS': 20,
+        'MIN_SPAN_DAYS': 1.0,
+        'CONFIDENCE_Z': 1.96,
+        'MAX_KM': 50000,
+    }
+    options.update(getattr(settings, 'SENSOR_HEALTH_TREND', {}))
+    return options
+
+
+def days_since_epoch(value):
+    return (value - EPOCH).total_seconds() / 86400
+
+
+def reading_health(values):
+    """Health score of one reading given {model field: value}."""
+    return calculate_engine_health({PARAMETER_NAMES[field]: value for field, value in values.items()})
+
+
+def record_reading(reading):
+    """Fold a saved reading into its vehicle's trend with one UPDATE."""
+    half_life = get_trend_settings()['HALF_LIFE_DAYS']
+    t = days_since_epoch(reading.timestamp)
+    h = reading_health({field: getattr(reading, field) for field in SENSOR_FIELDS})
+
+    last_t = Coalesce(F('last_t'), Value(t))
+    # Decay of the stored sums when this reading is the newest, else of this reading
+    keep = Power(Value(0.5), Greatest(Value(t) - last_t, Value(0.0)) / half_life)
+    w = Power(Value(0.5), Greatest(last_t - Value(t), Value(0.0)) / half_life)
+    is_late = Q(last_t__gt=t)
+    changes = {
+        'readings': F('readings') + 1,
+        'weight': F('weight') * keep + w,
+        'weight_sq': F('weight_sq') * keep * keep + w * w,
+        'sum_t': F('sum_t') * keep + w * t,
+        'sum_h': F('sum_h') * keep + w * h,
+        'sum_tt': F('sum_tt') * keep + w * (t * t),
+        'sum_th': F('sum_th') * keep + w * (t * h),
+        'sum_hh': F('sum_hh') * keep + w * (h * h),
+        'last_t': Case(When(is_late, then=F('last_t')), default=Value(t)),
+        'last_reading_at': Case(When(is_late, then=F('last_reading_at')), default=Value(reading.timestamp)),
+        'updated_at': timezone.now(),
+    }
+    trends = VehicleHealthTrend.objects.filter(vehicle_id=reading.vehicle_id)
+    if trends.update(**changes):
+        return
+    # Vehicles created in bulk or before trends existed have no row yet
+    try:
+        with transaction.atomic():
+            VehicleHealthTrend.objects.create(
+                vehicle_id=reading.vehicle_id, readings=1, weight=1.0, weight_sq=1.0,
+                sum_t=t, sum_h=h, sum_tt=t * t, sum_th=t * h, sum_hh=h * h,
+                last_t=t, last_reading_at=reading.timestamp,
+            )
+    except IntegrityError:
+        # A concurrent reading created the row first
+        trends.update(**changes)
+
+
+def rebuild_trend(vehicle, batch_size=10000):
+    """Recompute a vehicle's trend from its stored readings. Returns the trend or None."""
+    half_life = get_trend_settings()['HALF_LIFE_DAYS']
+    rows = (
+        vehicle.readings.order_by('timestamp')
+        .values_list('timestamp', *SENSOR_FIELDS)
+        .iterator(chunk_size=batch_size)
+    )
+    t, h = [], []
+    last_reading_at = None
+    for row in rows:
+        last_reading_at = row[0]
+        t.append(days_since_epoch(row[0]))
+        h.append(reading_health(dict(zip(SENSOR_FIELDS, row[1:]))))
+    if not t:
+        VehicleHealthTrend.objects.filter(vehicle=vehicle).delete()
+        return None
+
+    t, h = np.array(t), np.array(h)
+    w = 0.5 ** ((t[-1] - t) / half_life)
+    sums = {
+        'readings': len(t),
+        'weight': float(w.sum()),
+        'weight_sq': float((w * w).sum()),
+        'sum_t': float((w * t).sum()),
+        'sum_h': float((w * h).sum()),
+        'sum_tt': float((w * t * t).sum()),
+        'sum_th': float((w * t * h).sum()),
+        'sum_hh': float((w * h * h).sum()),
+        'last_t': float(t[-1]),
+        'last_reading_at': last_reading_at,
+    }
+    trend, _ = VehicleHealthTrend.objects.update_or_create(vehicle=vehicle, defaults=sums)
+    return trend
+
+
+def fit(trend):
+    """
+    Weighted least-squares fit of health against time. Returns a dict with the
+    slope (per day), the smoothed health now, their standard errors and the
+    effective sample size, or None if the trend cannot be fitted yet.
+    """
+    options = get_trend_settings()
+    if trend is None or trend.readings < options['MIN_READINGS'] or trend.weight <= 0:
+        return None
+
+    w = trend.weight
+    mean_t, mean_h = trend.sum_t / w, trend.sum_h / w
+    s_tt = trend.sum_tt - w * mean_t * mean_t
+    s_th = trend.sum_th - w * mean_t * mean_h
+    s_hh = trend.sum_hh - w * mean_h * mean_h
+    # Weighted spread of t, expressed as the span of an evenly spread sample
+    span = math.sqrt(max(s_tt / w, 0.0) * 12)
+    if span < options['MIN_SPAN_DAYS']:
+        return None
+
+    n_eff = w * w / trend.weight_sq
+    slope = s_th / s_tt
+    residual = max(s_hh - slope * s_th, 0.0) / w * n_eff / max(n_eff - 2, 1.0)
+    t_now = trend.last_t if trend.last_t is not None else mean_t
+    health_now = mean_h + slope * (t_now - mean_t)
+    return {
+        'slope': slope,
+        'slope_se': math.sqrt(residual / (s_tt / w * n_eff)),
+        'health_now': min(max(health_now, 0.0), 1.0),
+        'health_se': math.sqrt(residual * (1 / n_eff + (t_now - mean_t) ** 2 / (s_tt / w * n_eff))),
+        'effective_readings': n_eff,
+    }
+
+
+def _days_to_failure(health, slope, failure_score):
+    if health <= failure_score:
+        return 0.0
+    if slope >= 0:
+        return math.inf
+    return (failure_score - health) / slope
+
+
+def forecast(trend, snapshot_km):
+    """
+    Remaining-km forecast with confidence bounds. `snapshot_km(health)` converts a
+    health score to kilometres for vehicles without a usable downward trend.
+    """
+    options = get_trend_settings()
+    model = fit(trend)
+    if model is None:
+        return None
+
+    z, max_km = options['CONFIDENCE_Z'], options['MAX_KM']
+    health, slope = model['health_now'], model['slope']
+
+    if slope < 0:
+        def km(s, h=health):
+            return min(_days_to_failure(h, s, options['FAILURE_SCORE']) * options['KM_PER_DAY'], max_km)
+
+        estimate = km(slope)
+        # A steeper decline means fewer kilometres
+        lower, upper = km(slope - z * model['slope_se']), km(slope + z * model['slope_se'])
+        method = 'trend'
+    else:
+        estimate = min(snapshot_km(health), max_km)
+        lower = min(snapshot_km(max(health - z * model['health_se'], 0.0)), max_km)
+        upper = min(snapshot_km(min(health + z * model['health_se'], 1.0)), max_km)
+        method = 'stable'
+
+    return {
+        'remaining_kilometers': int(estimate),
+        'lower_km': int(lower),
+        'upper_km': int(upper),
+        'method': method,
+        'health_now': round(health, 4),
+        'health_slope_per_day': round(slope, 6),
+        'effective_readings': round(model['effective_readings'], 1),
+    }
@@ -4,6 +4,12 @@ from .views import (
     VehicleSensorDataViewSet,
     get_latest_sensor_data,
     get_prediction_history,
+    get_rollup_history,
+    get_fleet_faulty_readings,
+    get_fleet_high_score_readings,
+    get_fleet_summary,
+    get_fault_alerts,
+    acknowledge_fault_alert,
     predict_engine_kilometers
 )
 
@@ -14,5 +20,11 @@ urlpatterns = [
     path('', include(router.urls)),
     path('latest/<str:vehicle_id>/', get_latest_sensor_data, name='latest-sensor-data'),
     path('history/<str:vehicle_id>/', get_prediction_history, name='prediction-history'),
+    path('rollups/<str:vehicle_id>/', get_rollup_history, name='rollup-history'),
+    path('fleet/faulty/', get_fleet_faulty_readings, name='fleet-faulty-readings'),
+    path('fleet/high-score/', get_fleet_high_score_readings, name='fleet-high-score-readings'),
+    path('fleet/summary/', get_fleet_summary, name='fleet-summary'),
+    path('alerts/', get_fault_alerts, name='fault-alerts'),
+    path('alerts/<int:alert_id>/acknowledge/', acknowledge_fault_alert, name='acknowledge-fault-alert'),
     path('remaining-km/<str:vehicle_id>/', predict_engine_kilometers, name='predict-engine-kilometers'),
 ]
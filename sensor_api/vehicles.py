@@ -0,0 +1,137 @@
+"""
+Resolve the string vehicle ids used by devices and the API to Vehicle rows.
+
+The external id -> primary key mapping never changes once a vehicle exists, so
+resolved vehicles are kept in a bounded in-process cache and the hot read and
+write paths usually resolve a vehicle without a query. Cached instances are only
+meant for identity (pk, external_id); re-read the row for its other fields.
+"""
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from monitoring.metrics import record_cache_lookup
+
+from . import sharding
+from .models import Vehicle, VehicleSensorData
+
+
+class VehicleLookupCache:
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, external_id, create=False):
+        """Return the Vehicle for `external_id`; None if unknown and `create` is False."""
+        external_id = str(external_id)
+        vehicle = self._entries.get(external_id)
+        if vehicle is not None:
+            record_cache_lookup('vehicle', hit=True)
+            return vehicle
+
+        record_cache_lookup('vehicle', hit=False)
+        vehicle = Vehicle.objects.only('id', 'external_id').filter(external_id=external_id).first()
+        if vehicle is None:
+            if not create:
+                return None
+            vehicle = self._create(external_id)
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[external_id] = vehicle
+        return vehicle
+
+    def _create(self, external_id):
+        try:
+            with transaction.atomic():
+                return Vehicle.objects.create(external_id=external_id)
+        except IntegrityError:
+            # Another request registered the vehicle first
+            return Vehicle.objects.only('id', 'external_id').get(external_id=external_id)
+
+    def invalidate(self, external_id):
+        with self._lock:
+            self._entries.pop(str(external_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+vehicle_cache = VehicleLookupCache()
+
+
+def get_vehicle(external_id, create=False):
+    return vehicle_cache.get(external_id, create=create)
+
+
+def display_vehicle(external_id):
+    """Unsaved stand-in Vehicle for rows rebuilt from the archive or columnar store."""
+    return Vehicle(external_id=str(external_id))
+
+
+def touch_vehicles(vehicle_pks=None, removed=0):
+    """
+    Record that readings of these vehicles (every vehicle when None) changed, so
+    cached history responses revalidate. `removed` readings are subtracted from
+    reading_count, e.g. after deleting one vehicle's rows.
+    """
+    vehicles = Vehicle.objects.all() if vehicle_pks is None else Vehicle.objects.filter(pk__in=vehicle_pks)
+    changes = {'readings_modified_at': timezone.now()}
+    if removed:
+        changes['reading_count'] = F('reading_count') - removed
+    return vehicles.update(**changes)
+
+
+def _sharded_aggregates(vehicle_pks, **aggregates):
+    # Shards cannot see the vehicles table, so aggregate there and update here
+    readings = VehicleSensorData.objects.order_by()
+    if vehicle_pks is not None:
+        readings = readings.filter(vehicle_id__in=list(vehicle_pks))
+    rows = sharding.gather(readings.values('vehicle_id').annotate(**aggregates))
+    return {row['vehicle_id']: row for row in rows}
+
+
+def _update_from_shards(vehicle_pks, field, aggregate, default):
+    values = _sharded_aggregates(vehicle_pks, value=aggregate)
+    vehicles = Vehicle.objects.all() if vehicle_pks is None else Vehicle.objects.filter(pk__in=vehicle_pks)
+    vehicles = list(vehicles.only('id'))
+    now = timezone.now()
+    for vehicle in vehicles:
+        setattr(vehicle, field, values[vehicle.pk]['value'] if vehicle.pk in values else default)
+        vehicle.readings_modified_at = now
+    Vehicle.objects.bulk_update(vehicles, [field, 'readings_modified_at'], batch_size=1000)
+    return len(vehicles)
+
+
+def recount_readings(vehicle_pks=None):
+    """
+    Recompute reading_count from the readings table (every vehicle when None), for
+    bulk loads and partition expiry that bypass the per-row signals.
+    """
+    if sharding.is_enabled():
+        return _update_from_shards(vehicle_pks, 'reading_count', Count('id'), 0)
+    counts = (
+        VehicleSensorData.objects.filter(vehicle=OuterRef('pk'))
+        .order_by().values('vehicle').annotate(n=Count('id')).values('n')
+    )
+    vehicles = Vehicle.objects.all() if vehicle_pks is None else Vehicle.objects.filter(pk__in=vehicle_pks)
+    return vehicles.update(reading_count=Coalesce(Subquery(counts), Value(0)), readings_modified_at=timezone.now())
+
+
+def refresh_last_seen(vehicle_pks=None):
+    """Set last_seen_at to each vehicle's newest stored reading (every vehicle when None)."""
+    if sharding.is_enabled():
+        return _update_from_shards(vehicle_pks, 'last_seen_at', Max('timestamp'), None)
+    latest = (
+        VehicleSensorData.objects.filter(vehicle=OuterRef('pk'))
+        .order_by().values('vehicle').annotate(latest=Max('timestamp')).values('latest')
+    )
+    vehicles = Vehicle.objects.all() if vehicle_pks is None else Vehicle.objects.filter(pk__in=vehicle_pks)
+    return vehicles.update(last_seen_at=Subquery(latest))
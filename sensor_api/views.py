@@ -1,12 +1,41 @@
-import random
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from .models import VehicleSensorData
-from .serializers import VehicleSensorDataSerializer
+from .analysis import (
+    analyze_engine_performance,
+    calculate_deviation,
+    calculate_engine_health,
+    calculate_remaining_kilometers,
+    get_health_status,
+    get_maintenance_recommendations,
+    get_operational_recommendations,
+    get_parameter_status,
+    get_parameter_unit,
+)
+from .archive import with_archive
+from . import columnar, conditional, fleet_summary, sharding, trends
+from .models import FaultAlert, VehicleHealthTrend, VehicleSensorData, VehicleSensorRollup
+from .serializers import (
+    FaultAlertSerializer,
+    FleetReadingSerializer,
+    VehicleSensorDataSerializer,
+    VehicleSensorRollupSerializer,
+)
+from .queries import high_score_readings, recent_faulty_readings, vehicle_history, with_vehicles
+from .vehicles import get_vehicle
+from AutoIntell.db_routers import replica_reads
+from authentication.backends import TELEMETRY_AUTHENTICATION_CLASSES
+from authentication.permissions import DeviceVehicleScope
+from monitoring.metrics import timed
 import logging
 import numpy as np
 
@@ -17,41 +46,141 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-def generate_random_engine_data(vehicle_id):
+def generate_random_engine_data(vehicle_id, rng=None):
     """
     Generate random engine sensor data within realistic ranges.
     All pressure values are in kPa, temperatures in °C, and RPM in revolutions per minute.
+    Pass a seeded numpy Generator as `rng` for reproducible output; for bulk
+    synthetic telemetry use synthetic.FleetGenerator instead.
     """
+    rng = rng or np.random.default_rng()
     return {
         "vehicle_id": str(vehicle_id),
-        "engine_rpm": random.uniform(400, 1500),      # RPM
-        "lub_oil_pressure": random.uniform(2, 30), # kPa (36-65 PSI)
-        "fuel_pressure": random.uniform(2, 30),    # kPa (43-58 PSI)
-        "coolant_pressure": random.uniform(2, 30),  # kPa (13-17 PSI)
-        "lub_oil_temp": random.uniform(20, 90),      # °C (158-212 °F)
-        "coolant_temp": random.uniform(20, 90),      # °C (185-221 °F)
+        "engine_rpm": float(rng.uniform(400, 1500)),      # RPM
+        "lub_oil_pressure": float(rng.uniform(2, 30)), # kPa (36-65 PSI)
+        "fuel_pressure": float(rng.uniform(2, 30)),    # kPa (43-58 PSI)
+        "coolant_pressure": float(rng.uniform(2, 30)),  # kPa (13-17 PSI)
+        "lub_oil_temp": float(rng.uniform(20, 90)),      # °C (158-212 °F)
+        "coolant_temp": float(rng.uniform(20, 90)),      # °C (185-221 °F)
         "timestamp": timezone.now().isoformat()
     }
 
+def parse_time_range(request):
+    """
+    Read `since`/`until` (ISO-8601) from the query string. When `since` is absent,
+    SENSOR_HISTORY_DEFAULT_WINDOW_DAYS (if set) bounds the range to recent readings.
+    Raises ValueError on malformed values.
+    """
+    bounds = []
+    for param in ('since', 'until'):
+        raw = request.query_params.get(param)
+        value = None
+        if raw:
+            value = parse_datetime(raw)
+            if value is None:
+                day = parse_date(raw)
+                if day is None:
+                    raise ValueError(f'Invalid {param} timestamp: {raw}')
+                value = datetime.combine(day, time.min)
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+        bounds.append(value)
+
+    since, until = bounds
+    window_days = getattr(settings, 'SENSOR_HISTORY_DEFAULT_WINDOW_DAYS', None)
+    if since is None and window_days:
+        since = timezone.now() - timedelta(days=window_days)
+    return since, until
+
+def wants_columnar(request):
+    """
+    Whether to serve a history read from the columnar store: `?source=columnar` or
+    `?source=database` per request, otherwise SENSOR_COLUMNAR_STORE['SERVE_READS'].
+    """
+    if not columnar.is_enabled():
+        return False
+    source = request.query_params.get('source')
+    if source:
+        return source == 'columnar'
+    return bool(columnar.get_store_settings().get('SERVE_READS'))
+
+def read_columnar(request, read):
+    """
+    `read()` from the columnar store when the request wants it, else None. Also None
+    when the vehicle's columns are stale or unordered, so the database answers.
+    """
+    if not wants_columnar(request):
+        return None
+    try:
+        return read()
+    except columnar.StoreUnavailable as e:
+        logger.warning(f"Serving from the database: {e}")
+        return None
+
 # ViewSet for CRUD
 
 class VehicleSensorDataViewSet(viewsets.ModelViewSet):
-    queryset = VehicleSensorData.objects.all().order_by('-timestamp')
+    queryset = VehicleSensorData.objects.select_related('vehicle').order_by('-timestamp')
     serializer_class = VehicleSensorDataSerializer
-    permission_classes = [IsAuthenticated]
+    authentication_classes = TELEMETRY_AUTHENTICATION_CLASSES
+    permission_classes = [IsAuthenticated, DeviceVehicleScope]
     pagination_class = StandardResultsSetPagination
 
+    def get_queryset(self):
+        if self.action == 'list' and sharding.is_enabled():
+            # Every shard's readings merged newest first; vehicles come from the catalog per page
+            return sharding.MergedReadings(
+                VehicleSensorData.objects.order_by('-timestamp'),
+                prepare=with_vehicles,
+            )
+        return super().get_queryset()
+
+    def get_object(self):
+        if not sharding.is_enabled():
+            return super().get_object()
+        # The id alone does not say which shard has the row, so ask all of them
+        try:
+            matches = sharding.gather(VehicleSensorData.objects.filter(pk=self.kwargs[self.lookup_field]))
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        if len(matches) != 1:
+            raise Http404
+        self.check_object_permissions(self.request, matches[0])
+        return matches[0]
+
+    def list(self, request, *args, **kwargs):
+        # Fleet-wide validators: unchanged readings anywhere means an unchanged listing
+        validators = conditional.make_validators(request, conditional.fleet_state())
+        cached = conditional.not_modified(request, validators)
+        if cached is not None:
+            return cached
+        return conditional.add_validators(super().list(request, *args, **kwargs), validators)
+
+    def perform_destroy(self, instance):
+        # The post_delete signal takes the reading out of its vehicle's count
+        super().perform_destroy(instance)
+        if columnar.is_enabled():
+            external_id = instance.vehicle.external_id
+            transaction.on_commit(lambda: columnar.invalidate_vehicles([external_id]))
+
 # API to get latest sensor data for a specific vehicle
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@authentication_classes(TELEMETRY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated, DeviceVehicleScope])
 def get_latest_sensor_data(request, vehicle_id):
     """
     Generate random sensor data for testing. Does not save to database.
-    This endpoint is for providing test input data only.
+    This endpoint is for providing test input data only. An integer `seed` query
+    parameter makes the sensor values reproducible.
     """
     try:
-        data = generate_random_engine_data(vehicle_id)
+        seed = request.query_params.get('seed')
+        try:
+            rng = np.random.default_rng(int(seed)) if seed is not None else None
+        except ValueError:
+            return Response({'error': 'seed must be a non-negative integer'}, status=status.HTTP_400_BAD_REQUEST)
+        data = generate_random_engine_data(vehicle_id, rng)
         return Response(data, status=status.HTTP_200_OK)
     except Exception as e:
         return Response(
@@ -60,18 +189,44 @@ def get_latest_sensor_data(request, vehicle_id):
         )
 
 @api_view(['GET'])
-@permission_classes([IsAuthenticated])
+@authentication_classes(TELEMETRY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated, DeviceVehicleScope])
+@replica_reads
 def get_prediction_history(request, vehicle_id):
-    """Get historical prediction records for a specific vehicle."""
+    """
+    Get historical prediction records for a specific vehicle.
+    Optional ISO-8601 `since`/`until` query parameters bound the time range; on a
+    partitioned table only the partitions inside the range are scanned.
+    `source=columnar` reads from the columnar store instead (see wants_columnar).
+    Responses carry ETag/Last-Modified; a matching conditional request gets a 304.
+    """
+    try:
+        since, until = parse_time_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     try:
-        queryset = VehicleSensorData.objects.filter(
-            vehicle_id=str(vehicle_id)
-        ).order_by('-timestamp')
+        vehicle = get_vehicle(vehicle_id)
+        state = conditional.vehicle_state(vehicle)
+        validators = conditional.make_validators(request, state) if state else None
+        if validators:
+            cached = conditional.not_modified(request, validators)
+            if cached is not None:
+                return cached
+
+        history = read_columnar(request, lambda: columnar.ColumnarHistory(vehicle_id, since, until))
+        if history is None:
+            queryset = vehicle_history(vehicle, since, until) if vehicle else VehicleSensorData.objects.none()
+            # Readings moved to cold storage by the retention job continue after the hot rows
+            history = with_archive(queryset, 'raw', vehicle_id, since, until)
 
         paginator = StandardResultsSetPagination()
-        paginated_queryset = paginator.paginate_queryset(queryset, request)
-        serializer = VehicleSensorDataSerializer(paginated_queryset, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        paginated_queryset = paginator.paginate_queryset(history, request)
+        with timed('serialization'):
+            serializer = VehicleSensorDataSerializer(paginated_queryset, many=True)
+            data = serializer.data
+        response = paginator.get_paginated_response(data)
+        return conditional.add_validators(response, validators) if validators else response
 
     except Exception as e:
         return Response(
@@ -79,13 +234,242 @@ def get_prediction_history(request, vehicle_id):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['GET'])
+@authentication_classes(TELEMETRY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated, DeviceVehicleScope])
+@replica_reads
+def get_rollup_history(request, vehicle_id):
+    """
+    Get hourly downsampled readings for a specific vehicle, newest first.
+    Rollups are produced by the retention job; archived ones are merged in transparently.
+    Accepts the same `since`/`until` parameters as the prediction history.
+    With `source=columnar` the hourly buckets are computed from the columnar store
+    on the fly, so they are available before the retention job has run.
+    """
+    try:
+        since, until = parse_time_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        history = read_columnar(request, lambda: columnar.VehicleColumns(vehicle_id).hourly_rollups(since, until))
+        if history is None:
+            vehicle = get_vehicle(vehicle_id)
+            queryset = VehicleSensorRollup.objects.filter(
+                vehicle=vehicle
+            ).select_related('vehicle').order_by('-bucket_start') if vehicle else VehicleSensorRollup.objects.none()
+            if since:
+                queryset = queryset.filter(bucket_start__gte=since)
+            if until:
+                queryset = queryset.filter(bucket_start__lt=until)
+            history = with_archive(queryset, 'rollup', vehicle_id, since, until)
+
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(history, request)
+        with timed('serialization'):
+            data = VehicleSensorRollupSerializer(page, many=True).data
+        return paginator.get_paginated_response(data)
+
+    except Exception as e:
+        return Response(
+            {'error': f'Error retrieving rollup history: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@authentication_classes(TELEMETRY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated, DeviceVehicleScope])
+@replica_reads
+def get_fleet_faulty_readings(request):
+    """
+    Faulty readings across the whole fleet, newest first.
+    Accepts the same `since`/`until` parameters as the prediction history.
+    """
+    try:
+        since, until = parse_time_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(recent_faulty_readings(since, until), request)
+        with timed('serialization'):
+            data = FleetReadingSerializer(page, many=True).data
+        return paginator.get_paginated_response(data)
+
+    except Exception as e:
+        return Response(
+            {'error': f'Error retrieving faulty readings: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@authentication_classes(TELEMETRY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated, DeviceVehicleScope])
+@replica_reads
+def get_fleet_high_score_readings(request):
+    """
+    Readings across the fleet with prediction_score >= `min_score` (required),
+    highest score first. Accepts `since`/`until` like the prediction history.
+    """
+    try:
+        since, until = parse_time_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        min_score = float(request.query_params['min_score'])
+    except (KeyError, ValueError):
+        return Response({'error': 'min_score must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(high_score_readings(min_score, since, until), request)
+        with timed('serialization'):
+            data = FleetReadingSerializer(page, many=True).data
+        return paginator.get_paginated_response(data)
+
+    except Exception as e:
+        return Response(
+            {'error': f'Error retrieving high-score readings: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@authentication_classes(TELEMETRY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated, DeviceVehicleScope])
+@replica_reads
+def get_fleet_summary(request):
+    """
+    Fleet-wide statistics over `since`/`until` (default: the last 24 hours),
+    widened to whole summary windows: readings, distinct vehicles, faulty share
+    and per-sensor `quantiles` (comma-separated, default 0.5,0.95,0.99).
+    Served from write-time sketches; `exact=true` scans the readings instead.
+    """
+    try:
+        since, until = parse_time_range(request)
+        quantiles = parse_quantiles(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    until = until or timezone.now()
+    since = since or until - timedelta(hours=24)
+    if since >= until:
+        return Response({'error': 'since must be before until'}, status=status.HTTP_400_BAD_REQUEST)
+    exact = request.query_params.get('exact', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        with timed('fleet_summary'):
+            if exact:
+                summary = fleet_summary.summarize_exact(since, until, quantiles)
+            else:
+                summary = fleet_summary.summarize(since, until, quantiles)
+        return Response(summary)
+
+    except Exception as e:
+        logger.error(f"Error computing fleet summary: {str(e)}")
+        return Response(
+            {'error': f'Error computing fleet summary: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+DEFAULT_SUMMARY_QUANTILES = (0.5, 0.95, 0.99)
+
+def parse_quantiles(request):
+    """Quantiles from `?quantiles=0.5,0.9`; raises ValueError unless each is in (0, 1)."""
+    raw = request.query_params.get('quantiles')
+    if not raw:
+        return list(DEFAULT_SUMMARY_QUANTILES)
+    try:
+        quantiles = sorted({float(value) for value in raw.split(',') if value.strip()})
+    except ValueError:
+        raise ValueError('quantiles must be comma-separated numbers')
+    if not quantiles or len(quantiles) > 10 or not all(0 < q < 1 for q in quantiles):
+        raise ValueError('quantiles must be 1 to 10 numbers between 0 and 1')
+    return quantiles
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+def get_fault_alerts(request):
+    """
+    Alerts raised by the streaming checks, most recently seen first.
+    Filters: `status` (open (default), acknowledged or all), `vehicle_id`, `kind`,
+    `severity`, and `since`/`until` on the time the alert was last seen.
+    """
+    try:
+        since, until = parse_time_range(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    alert_status = request.query_params.get('status', 'open')
+    if alert_status not in ('open', 'acknowledged', 'all'):
+        return Response(
+            {'error': 'status must be open, acknowledged or all'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        queryset = FaultAlert.objects.select_related('vehicle', 'acknowledged_by').order_by('-last_seen_at')
+        if alert_status != 'all':
+            queryset = queryset.filter(acknowledged_at__isnull=(alert_status == 'open'))
+        if request.query_params.get('vehicle_id'):
+            queryset = queryset.filter(vehicle__external_id=request.query_params['vehicle_id'])
+        for param in ('kind', 'severity'):
+            if request.query_params.get(param):
+                queryset = queryset.filter(**{param: request.query_params[param]})
+        if since:
+            queryset = queryset.filter(last_seen_at__gte=since)
+        if until:
+            queryset = queryset.filter(last_seen_at__lt=until)
+
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(queryset, request)
+        return paginator.get_paginated_response(FaultAlertSerializer(page, many=True).data)
+
+    except Exception as e:
+        return Response(
+            {'error': f'Error retrieving alerts: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def acknowledge_fault_alert(request, alert_id):
+    """
+    Acknowledge an open alert. The next occurrence of the same fault opens a new alert.
+    """
+    try:
+        acknowledged = FaultAlert.objects.filter(pk=alert_id, acknowledged_at__isnull=True).update(
+            acknowledged_at=timezone.now(),
+            acknowledged_by=request.user,
+        )
+        alert = FaultAlert.objects.select_related('vehicle', 'acknowledged_by').filter(pk=alert_id).first()
+        if alert is None:
+            return Response({'error': 'Alert not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not acknowledged:
+            return Response({'error': 'Alert is already acknowledged'}, status=status.HTTP_409_CONFLICT)
+        return Response(FaultAlertSerializer(alert).data, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response(
+            {'error': f'Error acknowledging alert: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@authentication_classes(TELEMETRY_AUTHENTICATION_CLASSES)
+@permission_classes([IsAuthenticated, DeviceVehicleScope])
 def predict_engine_kilometers(request, vehicle_id):
     """
     Predict remaining kilometers and provide comprehensive engine analysis based on current sensor data.
     Includes health metrics, maintenance recommendations, and operational insights.
+    An optional comma-separated `fields` query parameter (see ANALYSIS_SECTIONS)
+    limits the response to those sections; the others are not computed.
     """
+    try:
+        sections = parse_analysis_fields(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     try:
         # Get the latest sensor data
         data = generate_random_engine_data(vehicle_id)
@@ -100,55 +484,83 @@ def predict_engine_kilometers(request, vehicle_id):
             'Coolant temp': data['coolant_temp']
         }
         
-        # Calculate health metrics
-        health_score = calculate_engine_health(sensor_data)
-        remaining_km = calculate_remaining_kilometers(health_score)
-        maintenance_info = get_maintenance_recommendations(sensor_data)
-        performance_analysis = analyze_engine_performance(sensor_data)
-        
         response_data = {
             'vehicle_id': vehicle_id,
             'timestamp': data['timestamp'],
-            
+        }
+
+        # Calculate only what the requested sections need
+        with timed('engine_analysis'):
+            needs_health = sections & {'health_metrics', 'operational_recommendations'}
+            health_score = calculate_engine_health(sensor_data) if needs_health else None
+            needs_maintenance = sections & {'health_metrics', 'maintenance_recommendations'}
+            maintenance_info = get_maintenance_recommendations(sensor_data) if needs_maintenance else None
+
             # Basic health metrics
-            'health_metrics': {
-                'overall_score': health_score,
-                'status': get_health_status(health_score),
-                'remaining_kilometers': remaining_km,
-                'estimated_maintenance_due_km': max(0, remaining_km - maintenance_info['urgent_maintenance_threshold'])
-            },
-            
+            if 'health_metrics' in sections:
+                # Forecast from the vehicle's stored degradation trend when it has one,
+                # otherwise from the current reading alone
+                vehicle = get_vehicle(vehicle_id)
+                trend = VehicleHealthTrend.objects.filter(vehicle=vehicle).first() if vehicle else None
+                forecast = trends.forecast(trend, calculate_remaining_kilometers)
+                if forecast is None:
+                    remaining_km = calculate_remaining_kilometers(health_score)
+                    forecast = {
+                        'remaining_kilometers': remaining_km,
+                        'lower_km': None,
+                        'upper_km': None,
+                        'method': 'snapshot',
+                    }
+                remaining_km = forecast['remaining_kilometers']
+                response_data['health_metrics'] = {
+                    'overall_score': health_score,
+                    'status': get_health_status(health_score),
+                    'remaining_kilometers': remaining_km,
+                    'remaining_kilometers_lower': forecast['lower_km'],
+                    'remaining_kilometers_upper': forecast['upper_km'],
+                    'estimated_maintenance_due_km': max(0, remaining_km - maintenance_info['urgent_maintenance_threshold']),
+                    'forecast': {
+                        key: forecast[key]
+                        for key in ('method', 'health_now', 'health_slope_per_day', 'effective_readings')
+                        if key in forecast
+                    },
+                }
+
             # Current sensor readings with status indicators
-            'current_readings': {
-                param: {
-                    'value': value,
-                    'unit': get_parameter_unit(param),
-                    'status': get_parameter_status(param, value),
-                    'deviation_from_ideal': calculate_deviation(param, value)
+            if 'current_readings' in sections:
+                response_data['current_readings'] = {
+                    param: {
+                        'value': value,
+                        'unit': get_parameter_unit(param),
+                        'status': get_parameter_status(param, value),
+                        'deviation_from_ideal': calculate_deviation(param, value)
+                    }
+                    for param, value in sensor_data.items()
                 }
-                for param, value in sensor_data.items()
-            },
-            
+
             # Maintenance recommendations
-            'maintenance_recommendations': {
-                'urgent_actions': maintenance_info['urgent_actions'],
-                'preventive_actions': maintenance_info['preventive_actions'],
-                'next_service_estimate_km': maintenance_info['next_service_km'],
-                'risk_level': maintenance_info['risk_level']
-            },
-            
+            if 'maintenance_recommendations' in sections:
+                response_data['maintenance_recommendations'] = {
+                    'urgent_actions': maintenance_info['urgent_actions'],
+                    'preventive_actions': maintenance_info['preventive_actions'],
+                    'next_service_estimate_km': maintenance_info['next_service_km'],
+                    'risk_level': maintenance_info['risk_level']
+                }
+
             # Performance analysis
-            'performance_analysis': {
-                'efficiency_score': performance_analysis['efficiency_score'],
-                'power_output_status': performance_analysis['power_output_status'],
-                'thermal_balance': performance_analysis['thermal_balance'],
-                'pressure_systems': performance_analysis['pressure_systems'],
-                'operational_state': performance_analysis['operational_state']
-            },
-            
+            if 'performance_analysis' in sections:
+                performance_analysis = analyze_engine_performance(sensor_data)
+                response_data['performance_analysis'] = {
+                    'efficiency_score': performance_analysis['efficiency_score'],
+                    'power_output_status': performance_analysis['power_output_status'],
+                    'thermal_balance': performance_analysis['thermal_balance'],
+                    'pressure_systems': performance_analysis['pressure_systems'],
+                    'operational_state': performance_analysis['operational_state']
+                }
+
             # Operational recommendations
-            'operational_recommendations': get_operational_recommendations(sensor_data, health_score)
-        }
+            if 'operational_recommendations' in sections:
+                response_data['operational_recommendations'] = get_operational_recommendations(sensor_data, health_score)
         
         return Response(response_data, status=status.HTTP_200_OK)
         
@@ -159,305 +571,28 @@ def predict_engine_kilometers(request, vehicle_id):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-def calculate_engine_health(data):
-    """
-    Calculate engine health score based on sensor readings.
-    Returns a score between 0 (poor) and 1 (excellent).
-    """
-    # Define ideal ranges and weights for each parameter
-    params = {
-        'Engine rpm': {
-            'ideal': (800, 2200),  # More lenient RPM range
-            'acceptable': (600, 2800),
-            'weight': 0.2
-        },
-        'Lub oil pressure': {
-            'ideal': (2.0, 5.0),  # Wider pressure range
-            'acceptable': (1.8, 5.5),
-            'weight': 0.2
-        },
-        'Fuel pressure': {
-            'ideal': (3.0, 16.0),  # More lenient fuel pressure
-            'acceptable': (2.5, 18.0),
-            'weight': 0.15
-        },
-        'Coolant pressure': {
-            'ideal': (1.2, 3.5),  # Adjusted coolant pressure
-            'acceptable': (1.0, 4.0),
-            'weight': 0.15
-        },
-        'Lub oil temp': {
-            'ideal': (70.0, 85.0),  # Wider temperature range
-            'acceptable': (65.0, 90.0),
-            'weight': 0.15
-        },
-        'Coolant temp': {
-            'ideal': (70.0, 88.0),  # More lenient coolant temp
-            'acceptable': (65.0, 92.0),
-            'weight': 0.15
-        }
-    }
-    
-    total_score = 0
-    for param, config in params.items():
-        value = data[param]
-        ideal_min, ideal_max = config['ideal']
-        acceptable_min, acceptable_max = config['acceptable']
-        weight = config['weight']
-        
-        # Calculate parameter score
-        if ideal_min <= value <= ideal_max:
-            # Value is in ideal range
-            score = 1.0
-        elif acceptable_min <= value <= acceptable_max:
-            # Value is in acceptable range - calculate proportional score
-            if value < ideal_min:
-                score = 0.7 + 0.3 * (value - acceptable_min) / (ideal_min - acceptable_min)
-            else:
-                score = 0.7 + 0.3 * (acceptable_max - value) / (acceptable_max - ideal_max)
-        else:
-            # Value is outside acceptable range
-            if value < acceptable_min:
-                score = max(0, 0.7 * (value / acceptable_min))
-            else:
-                score = max(0, 0.7 * (acceptable_max / value))
-        
-        total_score += score * weight
-    
-    # Round to 2 decimal places
-    return round(total_score, 2)
+ANALYSIS_SECTIONS = (
+    'health_metrics',
+    'current_readings',
+    'maintenance_recommendations',
+    'performance_analysis',
+    'operational_recommendations',
+)
 
-def calculate_remaining_kilometers(health_score):
-    """
-    Convert health score to estimated remaining kilometers.
-    Uses a more optimistic non-linear scale.
+def parse_analysis_fields(request):
     """
-    # Base maximum kilometers for a perfect health score
-    MAX_KM = 8000  # Increased from 5000
-    
-    # Apply non-linear scaling with more optimistic curve
-    if health_score >= 0.7:
-        # Excellent/Good condition - bonus distance
-        remaining_km = int(MAX_KM * (1 + (health_score - 0.7) * 0.5))
-    else:
-        # Fair/Poor condition - gradual decrease
-        remaining_km = int(MAX_KM * (health_score ** 1.2))
-    
-    # Add some randomness (±5%)
-    variation = random.uniform(0.95, 1.05)
-    remaining_km = int(remaining_km * variation)
-    
-    return remaining_km
-
-def get_health_status(health_score):
+    Sections requested through `?fields=a,b`; all of ANALYSIS_SECTIONS when absent.
+    Raises ValueError on unknown names, or when the parameter names none.
     """
-    Convert health score to a descriptive status with more balanced ranges.
-    """
-    if health_score >= 0.85:
-        return "Excellent"
-    elif health_score >= 0.70:
-        return "Good"
-    elif health_score >= 0.50:
-        return "Fair"
-    elif health_score >= 0.30:
-        return "Poor"
-    else:
-        return "Critical"
-
-def get_parameter_unit(param):
-    """Return the appropriate unit for each parameter."""
-    units = {
-        'Engine rpm': 'RPM',
-        'Lub oil pressure': 'kPa',
-        'Fuel pressure': 'kPa',
-        'Coolant pressure': 'kPa',
-        'Lub oil temp': '°C',
-        'Coolant temp': '°C'
-    }
-    return units.get(param, '')
-
-def get_parameter_status(param, value):
-    """Determine the status of a parameter based on its value with more lenient ranges."""
-    ranges = {
-        'Engine rpm': {
-            'optimal': (800, 2200),
-            'warning': (600, 2800),
-            'critical': (400, 3200)
-        },
-        'Lub oil pressure': {
-            'optimal': (2.0, 5.0),
-            'warning': (1.8, 5.5),
-            'critical': (1.5, 6.0)
-        },
-        'Fuel pressure': {
-            'optimal': (3.0, 16.0),
-            'warning': (2.5, 18.0),
-            'critical': (2.0, 20.0)
-        },
-        'Coolant pressure': {
-            'optimal': (1.2, 3.5),
-            'warning': (1.0, 4.0),
-            'critical': (0.8, 4.5)
-        },
-        'Lub oil temp': {
-            'optimal': (70.0, 85.0),
-            'warning': (65.0, 90.0),
-            'critical': (60.0, 95.0)
-        },
-        'Coolant temp': {
-            'optimal': (70.0, 88.0),
-            'warning': (65.0, 92.0),
-            'critical': (60.0, 97.0)
-        }
-    }
-    
-    range_info = ranges.get(param, {})
-    if not range_info:
-        return 'Unknown'
-        
-    if value >= range_info['optimal'][0] and value <= range_info['optimal'][1]:
-        return 'Optimal'
-    elif value >= range_info['warning'][0] and value <= range_info['warning'][1]:
-        return 'Warning'
-    else:
-        return 'Critical'
-
-def calculate_deviation(param, value):
-    """Calculate the percentage deviation from optimal range."""
-    optimal_ranges = {
-        'Engine rpm': (700, 2500),
-        'Lub oil pressure': (2.5, 4.5),
-        'Fuel pressure': (3.5, 15.0),
-        'Coolant pressure': (1.5, 3.0),
-        'Lub oil temp': (75.0, 82.0),
-        'Coolant temp': (75.0, 85.0)
-    }
-    
-    optimal_range = optimal_ranges.get(param)
-    if not optimal_range:
-        return 0
-        
-    optimal_mid = (optimal_range[0] + optimal_range[1]) / 2
-    deviation = ((value - optimal_mid) / optimal_mid) * 100
-    return round(deviation, 1)
-
-def get_maintenance_recommendations(data):
-    """Generate maintenance recommendations based on sensor data."""
-    urgent_actions = []
-    preventive_actions = []
-    risk_level = "Low"
-    next_service_km = 5000
-    urgent_maintenance_threshold = 1000
-
-    # Check each parameter and add recommendations
-    for param, value in data.items():
-        status = get_parameter_status(param, value)
-        if status == 'Critical':
-            urgent_actions.append(f"Immediate inspection of {param.lower()} required")
-            risk_level = "High"
-            next_service_km = 0
-        elif status == 'Warning':
-            preventive_actions.append(f"Schedule {param.lower()} inspection")
-            risk_level = max(risk_level, "Medium")
-            next_service_km = min(next_service_km, 2500)
-
-    return {
-        'urgent_actions': urgent_actions,
-        'preventive_actions': preventive_actions,
-        'risk_level': risk_level,
-        'next_service_km': next_service_km,
-        'urgent_maintenance_threshold': urgent_maintenance_threshold
-    }
-
-def analyze_engine_performance(data):
-    """Analyze engine performance metrics."""
-    # Calculate efficiency score based on RPM and pressures
-    rpm = data['Engine rpm']
-    lub_pressure = data['Lub oil pressure']
-    fuel_pressure = data['Fuel pressure']
-    
-    efficiency_score = round(
-        (get_parameter_status('Engine rpm', rpm) == 'Optimal') * 0.4 +
-        (get_parameter_status('Lub oil pressure', lub_pressure) == 'Optimal') * 0.3 +
-        (get_parameter_status('Fuel pressure', fuel_pressure) == 'Optimal') * 0.3,
-        2
-    )
-    
-    # Analyze thermal balance
-    thermal_balance = "Optimal"
-    if abs(data['Lub oil temp'] - data['Coolant temp']) > 10:
-        thermal_balance = "Suboptimal"
-    
-    # Analyze pressure systems
-    pressure_status = "Normal"
-    if any(get_parameter_status(p, data[p]) == 'Critical' 
-           for p in ['Lub oil pressure', 'Fuel pressure', 'Coolant pressure']):
-        pressure_status = "Critical"
-    elif any(get_parameter_status(p, data[p]) == 'Warning' 
-            for p in ['Lub oil pressure', 'Fuel pressure', 'Coolant pressure']):
-        pressure_status = "Warning"
-    
-    return {
-        'efficiency_score': efficiency_score,
-        'power_output_status': get_power_output_status(rpm),
-        'thermal_balance': thermal_balance,
-        'pressure_systems': pressure_status,
-        'operational_state': get_operational_state(data)
-    }
-
-def get_power_output_status(rpm):
-    """Determine power output status based on RPM."""
-    if rpm < 600:
-        return "Low - Potential stalling risk"
-    elif rpm <= 1500:
-        return "Normal - Optimal operating range"
-    elif rpm <= 2500:
-        return "High - Increased wear risk"
-    else:
-        return "Critical - Immediate attention required"
-
-def get_operational_state(data):
-    """Determine overall operational state."""
-    statuses = [get_parameter_status(param, value) for param, value in data.items()]
-    critical_count = statuses.count('Critical')
-    warning_count = statuses.count('Warning')
-    
-    if critical_count > 0:
-        return "Requires immediate attention"
-    elif warning_count > 1:
-        return "Maintenance recommended"
-    elif warning_count == 1:
-        return "Monitor closely"
-    else:
-        return "Normal operation"
-
-def get_operational_recommendations(data, health_score):
-    """Generate operational recommendations based on sensor data and health score."""
-    recommendations = []
-    
-    # RPM-based recommendations
-    rpm = data['Engine rpm']
-    if rpm < 600:
-        recommendations.append("Increase engine RPM to prevent stalling")
-    elif rpm > 2500:
-        recommendations.append("Reduce engine load to prevent excessive wear")
-    
-    # Temperature-based recommendations
-    if data['Lub oil temp'] > 82:
-        recommendations.append("Monitor oil temperature - Consider reducing load")
-    if data['Coolant temp'] > 85:
-        recommendations.append("Check cooling system efficiency")
-    
-    # Pressure-based recommendations
-    if data['Lub oil pressure'] < 2.5:
-        recommendations.append("Check oil level and pressure system")
-    if data['Fuel pressure'] < 3.5:
-        recommendations.append("Inspect fuel delivery system")
-    
-    # Health score based recommendations
-    if health_score < 0.4:
-        recommendations.append("Schedule immediate maintenance inspection")
-    elif health_score < 0.6:
-        recommendations.append("Plan maintenance within next 1000 km")
-    
-    return recommendations
\ No newline at end of file
+    raw = request.query_params.get('fields')
+    if raw is None:
+        return set(ANALYSIS_SECTIONS)
+    requested = {name.strip() for name in raw.split(',') if name.strip()}
+    if not requested:
+        raise ValueError(f"No fields given. Valid fields: {', '.join(ANALYSIS_SECTIONS)}")
+    unknown = requested - set(ANALYSIS_SECTIONS)
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}. Valid fields: {', '.join(ANALYSIS_SECTIONS)}"
+        )
+    return requested